@@ -0,0 +1,203 @@
+import os
+import sys
+import json
+import platform
+import subprocess
+import urbs
+from datetime import date, datetime
+from pyomo.opt.base import SolverFactory
+
+# Benchmark of the stages of an urbs run (read, create_model, solve,
+# result_cache, save, load, report, plot) on the example inputs and on
+# synthetic inputs (c.f. urbs.synthetic_input) of growing size. The stage
+# records of all cases are written to 'benchmark.json' in a result directory,
+# along with the git commit. Given the JSON file of an earlier run, e.g.
+#
+#     python benchmark.py result/Benchmark-.../benchmark.json
+#
+# the stage times and memory of both runs are compared case by case.
+
+input_dir = 'Input'
+
+# objective function
+objective = 'cost'  # set either 'cost' or 'CO2' as objective
+
+# Choose Solver (cplex, glpk, gurobi, ...)
+solver = 'glpk'
+
+# trace Python heap memory of each stage (slows Python code down)
+trace_memory = False
+
+# example inputs: (case name, input file or folder, first timestep, length)
+example_cases = [
+    ('single_year_example', 'single_year_example.xlsx', 3500, 168),
+    ('intertemporal_example', 'Intertemporal_example', 0, 24)]
+
+# synthetic inputs: sites and timesteps are varied, the rest is fixed
+synthetic_sites = [2, 4, 8]
+synthetic_timesteps = [24, 168, 672]
+synthetic_options = dict(processes=4, storages=1, dsm=0, topology='ring')
+
+# relative change of time or memory reported as a regression
+regression_threshold = 0.2
+
+
+def benchmark_case(name, data, timesteps, result_dir, dt=1):
+    """ Run and record all stages of the pipeline for one input.
+
+    A failing stage ends the case; its error is recorded along with the
+    stages run before.
+
+    Args:
+        - name: case name, used for the result file names
+        - data: input data dict (as returned by read_input)
+        - timesteps: timesteps to model
+        - result_dir: directory for the result files of the case
+        - dt: length of each time step (unit: hours)
+
+    Returns:
+        the RunTelemetry of the case
+    """
+    telemetry = urbs.RunTelemetry(name, trace_memory=trace_memory,
+                                  solver=solver, timesteps=len(timesteps))
+    telemetry.info['error'] = None
+    filename = os.path.join(result_dir, name)
+    # all demand timeseries are reported and plotted
+    demand_tuples = [(stf, sit, com)
+                     for stf in data['demand'].index.get_level_values(0)
+                     .unique()
+                     for sit, com in data['demand'].columns]
+    try:
+        with telemetry.stage('validate'):
+            urbs.validate_input(data)
+        with telemetry.stage('create_model'):
+            prob = urbs.create_model(data, dt, timesteps, objective)
+        telemetry.info['variables'] = prob.nvariables()
+        telemetry.info['constraints'] = prob.nconstraints()
+        with telemetry.stage('solve'):
+            optim = SolverFactory(solver)
+            optim = urbs.setup_solver(optim, logfile=filename + '.log')
+            result = optim.solve(prob, tee=False)
+        telemetry.info['termination'] = str(
+            result.solver.termination_condition)
+        telemetry.info['solver_seconds'] = urbs.solver_time(result)
+        with telemetry.stage('result_cache'):
+            prob._result = urbs.create_result_cache(prob)
+        telemetry.info['objective'] = prob._result['costs'].sum()
+        with telemetry.stage('save'):
+            urbs.save(prob, filename + '.h5')
+        with telemetry.stage('load'):
+            urbs.load(filename + '.h5')
+        with telemetry.stage('report'):
+            urbs.report(prob, filename + '.xlsx',
+                        report_tuples=demand_tuples)
+        with telemetry.stage('plot'):
+            urbs.result_figures(prob, filename, timesteps,
+                                plot_tuples=demand_tuples,
+                                extensions=['png'])
+    except Exception as error:
+        print("Benchmark case '{}' failed: {!r}".format(name, error))
+        telemetry.info['error'] = repr(error)
+    return telemetry
+
+
+def benchmark_cases():
+    """ Yield (case name, read function, timesteps) of all benchmark inputs.
+
+    The read function reads (example cases) or generates (synthetic cases)
+    the input data dict, so that only one input is held in memory at a time.
+    """
+    year = date.today().year
+    for name, input_files, offset, length in example_cases:
+        yield (name,
+               lambda input_files=input_files: urbs.read_input(
+                   os.path.join(input_dir, input_files), year),
+               range(offset, offset + length + 1))
+    for sites in synthetic_sites:
+        for length in synthetic_timesteps:
+            yield ('synthetic_{}sites_{}h'.format(sites, length),
+                   lambda sites=sites, length=length: urbs.synthetic_input(
+                       sites=sites, timesteps=length, **synthetic_options),
+                   range(0, length + 1))
+
+
+def git_commit():
+    """ Return the current git commit hash, or None outside of a git repo."""
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'],
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline, current):
+    """ Print stage times and peak memory of two benchmark runs side by side.
+
+    Stages that took at least regression_threshold more time (and at least
+    a tenth of a second) or peak memory are marked.
+
+    Args:
+        - baseline: benchmark results dict of the earlier run
+        - current: benchmark results dict of this run
+
+    Returns:
+        list of (case, stage, measure) tuples of the regressions
+    """
+    before = {case['scenario']: case for case in baseline['cases']}
+    regressions = []
+    print('{:<32} {:<14} {:>10} {:>10} {:>10} {:>10}'.format(
+        'case', 'stage', 'base (s)', 'now (s)', 'base (MB)', 'now (MB)'))
+    for case in current['cases']:
+        if case['scenario'] not in before:
+            continue
+        base_stages = {stage['stage']: stage
+                       for stage in before[case['scenario']]['stages']}
+        for stage in case['stages']:
+            base = base_stages.get(stage['stage'])
+            if base is None:
+                continue
+            marks = ''
+            for measure, minimum in [('seconds', 0.1), ('peak_rss_mb', 0)]:
+                if base[measure] is None or stage[measure] is None:
+                    continue
+                if (stage[measure] - base[measure] > minimum and
+                        stage[measure] > base[measure] *
+                        (1 + regression_threshold)):
+                    regressions.append(
+                        (case['scenario'], stage['stage'], measure))
+                    marks += ' <- ' + measure
+            print('{:<32} {:<14} {:>10.2f} {:>10.2f} {:>10.0f} {:>10.0f}{}'
+                  .format(case['scenario'], stage['stage'], base['seconds'],
+                          stage['seconds'], base['peak_rss_mb'] or 0,
+                          stage['peak_rss_mb'] or 0, marks))
+    return regressions
+
+
+if __name__ == '__main__':
+    result_dir = urbs.prepare_result_directory('Benchmark')
+    results = dict(commit=git_commit(),
+                   started=datetime.now().isoformat(timespec='seconds'),
+                   host=platform.node(),
+                   python=platform.python_version(),
+                   solver=solver,
+                   cases=[])
+
+    for name, read, timesteps in benchmark_cases():
+        telemetry = urbs.RunTelemetry(name)
+        with telemetry.stage('read'):
+            data = read()
+        case = benchmark_case(name, data, timesteps, result_dir)
+        case.stages.insert(0, telemetry.stages[0])
+        results['cases'].append(case.manifest())
+        del data
+
+    filename = os.path.join(result_dir, 'benchmark.json')
+    with open(filename, 'w') as f:
+        json.dump(results, f, indent=2, default=str)
+    print('Benchmark results written to {}'.format(filename))
+
+    if len(sys.argv) > 1:
+        with open(sys.argv[1]) as f:
+            regressions = compare(json.load(f), results)
+        print('{} regression(s)'.format(len(regressions)))
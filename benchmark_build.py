@@ -0,0 +1,67 @@
+import os
+import time
+import pandas as pd
+import urbs
+from datetime import date
+
+# Benchmark of model build time (create_model) for a growing number of
+# processes. The processes of the input file are cloned 'factor' times per
+# site, so that the commodity balance of every site involves 'factor' times
+# as many processes.
+
+input_files = 'single_year_example.xlsx'  # for single year file name, for intertemporal folder name
+input_dir = 'Input'
+input_path = os.path.join(input_dir, input_files)
+
+# objective function
+objective = 'cost'  # set either 'cost' or 'CO2' as objective
+
+# simulation timesteps
+(offset, length) = (3500, 168)  # time step selection
+timesteps = range(offset, offset+length+1)
+dt = 1  # length of each time step (unit: hours)
+
+# number of copies of each process
+factors = [1, 2, 4, 8]
+
+
+def scale_processes(data, factor):
+    """ Clone every process 'factor' times, e.g. 'Gas plant' becomes 'Gas
+    plant', 'Gas plant 1', ... with identical parameters and commodities.
+
+    Args:
+        - data: input data dict (as returned by read_input)
+        - factor: number of copies of each process
+
+    Returns:
+        the modified input data dict
+    """
+    process = data['process']
+    process_commodity = data['process_commodity']
+    pro_copies = [process]
+    pro_com_copies = [process_commodity]
+    for k in range(1, factor):
+        pro_copies.append(process.rename(
+            index=lambda pro: '{} {}'.format(pro, k), level='Process'))
+        pro_com_copies.append(process_commodity.rename(
+            index=lambda pro: '{} {}'.format(pro, k), level='Process'))
+    data['process'] = pd.concat(pro_copies).sort_index()
+    data['process_commodity'] = pd.concat(pro_com_copies).sort_index()
+    return data
+
+
+if __name__ == '__main__':
+    year = date.today().year
+
+    print('{:>8} {:>10} {:>12}'.format('factor', 'processes', 'build (s)'))
+    for factor in factors:
+        data = urbs.read_input(input_path, year)
+        data = scale_processes(data, factor)
+        urbs.validate_input(data)
+
+        start = time.perf_counter()
+        prob = urbs.create_model(data, dt, timesteps, objective)
+        duration = time.perf_counter() - start
+
+        print('{:>8} {:>10} {:>12.2f}'.format(
+            factor, len(prob.pro_tuples), duration))
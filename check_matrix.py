@@ -0,0 +1,105 @@
+import os
+import sys
+import urbs
+from datetime import date
+from pyomo.opt.base import SolverFactory
+
+# Consistency check of the array-based model generation (urbs.create_lp) with
+# the pyomo model (urbs.create_model). Both are built and solved for the
+# example inputs, with and without tracking of transmission flows by origin
+# process; their costs must agree by cost type. Run it after changing a rule
+# in urbs/model.py or urbs/features, which has its counterpart in
+# urbs/matrix.py:
+#
+#     python check_matrix.py
+#
+# The exit status is the number of failed cases.
+
+input_dir = 'Input'
+
+# example inputs: (case name, input file or folder, first timestep, length)
+example_cases = [
+    ('single_year_example', 'single_year_example.xlsx', 3500, 24),
+    ('intertemporal_example', 'Intertemporal_example', 0, 12)]
+
+# objective function
+objective = 'cost'  # set either 'cost' or 'CO2' as objective
+
+# Choose Solver (glpk or cbc, the solvers of urbs.solve_lp)
+solver = 'glpk'
+
+# model options checked for each case
+options = [dict(track_origin=False), dict(track_origin=True)]
+
+# relative deviation of a cost type (of the total costs) reported as mismatch
+tolerance = 1e-6
+
+
+def compare_costs(pyomo_costs, matrix_costs):
+    """ Return the cost types in which two solutions deviate.
+
+    Args:
+        - pyomo_costs: Series of costs by cost type of the pyomo model
+        - matrix_costs: Series of costs by cost type of the array-based model
+
+    Returns:
+        list of (cost type, pyomo costs, matrix costs) tuples that deviate by
+        more than tolerance times the total costs
+    """
+    scale = max(abs(pyomo_costs.sum()), 1)
+    deviations = []
+    for cost_type in pyomo_costs.index.union(matrix_costs.index):
+        a = pyomo_costs.get(cost_type, 0)
+        b = matrix_costs.get(cost_type, 0)
+        if abs(a - b) > tolerance * scale:
+            deviations.append((cost_type, a, b))
+    return deviations
+
+
+def check_case(data, timesteps, **kwargs):
+    """ Solve both models of an input and compare their costs.
+
+    Args:
+        - data: input data dict (as returned by read_input)
+        - timesteps: timesteps to model
+        - kwargs: model options (c.f. urbs.create_model)
+
+    Returns:
+        list of deviating cost types (c.f. compare_costs)
+    """
+    prob = urbs.create_model(data, 1, timesteps, objective, **kwargs)
+    result = SolverFactory(solver).solve(prob)
+    if str(result.solver.termination_condition) != 'optimal':
+        raise RuntimeError('pyomo model not solved to optimality: {}'.format(
+            result.solver.termination_condition))
+    pyomo_costs = urbs.get_entity(prob, 'costs')
+    del prob
+
+    lp = urbs.create_lp(data, 1, timesteps, objective, **kwargs)
+    matrix_costs = urbs.get_entity(urbs.solve_lp(lp, solver), 'costs')
+    return compare_costs(pyomo_costs, matrix_costs)
+
+
+if __name__ == '__main__':
+    year = date.today().year
+    failed = 0
+    for name, input_files, offset, length in example_cases:
+        timesteps = range(offset, offset + length + 1)
+        for option in options:
+            data = urbs.read_input(os.path.join(input_dir, input_files),
+                                   year)
+            urbs.validate_input(data)
+            case = '{} {}'.format(name, option)
+            try:
+                deviations = check_case(data, timesteps, **option)
+            except Exception as error:
+                deviations = [('error', repr(error), None)]
+            if deviations:
+                failed += 1
+                print('FAIL {}'.format(case))
+                for cost_type, a, b in deviations:
+                    print('    {:<14} pyomo: {}  matrix: {}'.format(
+                        cost_type, a, b))
+            else:
+                print('ok   {}'.format(case))
+    sys.exit(failed)
@@ -0,0 +1,109 @@
+import os
+import sys
+import urbs
+from datetime import date
+from pyomo.opt.base import SolverFactory
+
+# Convergence check of the rolling horizon (urbs.solve_rolling_horizon) to the
+# full model (urbs.create_model). The full model is solved first; its
+# capacities are then fixed for rolling horizons of growing windows. As a
+# window only sees part of the horizon, its stitched costs may be higher than
+# those of the full model, but they must not grow with the window, and a
+# single window over the whole horizon must reproduce the full model. Run it
+# after changing urbs/rolling.py or a rule of the model it depends on:
+#
+#     python check_rolling.py
+#
+# The exit status is the number of failed checks.
+
+input_dir = 'Input'
+
+# example input: (case name, input file or folder, first timestep, length)
+example_case = ('single_year_example', 'single_year_example.xlsx', 0, 48)
+
+# objective function
+objective = 'cost'  # set either 'cost' or 'CO2' as objective
+
+# Choose Solver (glpk or cbc)
+solver = 'glpk'
+
+# (window, overlap) of the rolling horizons checked, by growing window, each
+# looking half its length ahead; the last one covers the whole horizon
+windows = [(8, 4), (16, 8), (24, 12), (32, 16), (40, 20), (44, 22), (48, 0)]
+
+# relative deviation of the total costs tolerated
+tolerance = 1e-6
+
+
+class QuietSolver(object):
+    """ Solver passed to solve_rolling_horizon without solver output. """
+
+    def __init__(self, optim):
+        self.optim = optim
+
+    def solve(self, m, tee=False):
+        return self.optim.solve(m)
+
+
+def check_convergence(full_costs, rolling_costs):
+    """ Return the failed checks of the stitched costs of rolling horizons.
+
+    Args:
+        - full_costs: total costs of the full model
+        - rolling_costs: list of ((window, overlap), total costs) tuples of
+          the rolling horizons, by growing window
+
+    Returns:
+        list of failure messages
+    """
+    scale = max(abs(full_costs), 1)
+    failures = []
+    previous = None
+    for (window, overlap), costs in rolling_costs:
+        deviation = (costs - full_costs) / scale
+        if deviation < -tolerance:
+            failures.append('window {}/{} below the full model'.format(
+                window, overlap))
+        if previous is not None and deviation > previous + tolerance:
+            failures.append('window {}/{} deviates more than the smaller '
+                            'one before'.format(window, overlap))
+        previous = deviation
+    (window, overlap), costs = rolling_costs[-1]
+    if abs(costs - full_costs) > tolerance * scale:
+        failures.append('window {}/{} over the whole horizon does not '
+                        'reproduce the full model'.format(window, overlap))
+    return failures
+
+
+if __name__ == '__main__':
+    year = date.today().year
+    name, input_files, offset, length = example_case
+    timesteps = list(range(offset, offset + length + 1))
+    data = urbs.read_input(os.path.join(input_dir, input_files), year)
+    urbs.validate_input(data)
+    optim = SolverFactory(solver)
+
+    prob = urbs.create_model(data, 1, timesteps, objective)
+    result = optim.solve(prob)
+    if str(result.solver.termination_condition) != 'optimal':
+        raise RuntimeError('full model not solved to optimality: {}'.format(
+            result.solver.termination_condition))
+    full_costs = urbs.get_entity(prob, 'costs').sum()
+    print('     {:<8} costs: {:.6e}'.format('full', full_costs))
+
+    rolling_costs = []
+    for window, overlap in windows:
+        stitched = urbs.solve_rolling_horizon(
+            data, 1, timesteps, objective, QuietSolver(optim), window,
+            overlap, capacities=prob)
+        costs = urbs.get_entity(stitched, 'costs').sum()
+        rolling_costs.append(((window, overlap), costs))
+        print('     {:<8} costs: {:.6e} ({:.4f} x full)'.format(
+            '{}/{}'.format(window, overlap), costs, costs / full_costs))
+
+    failures = check_convergence(full_costs, rolling_costs)
+    for failure in failures:
+        print('FAIL {} {}'.format(name, failure))
+    if not failures:
+        print('ok   {}'.format(name))
+    sys.exit(len(failures))
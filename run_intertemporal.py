@@ -27,6 +27,10 @@ objective = 'cost'  # set either 'cost' or 'CO2' as objective
 # Choose Solver (cplex, glpk, gurobi, ...)
 solver = 'glpk'
 
+# track transmission flows by their origin process (c.f. urbs.create_model);
+# set False for a smaller model, whose results may differ
+track_origin = True
+
 # simulation timesteps
 (offset, length) = (0, 8760)  # time step selection
 timesteps = range(offset, offset+length+1)
@@ -102,11 +106,13 @@ scenarios = [
              urbs.scenario_all_together
             ]
 
-for scenario in scenarios:
-    prob = urbs.run_scenario(input_path, solver, timesteps, scenario,
-                             result_dir, dt, objective,
-                             plot_tuples=plot_tuples,
-                             plot_sites_name=plot_sites_name,
-                             plot_periods=plot_periods,
-                             report_tuples=report_tuples,
-                             report_sites_name=report_sites_name)
+# the model is built once and reused for scenarios that only change prices,
+# capacity limits or global limits
+prob = urbs.run_scenarios(input_path, solver, timesteps, scenarios,
+                          result_dir, dt, objective,
+                          plot_tuples=plot_tuples,
+                          plot_sites_name=plot_sites_name,
+                          plot_periods=plot_periods,
+                          report_tuples=report_tuples,
+                          report_sites_name=report_sites_name,
+                          track_origin=track_origin)
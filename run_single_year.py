@@ -27,6 +27,10 @@ objective = 'cost'  # set either 'cost' or 'CO2' as objective
 # Choose Solver (cplex, glpk, gurobi, ...)
 solver = 'glpk'
 
+# track transmission flows by their origin process (c.f. urbs.create_model);
+# set False for a smaller model, whose results may differ
+track_origin = True
+
 # simulation timesteps
 (offset, length) = (0, 10)  # time step selection
 timesteps = range(offset, offset+length+1)
@@ -85,4 +89,5 @@ for scenario in scenarios:
                              plot_sites_name=plot_sites_name,
                              plot_periods=plot_periods,
                              report_tuples=report_tuples,
-                             report_sites_name=report_sites_name)
+                             report_sites_name=report_sites_name,
+                             track_origin=track_origin)
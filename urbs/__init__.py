@@ -11,7 +11,15 @@ commodities.
 """
 
 from .colorcodes import COLORS
-from .model import create_model
+from .model import create_model, update_model
+from .matrix import create_lp, solve_lp
+from .aggregation import aggregate_timeseries, resample_timeseries
+from .rolling import solve_rolling_horizon
+from .benders import solve_benders
+from .myopic import solve_myopic
+from .synthetic import synthetic_input
+from .estimate import estimate_model_size, estimate_memory
+from .prune import prune_input, reinflate_results
 from .input import *
 from .validation import validate_input
 from .output import get_constants, get_timeseries
@@ -19,6 +27,7 @@ from .plot import plot, result_figures, to_color
 from .pyomoio import get_entity, get_entities, list_entities
 from .report import report
 from .runfunctions import *
-from .saveload import load, save
+from .saveload import load, save, REPORT_ENTITIES
 from .scenarios import *
+from .telemetry import RunTelemetry
 from .identify import identify_mode, identify_expansion
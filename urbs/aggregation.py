@@ -0,0 +1,224 @@
+import numpy as np
+import pandas as pd
+
+# input timeseries that are aggregated into representative periods
+TIMESERIES = ['demand', 'supim', 'buy_sell_price', 'eff_factor']
+
+# how the input timeseries are resampled to a coarser timestep: demand is an
+# energy per timestep (it is balanced against process throughput, which is
+# limited to dt * capacity), the others are hourly factors and prices
+RESAMPLING = {'demand': 'sum', 'supim': 'mean', 'buy_sell_price': 'mean',
+              'eff_factor': 'mean'}
+
+# DSM durations (in hours) rounded to whole timesteps when resampling
+DSM_DURATIONS = ['delay', 'recov']
+
+
+def aggregate_timeseries(data, typeperiods, period_length=24,
+                         timesteps=None, seed=0):
+    """Aggregate the input timeseries into representative periods.
+
+    The modelled timesteps are cut into periods of period_length timesteps
+    (e.g. days), which are clustered by k-means on their min-max normalised
+    demand, supim, buy_sell_price and eff_factor profiles of all support
+    timeframes. Each cluster is represented by its medoid, i.e. the member
+    period closest to the cluster centre. The representative periods are
+    concatenated in chronological order. data['timestep_weight'] holds the
+    number of periods each timestep stands for; the model scales costs,
+    commodity totals and emissions with it (cf. m.timestep_weight). Trailing
+    timesteps that do not fill a whole period are left out.
+
+    Storage content, DSM shifts and process gradients are chained across the
+    boundaries of consecutive representative periods.
+
+    Args:
+        - data: input data dict
+        - typeperiods: number of representative periods
+        - period_length: timesteps per period, default: 24
+        - timesteps: (optional) timesteps to aggregate, the first one being
+          the initial timestep; default: all timesteps of the demand
+        - seed: seed of the k-means initialisation, default: 0
+
+    Returns:
+        (data, timesteps): the aggregated input data dict and its timesteps
+    """
+    if timesteps is None:
+        timesteps = sorted(set(data['demand'].index.get_level_values('t')))
+    timesteps = list(timesteps)
+    periods = (len(timesteps) - 1) // period_length
+    if not 0 < typeperiods <= periods:
+        raise ValueError("Number of representative periods must be between 1 "
+                         "and {} (the number of periods)!".format(periods))
+    modelled = np.array(timesteps[1:periods * period_length + 1])
+    stf_list = sorted(set(data['demand'].index.get_level_values(0)))
+
+    # one feature vector per period: the normalised profiles of all columns
+    features = []
+    for name in TIMESERIES:
+        if data[name].empty:
+            continue
+        for stf in stf_list:
+            values = data[name].loc[stf].loc[modelled].values.astype(float)
+            spread = values.max(axis=0) - values.min(axis=0)
+            spread[spread == 0] = 1
+            values = (values - values.min(axis=0)) / spread
+            features.append(values.reshape(periods, -1))
+    features = np.hstack(features)
+
+    labels, centres = kmeans(features, typeperiods, seed)
+
+    # medoids of all clusters in chronological order
+    medoids = []
+    for cluster in range(typeperiods):
+        members = np.flatnonzero(labels == cluster)
+        if members.size == 0:
+            continue
+        distance = ((features[members] - centres[cluster]) ** 2).sum(axis=1)
+        medoids.append((members[distance.argmin()], members.size))
+    medoids.sort()
+
+    # timesteps of the representative periods, preceded by the initial one
+    selected = np.concatenate(
+        [[timesteps[0]]] +
+        [modelled[period * period_length:(period + 1) * period_length]
+         for period, _ in medoids])
+    new_timesteps = range(0, len(selected))
+
+    data = dict(data)
+    for name in TIMESERIES:
+        if data[name].empty:
+            continue
+        frames = []
+        for stf in stf_list:
+            frame = data[name].loc[stf].loc[selected]
+            frame.index = pd.Index(new_timesteps, name='t')
+            frames.append(frame)
+        data[name] = pd.concat(frames, keys=stf_list,
+                               names=data[name].index.names)
+
+    data['timestep_weight'] = pd.DataFrame(
+        {'weight': np.repeat([float(size) for _, size in medoids],
+                             period_length)},
+        index=pd.Index(new_timesteps[1:], name='t'))
+
+    return data, new_timesteps
+
+
+def resample_timeseries(data, factor, timesteps=None, dt=1):
+    """Resample the input timeseries to a coarser timestep.
+
+    Each run of factor consecutive modelled timesteps is merged into one
+    timestep of duration dt * factor, with which the model is to be created.
+    Demand is summed over the merged timesteps, supim, buy_sell_price and
+    eff_factor are averaged. The initial timestep is kept (its demand scaled
+    by factor). Trailing timesteps that do not fill a whole new timestep are
+    left out.
+
+    All other parameters are per hour and scaled by dt in the model
+    (capacities, gradients, storage discharge, maxperhour). DSM delay and
+    recovery times are counted in whole timesteps, so they are rounded to
+    the nearest multiple of the new timestep duration, but at least one.
+
+    Args:
+        - data: input data dict
+        - factor: number of timesteps merged into one, e.g. 3 to resample
+          hourly input to 3h timesteps
+        - timesteps: (optional) timesteps to resample, the first one being
+          the initial timestep; default: all timesteps of the demand
+        - dt: timestep duration of the input in hours, default: 1
+
+    Returns:
+        (data, timesteps): the resampled input data dict and its timesteps
+    """
+    if 'timestep_weight' in data:
+        raise ValueError("Timeseries must be resampled before they are "
+                         "aggregated!")
+    if timesteps is None:
+        timesteps = sorted(set(data['demand'].index.get_level_values('t')))
+    timesteps = list(timesteps)
+    if int(factor) != factor or not 1 <= factor <= len(timesteps) - 1:
+        raise ValueError("Resampling factor must be a whole number between 1 "
+                         "and {} (the number of modelled timesteps)!"
+                         .format(len(timesteps) - 1))
+    steps = (len(timesteps) - 1) // factor
+    modelled = timesteps[1:steps * factor + 1]
+    blocks = np.repeat(np.arange(1, steps + 1), factor)
+    new_timesteps = range(0, steps + 1)
+    stf_list = sorted(set(data['demand'].index.get_level_values(0)))
+
+    data = dict(data)
+    for name, how in RESAMPLING.items():
+        if data[name].empty:
+            continue
+        frames = []
+        for stf in stf_list:
+            frame = data[name].loc[stf]
+            initial = frame.loc[[timesteps[0]]].astype(float)
+            if how == 'sum':
+                initial *= factor
+            initial.index = [0]
+            frame = pd.concat([
+                initial,
+                frame.loc[modelled].astype(float).groupby(blocks).agg(how)])
+            frame.index = pd.Index(new_timesteps, name='t')
+            frames.append(frame)
+        data[name] = pd.concat(frames, keys=stf_list,
+                               names=data[name].index.names)
+
+    if not data['dsm'].empty:
+        new_dt = dt * factor
+        dsm = data['dsm'].copy()
+        for column in DSM_DURATIONS:
+            dsm[column] = (dsm[column] / new_dt).round().clip(lower=1) * new_dt
+        data['dsm'] = dsm
+
+    return data, new_timesteps
+
+
+def kmeans(features, k, seed=0, max_iter=100):
+    """Cluster the rows of a feature array with k-means.
+
+    Args:
+        - features: array with one row per observation
+        - k: number of clusters
+        - seed: seed of the k-means++ initialisation
+        - max_iter: maximal number of iterations
+
+    Returns:
+        (labels, centres): cluster index per row and the cluster centres
+    """
+    random = np.random.RandomState(seed)
+
+    # k-means++ initialisation
+    centres = [features[random.randint(len(features))]]
+    distance = ((features - centres[0]) ** 2).sum(axis=1)
+    for _ in range(1, k):
+        if distance.sum() == 0:
+            centres.append(features[random.randint(len(features))])
+        else:
+            centres.append(features[random.choice(
+                len(features), p=distance / distance.sum())])
+        distance = np.minimum(distance,
+                              ((features - centres[-1]) ** 2).sum(axis=1))
+    centres = np.array(centres)
+
+    labels = None
+    norm = (features ** 2).sum(axis=1)[:, np.newaxis]
+    for _ in range(max_iter):
+        # squared distances of all rows to all centres
+        distance = (norm - 2 * features.dot(centres.T) +
+                    (centres ** 2).sum(axis=1)[np.newaxis, :])
+        new_labels = distance.argmin(axis=1)
+        if labels is not None and (new_labels == labels).all():
+            break
+        labels = new_labels
+        for cluster in range(k):
+            members = features[labels == cluster]
+            if len(members):
+                centres[cluster] = members.mean(axis=0)
+            else:
+                # empty cluster: restart at the worst represented row
+                worst = distance[np.arange(len(features)), labels].argmax()
+                centres[cluster] = features[worst]
+                labels[worst] = cluster
+    return labels, centres
@@ -0,0 +1,648 @@
+import os
+import math
+import time
+import multiprocessing
+import pandas as pd
+import pyomo.core as pyomo
+from pyomo.common.collections import ComponentMap
+from pyomo.core.expr.current import identify_variables
+from pyomo.opt.base import SolverFactory
+from pyomo.repn import generate_standard_repn
+from .model import create_model
+from .features.modelhelper import cost_factor
+from .saveload import ResultContainer, create_result_cache
+
+# total capacities linking the master problem to the operation subproblems
+CAPACITY_EXPRESSIONS = ['cap_pro', 'cap_tra', 'cap_sto_c', 'cap_sto_p']
+
+# upper limits of the total capacities, as (model dict, column)
+CAPACITY_LIMITS = {'cap_pro': ('process_dict', 'cap-up'),
+                   'cap_tra': ('transmission_dict', 'cap-up'),
+                   'cap_sto_c': ('storage_dict', 'cap-up-c'),
+                   'cap_sto_p': ('storage_dict', 'cap-up-p')}
+
+# investment variables of the master problem
+INVESTMENT_VARIABLES = ['cap_pro_new', 'cap_tra_new', 'cap_sto_c_new',
+                        'cap_sto_p_new']
+
+# cost types of the master problem
+INVESTMENT_COSTS = ['Invest', 'Fixed']
+
+# duals (EUR per unit of capacity) left out of optimality cuts as zero
+DUAL_TOLERANCE = 1e-6
+
+# capacity deviation (MW or MWh) in the subproblems neglected as zero
+DEVIATION_TOLERANCE = 1e-3
+
+# factor by which the penalty of a capacity still deviating at convergence
+# is raised
+PENALTY_INCREASE = 10
+
+# capacity columns set free in the operation subproblems, by input sheet
+CAPACITY_COLUMNS = {
+    'process': (['inst-cap', 'cap-lo', 'inv-cost', 'fix-cost'], ['cap-up']),
+    'transmission': (['inst-cap', 'cap-lo', 'inv-cost', 'fix-cost'],
+                     ['cap-up']),
+    'storage': (['inst-cap-c', 'cap-lo-c', 'inst-cap-p', 'cap-lo-p',
+                 'inv-cost-c', 'inv-cost-p', 'fix-cost-c', 'fix-cost-p'],
+                ['cap-up-c', 'cap-up-p'])}
+
+
+def solve_benders(data, dt, timesteps, solver, threads=None, parallel=True,
+                  tolerance=1e-4, max_iterations=100, logfile=None,
+                  entities=None):
+    """Solve an intertemporal model by Benders decomposition.
+
+    The master problem holds the capacity expansion of all support
+    timeframes with its invest and fixed costs (c.f. def_costs_rule) and one
+    estimate of the operation costs per support timeframe. The operation of
+    each support timeframe is a subproblem of its own: a single-year model
+    of its input data with the total capacities fixed to the master
+    solution. Its costs and the duals of the fixed capacities give an
+    optimality cut on the operation cost estimate in the master problem.
+    Master and subproblems are solved in turns until the relative gap
+    between the lower bound (master objective) and the upper bound (invest
+    and fixed costs plus operation costs) is below tolerance.
+
+    Capacities in the subproblems may deviate from the master solution at
+    penalty costs per MW (or MWh) exceeded or left short, which keeps them
+    feasible for any master solution (e.g. for capacities too small for the
+    demand). The penalty of a capacity starts at its own invest and fixed
+    costs (c.f. capacity_penalties), so that the duals of the subproblems
+    price each capacity by what it is worth in their operation. Capacities
+    still deviating when the gap is closed are raised in penalty by
+    PENALTY_INCREASE and the iterations go on; the cuts stay valid, as the
+    subproblem costs only grow with the penalty. Without deviations, the
+    solution is the one of the full model.
+
+    With parallel, each subproblem is built and solved in a worker process
+    of its own, which holds it in memory between iterations.
+
+    Only the cost objective is supported. The CO2 budget and cost limits
+    couple the operation of all support timeframes and are not supported.
+
+    Args:
+        - data: intertemporal input data dict
+        - dt: timestep duration in hours
+        - timesteps: list of timesteps
+        - solver: name of the solver, e.g. 'glpk' or 'gurobi'
+        - threads: (optional) number of solver threads per problem
+        - parallel: solve the subproblems in parallel worker processes,
+          default: True
+        - tolerance: relative gap at which to stop, default: 1e-4
+        - max_iterations: maximal number of iterations, default: 100
+        - logfile: (optional) solver log file name, suffixed by the support
+          timeframe for the subproblems
+        - entities: (optional) entities to extract from the subproblems
+          (c.f. create_result_cache)
+
+    Returns:
+        a result container with the capacities from the master problem and
+        the operation of all subproblems, usable with report, plot and save;
+        its attribute benders holds the bounds and the total capacity
+        deviation of each iteration
+    """
+    # input of the subproblems, before the master problem prepares the data
+    stfs = sorted(data['global_prop'].index.get_level_values(0).unique())
+    stf_data = [operation_data(data, stf) for stf in stfs]
+    master = create_master(data, dt, timesteps)
+    optim = setup_benders_solver(solver, logfile, threads)
+    factors = {stf: cost_factor(master, stf) for stf in stfs}
+    penalties = capacity_penalties(master, factors)
+    # raised penalty of deviating capacities without invest and fixed costs
+    least_penalty = min([penalty for stf in stfs
+                         for penalty in penalties[stf].values()
+                         if penalty] or [1])
+
+    args = [(sub_data, dt, timesteps, benders_logfile(logfile, stf), solver,
+             threads)
+            for sub_data, stf in zip(stf_data, stfs)]
+
+    if parallel:
+        subproblems = [SubproblemProcess(*arg) for arg in args]
+    else:
+        subproblems = [Subproblem(*arg) for arg in args]
+
+    history = []
+    try:
+        # operation costs with free capacities bound the cuts from below
+        limits = master_capacities(master, limits=True)
+        for subproblem, stf in zip(subproblems, stfs):
+            subproblem.send('bound', limits[stf])
+        for subproblem, stf in zip(subproblems, stfs):
+            master.costs_operation[stf].setlb(
+                factors[stf] * subproblem.receive())
+
+        for iteration in range(1, max_iterations + 1):
+            start = time.perf_counter()
+            result = optim.solve(master, tee=False)
+            if str(result.solver.termination_condition) != 'optimal':
+                raise RuntimeError(
+                    "Benders master problem not solved to optimality: "
+                    "{}".format(result.solver.termination_condition))
+            capacities = master_capacities(master)
+
+            for subproblem, stf in zip(subproblems, stfs):
+                subproblem.send('solve', (capacities[stf], penalties[stf],
+                                          limits[stf]))
+            lower = pyomo.value(master.objective_benders)
+            upper = sum(pyomo.value(master.costs[cost_type])
+                        for cost_type in INVESTMENT_COSTS)
+            deviations = {}
+            for subproblem, stf in zip(subproblems, stfs):
+                costs, duals, stf_deviations = subproblem.receive()
+                deviations.update(stf_deviations)
+                upper += factors[stf] * costs
+                add_cut(master, stf, factors[stf] * costs,
+                        {key: factors[stf] * dual
+                         for key, dual in duals.items()},
+                        capacities[stf])
+
+            gap = (upper - lower) / abs(upper) if upper else 0
+            deviation = sum(deviations.values())
+            history.append([iteration, lower, upper, gap, deviation,
+                            time.perf_counter() - start])
+            print("Benders iteration {}: lower bound {:.6g}, upper bound "
+                  "{:.6g}, gap {:.3%}, capacity deviation {:.6g}".format(
+                      iteration, lower, upper, gap, deviation))
+            if gap <= tolerance:
+                if not deviations:
+                    break
+                # deviating is still cheaper than the master capacities
+                for name, key in deviations:
+                    penalties[key[0]][name, key] = max(
+                        PENALTY_INCREASE * penalties[key[0]][name, key],
+                        least_penalty)
+        else:
+            print("Warning from solve_benders: gap {:.3%} after {} "
+                  "iterations!".format(gap, max_iterations))
+            if deviations:
+                print("Warning from solve_benders: capacities of the "
+                      "subproblems deviate by {:.6g} in total!".format(
+                          deviation))
+
+        for subproblem in subproblems:
+            subproblem.send('result', entities)
+        caches = dict(subproblem.receive() for subproblem in subproblems)
+    finally:
+        for subproblem in subproblems:
+            subproblem.close()
+
+    prob = ResultContainer(
+        master._data,
+        combine_results(create_result_cache(master, entities), caches,
+                        factors))
+    prob.mode = master.mode
+    prob.demand_dict = master.demand_dict
+    prob.benders = pd.DataFrame(
+        history,
+        columns=['iteration', 'lower', 'upper', 'gap', 'deviation',
+                 'seconds']
+    ).set_index('iteration')
+    return prob
+
+
+def create_master(data, dt, timesteps):
+    """Create the master problem of the Benders decomposition.
+
+    The master problem is a urbs model of the first modelled timestep with
+    only the constraints on capacities and the invest and fixed costs
+    active. The operation costs of each support timeframe are estimated by
+    costs_operation, bounded from below by the optimality cuts
+    res_benders_cut (c.f. add_cut) and the operation costs with free
+    capacities (c.f. subproblem_bound).
+
+    Args:
+        - data: intertemporal input data dict
+        - dt: timestep duration in hours
+        - timesteps: list of timesteps
+
+    Returns:
+        a pyomo ConcreteModel object
+    """
+    m = create_model(data, dt, list(timesteps)[:2], 'cost', dual=False)
+    if not m.mode['int']:
+        raise ValueError("Benders decomposition needs an intertemporal "
+                         "model!")
+    limits = m.global_prop_dict['value']
+    if (not math.isinf(limits.get((min(m.stf), 'CO2 budget'), math.inf)) or
+            any(not math.isinf(limits.get((stf, 'Cost limit'), math.inf))
+                for stf in m.stf)):
+        raise NotImplementedError("Benders decomposition does not support a "
+                                  "CO2 budget or cost limits!")
+
+    for cost_type in m.cost_type:
+        if cost_type not in INVESTMENT_COSTS:
+            m.def_costs[cost_type].deactivate()
+            m.costs[cost_type].fix(0)
+    for con in m.component_objects(pyomo.Constraint, active=True):
+        if con.name != 'def_costs' and not is_capacity_constraint(con):
+            con.deactivate()
+    m.objective_function.deactivate()
+
+    m.costs_operation = pyomo.Var(
+        m.stf,
+        within=pyomo.Reals,
+        doc='Estimated operation costs by support timeframe (EUR)')
+    m.res_benders_cut = pyomo.ConstraintList(
+        doc='operation costs >= costs + duals * (capacities - capacities)')
+    m.objective_benders = pyomo.Objective(
+        expr=pyomo.summation(m.costs) + pyomo.summation(m.costs_operation),
+        sense=pyomo.minimize,
+        doc='minimize(invest and fixed costs + operation costs)')
+    return m
+
+
+def create_subproblem(data, dt, timesteps):
+    """Create the operation subproblem of a support timeframe.
+
+    The subproblem is a single-year urbs model of the input data of the
+    support timeframe (c.f. operation_data). Its total capacities equal the
+    mutable parameters benders_<name> (e.g. benders_cap_pro) plus the
+    capacity exceeded, <name>_excess, or minus the capacity left short,
+    <name>_shortfall, both at the penalty costs benders_penalty_<name>.
+    Constraints on capacities only are left to the master problem.
+
+    Args:
+        - data: input data dict of the support timeframe
+        - dt: timestep duration in hours
+        - timesteps: list of timesteps
+
+    Returns:
+        a pyomo ConcreteModel object
+    """
+    m = create_model(data, dt, timesteps, 'cost', dual=True)
+    for con in m.component_objects(pyomo.Constraint, active=True):
+        if is_capacity_constraint(con):
+            con.deactivate()
+
+    deviation = 0
+    for name in CAPACITY_EXPRESSIONS:
+        if not hasattr(m, name):
+            continue
+        capacity = getattr(m, name)
+        index = capacity.index_set()
+        m.add_component('benders_' + name, pyomo.Param(
+            index, initialize=0, mutable=True,
+            doc='Total capacity of the master problem'))
+        m.add_component('benders_penalty_' + name, pyomo.Param(
+            index, initialize=0, mutable=True,
+            doc='Costs per unit of capacity deviating from the master '
+                'problem'))
+        m.add_component(name + '_excess', pyomo.Var(
+            index, within=pyomo.NonNegativeReals,
+            doc='Total capacity exceeding the master problem'))
+        m.add_component(name + '_shortfall', pyomo.Var(
+            index, within=pyomo.NonNegativeReals,
+            doc='Total capacity short of the master problem'))
+        m.add_component('res_benders_' + name, pyomo.Constraint(
+            index, rule=res_benders_capacity_rule(name),
+            doc='total capacity == master capacity + excess - shortfall'))
+        deviation += sum(getattr(m, 'benders_penalty_' + name)[key] *
+                         (getattr(m, name + '_excess')[key] +
+                          getattr(m, name + '_shortfall')[key])
+                         for key in index)
+
+    m.objective_function.deactivate()
+    m.objective_benders = pyomo.Objective(
+        expr=pyomo.summation(m.costs) + deviation,
+        sense=pyomo.minimize,
+        doc='minimize(operation costs + penalty * capacity deviation)')
+    return m
+
+
+def res_benders_capacity_rule(name):
+    # total capacity of subproblem == capacity of master problem + excess
+    #                                 - shortfall
+    def rule(m, *key):
+        return (getattr(m, name)[key] ==
+                getattr(m, 'benders_' + name)[key] +
+                getattr(m, name + '_excess')[key] -
+                getattr(m, name + '_shortfall')[key])
+    return rule
+
+
+def solve_subproblem(m, optim, capacities, penalties, limits):
+    """Solve a subproblem for given capacities of the master problem.
+
+    Capacities without penalty (that cannot be expanded) must not deviate,
+    the others may exceed the master capacities up to their upper limits.
+
+    Args:
+        - m: a subproblem (c.f. create_subproblem)
+        - optim: a pyomo solver
+        - capacities: dict of {(name, key): capacity} (c.f.
+          master_capacities)
+        - penalties: dict of {(name, key): penalty} (c.f.
+          capacity_penalties)
+        - limits: dict of {(name, key): upper limit} (c.f.
+          master_capacities)
+
+    Returns:
+        tuple of the subproblem costs, a dict of {(name, key): dual} of the
+        capacities and a dict of {(name, key): deviation} of the capacities
+        deviating
+    """
+    for (name, key), value in capacities.items():
+        getattr(m, 'benders_' + name)[key] = value
+        excess = getattr(m, name + '_excess')[key]
+        shortfall = getattr(m, name + '_shortfall')[key]
+        if penalties[name, key] is None:
+            excess.fix(0)
+            shortfall.fix(0)
+            continue
+        getattr(m, 'benders_penalty_' + name)[key] = penalties[name, key]
+        excess.unfix()
+        shortfall.unfix()
+        limit = limits[name, key] - value
+        excess.setub(max(limit, 0) if math.isfinite(limit) else None)
+    result = optim.solve(m, tee=False)
+    if str(result.solver.termination_condition) != 'optimal':
+        raise RuntimeError("Benders subproblem not solved to optimality: "
+                           "{}".format(result.solver.termination_condition))
+    duals = {(name, key): m.dual[getattr(m, 'res_benders_' + name)[key]]
+             for name, key in capacities}
+    deviations = {}
+    for name, key in capacities:
+        deviation = (getattr(m, name + '_excess')[key].value +
+                     getattr(m, name + '_shortfall')[key].value)
+        if deviation > DEVIATION_TOLERANCE:
+            deviations[name, key] = deviation
+    return pyomo.value(m.objective_benders), duals, deviations
+
+
+def subproblem_bound(m, optim, limits):
+    """Return the costs of a subproblem with free capacities.
+
+    The capacities are free between zero and their upper limits, without
+    penalty. So these costs are a lower bound of the subproblem costs for
+    any capacities of the master problem.
+
+    Args:
+        - m: a subproblem (c.f. create_subproblem)
+        - optim: a pyomo solver
+        - limits: dict of {(name, key): upper limit} (c.f.
+          master_capacities)
+
+    Returns:
+        the subproblem costs
+    """
+    for (name, key), limit in limits.items():
+        getattr(m, 'benders_' + name)[key] = 0
+        getattr(m, 'benders_penalty_' + name)[key] = 0
+        getattr(m, name + '_excess')[key].setub(
+            limit if math.isfinite(limit) else None)
+    result = optim.solve(m, tee=False)
+    if str(result.solver.termination_condition) != 'optimal':
+        raise RuntimeError("Benders subproblem with free capacities not "
+                           "solved to optimality: {}".format(
+                               result.solver.termination_condition))
+    return pyomo.value(m.objective_benders)
+
+
+def master_capacities(m, limits=False):
+    """Return the total capacities of a solved master problem.
+
+    Args:
+        - m: the master problem (c.f. create_master)
+        - limits: set True to return the upper limits of the capacities
+          instead (constant capacities for ones that cannot be expanded)
+
+    Returns:
+        dict of {stf: {(name, key): capacity}}
+    """
+    capacities = {stf: {} for stf in m.stf}
+    for name in CAPACITY_EXPRESSIONS:
+        if not hasattr(m, name):
+            continue
+        dict_name, column = CAPACITY_LIMITS[name]
+        upper = getattr(m, dict_name)[column]
+        for key, capacity in getattr(m, name).items():
+            if limits and not pyomo.is_constant(capacity.expr):
+                capacities[key[0]][name, key] = upper[key]
+            else:
+                capacities[key[0]][name, key] = pyomo.value(capacity)
+    return capacities
+
+
+def add_cut(m, stf, costs, duals, capacities):
+    """Add an optimality cut for a support timeframe to the master problem.
+
+    Args:
+        - m: the master problem (c.f. create_master)
+        - stf: support timeframe of the subproblem
+        - costs: operation costs of the subproblem
+        - duals: dict of {(name, key): dual} of its capacities
+        - capacities: dict of {(name, key): capacity} it was solved for
+
+    Returns:
+        Nothing
+    """
+    m.res_benders_cut.add(
+        m.costs_operation[stf] >=
+        costs + sum(dual * (getattr(m, name)[key] - capacities[name, key])
+                    for (name, key), dual in duals.items()
+                    if abs(dual) > DUAL_TOLERANCE))
+
+
+def capacity_penalties(m, factors):
+    """Return the penalties of the capacities deviating in the subproblems.
+
+    The penalty of a total capacity is the invest and fixed costs of a unit
+    of new capacity in its support timeframe, divided by the cost factor of
+    the support timeframe (as the subproblem costs are multiplied by it).
+    So a subproblem deviates about as costly as the master problem builds
+    the capacity.
+
+    Args:
+        - m: the master problem (c.f. create_master)
+        - factors: dict of {stf: cost factor} (c.f. cost_factor)
+
+    Returns:
+        dict of {stf: {(name, key): penalty}}, with a penalty of None for
+        capacities that cannot be expanded
+    """
+    coefficients = ComponentMap()
+    for cost_type in INVESTMENT_COSTS:
+        repn = generate_standard_repn(m.def_costs[cost_type].body)
+        for var, coef in zip(repn.linear_vars, repn.linear_coefs):
+            coefficients[var] = coefficients.get(var, 0) + abs(coef)
+
+    penalties = {stf: {} for stf in m.stf}
+    for name, new in zip(CAPACITY_EXPRESSIONS, INVESTMENT_VARIABLES):
+        if not hasattr(m, name):
+            continue
+        for key, capacity in getattr(m, name).items():
+            if pyomo.is_constant(capacity.expr):
+                penalties[key[0]][name, key] = None
+            else:
+                penalties[key[0]][name, key] = (
+                    coefficients.get(getattr(m, new)[key], 0) /
+                    factors[key[0]])
+    return penalties
+
+
+def is_capacity_constraint(con):
+    # whether the (first) constraint of a component depends on investment
+    # variables only
+    for data in con.values():
+        return all(var.parent_component().name in INVESTMENT_VARIABLES
+                   for var in identify_variables(data.body))
+    return False
+
+
+def operation_data(data, stf):
+    """Return the input data of a support timeframe for its subproblem.
+
+    All capacities are free and have no invest and fixed costs, as they are
+    given by the master problem.
+
+    Args:
+        - data: intertemporal input data dict
+        - stf: a support timeframe
+
+    Returns:
+        input data dict of a single-year model
+    """
+    stf_data = {}
+    for name, frame in data.items():
+        if not frame.empty:
+            frame = frame[frame.index.get_level_values(0) == stf].copy()
+            frame.index = frame.index.remove_unused_levels()
+        if name in CAPACITY_COLUMNS:
+            zero, unlimited = CAPACITY_COLUMNS[name]
+            for column in zero:
+                if column in frame.columns:
+                    frame[column] = 0
+            for column in unlimited:
+                if column in frame.columns:
+                    frame[column] = math.inf
+        stf_data[name] = frame
+    return stf_data
+
+
+def combine_results(master, caches, factors):
+    """Combine the result caches of master and subproblems.
+
+    Entities with a timestep level 't' and the timestep set 't' are
+    concatenated from the subproblems, all others are taken from the master
+    problem. Operation costs are summed up from the subproblems, each by its
+    cost factor.
+
+    Args:
+        - master: result cache of the master problem
+        - caches: dict of {stf: result cache} of the subproblems
+        - factors: dict of {stf: cost factor} (c.f. cost_factor)
+
+    Returns:
+        the combined result cache
+    """
+    result = {}
+    for name, entity in master.items():
+        if 't' in entity.index.names or name == 't':
+            entity = pd.concat([cache[name] for cache in caches.values()
+                                if name in cache])
+            entity = entity[~entity.index.duplicated()]
+        result[name] = entity
+
+    costs = result['costs'].copy()
+    for cost_type in costs.index:
+        if cost_type not in INVESTMENT_COSTS:
+            costs[cost_type] = sum(cache['costs'][cost_type] * factors[stf]
+                                   for stf, cache in caches.items())
+    result['costs'] = costs
+    return result
+
+
+def setup_benders_solver(solver, logfile=None, threads=None):
+    # solver with the options of runfunctions.setup_solver, or only its
+    # threads without a log file
+    from .runfunctions import setup_solver
+    optim = SolverFactory(solver)
+    if logfile:
+        optim = setup_solver(optim, logfile=logfile, threads=threads)
+    elif threads and optim.name in ['gurobi', 'cplex', 'cbc']:
+        optim.set_options("threads={}".format(threads))
+    return optim
+
+
+def benders_logfile(logfile, stf):
+    # solver log file name of the subproblem of a support timeframe
+    if not logfile:
+        return None
+    root, ext = os.path.splitext(logfile)
+    return '{}-{}{}'.format(root, stf, ext)
+
+
+class Subproblem(object):
+    """ An operation subproblem, solved in this process.
+
+    Requests (solve, bound or result) are sent to the subproblem and their
+    replies received in turn, as by SubproblemProcess.
+    """
+    def __init__(self, data, dt, timesteps, logfile, solver, threads):
+        self.stf = data['global_prop'].index.levels[0][0]
+        self.m = create_subproblem(data, dt, timesteps)
+        self.optim = setup_benders_solver(solver, logfile, threads)
+
+    def send(self, request, value=None):
+        self.reply = getattr(self, request)(value)
+
+    def receive(self):
+        return self.reply
+
+    def solve(self, value):
+        return solve_subproblem(self.m, self.optim, *value)
+
+    def bound(self, limits):
+        return subproblem_bound(self.m, self.optim, limits)
+
+    def result(self, entities=None):
+        return self.stf, create_result_cache(self.m, entities)
+
+    def close(self):
+        pass
+
+
+class SubproblemProcess(object):
+    """ An operation subproblem, built and solved in a worker process."""
+    def __init__(self, *args):
+        self.connection, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=subproblem_worker, args=(child,) + args, daemon=True)
+        self.process.start()
+
+    def send(self, request, value=None):
+        self.connection.send((request, value))
+
+    def receive(self):
+        reply = self.connection.recv()
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    def close(self):
+        if self.process.is_alive():
+            self.connection.send(('close', None))
+        self.process.join()
+
+
+def subproblem_worker(connection, *args):
+    # build a subproblem and reply to the requests of a SubproblemProcess
+    try:
+        subproblem = Subproblem(*args)
+    except Exception as error:
+        subproblem = error
+    while True:
+        request, value = connection.recv()
+        if request == 'close':
+            break
+        if isinstance(subproblem, Exception):
+            connection.send(subproblem)
+            continue
+        try:
+            subproblem.send(request, value)
+            connection.send(subproblem.receive())
+        except Exception as error:
+            connection.send(error)
+    connection.close()
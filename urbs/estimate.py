@@ -0,0 +1,466 @@
+import math
+import pandas as pd
+from collections import Counter
+from .identify import identify_mode
+
+# memory of a built pyomo model (create_model) per variable, constraint and
+# nonzero coefficient in bytes, fitted to tracemalloc measurements on
+# synthetic inputs (pyomo 6, CPython 3); it includes the expressions, sets
+# and parameters of the model
+BYTES_PER_VARIABLE = 100
+BYTES_PER_CONSTRAINT = 575
+BYTES_PER_NONZERO = 70
+
+# columns of the model size table, c.f. PROFILE_COLUMNS of BuildProfiler
+SIZE_COLUMNS = ['component', 'type', 'indices', 'nonzeros']
+
+
+def estimate_model_size(data, timesteps=None, dt=1, objective='cost',
+                        track_origin=True, substitute=False):
+    """Estimate the size of the model create_model would build.
+
+    The number of indices (i.e. variables or non-skipped constraints) and
+    nonzero coefficients of every variable and constraint component is
+    derived from the index tuples of the input data and its mode (c.f.
+    identify_mode) alone, without building the model. Indices are exact
+    (up to the support timeframes in which intertemporal units are
+    operational); nonzeros are counted per constraint as in its rule, without
+    terms of zero coefficients (e.g. zero costs), which pyomo leaves out.
+
+    Args:
+        - data: input data dict (as returned by read_input), unchanged
+        - timesteps: list of timesteps, the first one being the initial
+          timestep; default: all timesteps of the demand timeseries
+        - dt: timestep duration in hours (default: 1)
+        - objective: "cost" or "CO2", default: "cost"
+        - track_origin: transmission flows tracked by their origin process
+          (c.f. create_model), default: True
+        - substitute: process inputs and outputs substituted by their
+          definition (c.f. create_model), default: False
+
+    Returns:
+        DataFrame of the variable and constraint components, indexed by
+        component name, with the columns type ('Var' or 'Constraint'),
+        indices and nonzeros (constraints only); c.f. estimate_memory
+    """
+    mode = identify_mode(data)
+    if timesteps is None:
+        timesteps = data['demand'].index.get_level_values(-1).unique()
+    # modelled timesteps and all timesteps, including the initial one
+    tm = len(timesteps) - 1
+    t = len(timesteps)
+    size = {}
+
+    def add(name, kind, indices, nonzeros=None):
+        if name in size:
+            # one constraint component for several global limits
+            size[name][1] += indices
+            size[name][2] += nonzeros
+        else:
+            size[name] = [kind, indices, nonzeros]
+
+    # commodities
+    com_tuples = list(data['commodity'].index)
+    com_types = {}
+    for (stf, sit, com, com_type) in com_tuples:
+        com_types.setdefault(com_type, set()).add(com)
+    com_stock = com_types.get('Stock', set())
+    com_supim = com_types.get('SupIm', set())
+    com_env = com_types.get('Env', set())
+    com_sell = com_types.get('Sell', set())
+    com_buy = com_types.get('Buy', set())
+    stfs = sorted(set(key[0] for key in com_tuples))
+
+    # processes and their commodities
+    process = data['process']
+    pro_tuples = list(process.index)
+    ratios = data['process_commodity']
+    # pyomo drops terms with a coefficient of zero, e.g. of a zero ratio
+    ratio = ratios['ratio'].to_dict()
+    com_in, com_out, partial_in, partial_out = {}, {}, {}, {}
+    for (stf, pro, com, direction), ratio_min in ratios['ratio-min'].items():
+        coms, partial = ((com_in, partial_in) if direction == 'In'
+                         else (com_out, partial_out))
+        coms.setdefault((stf, pro), []).append(com)
+        if ratio_min > 0:
+            partial.setdefault((stf, pro), []).append(com)
+    pro_input = [key + (com,) for key in pro_tuples
+                 for com in com_in.get((key[0], key[2]), ())]
+    pro_output = [key + (com,) for key in pro_tuples
+                  for com in com_out.get((key[0], key[2]), ())]
+    pro_partial = [key for key in pro_tuples
+                   if (key[0], key[2]) in partial_in]
+    pro_partial_input = [key + (com,) for key in pro_partial
+                         for com in partial_in[key[0], key[2]]]
+    pro_partial_output = [key + (com,) for key in pro_partial
+                          for com in partial_out.get((key[0], key[2]), ())]
+    # inputs and outputs defined by throughput * ratio alone
+    pro_timevar_output = []
+    if mode['tve']:
+        eff_factor = data['eff_factor']
+        tve_stfs = set(eff_factor.index.get_level_values(0))
+        pro_timevar_output = [
+            (stf, sit, pro, com) for stf in tve_stfs
+            for (sit, pro) in eff_factor.columns
+            for com in com_out.get((stf, pro), ()) if com not in com_env]
+    plain_input = set(pro_input) - set(pro_partial_input)
+    plain_output = (set(pro_output) - set(pro_partial_output) -
+                    set(pro_timevar_output))
+    pro_maxgrad = [key for key, max_grad in process['max-grad'].items()
+                   if max_grad < 1.0 / dt]
+
+    # variables of the capacity of each unit: its new capacity, or those of
+    # all support timeframes it is operational from (c.f. op_pro_tuples)
+    weight = data['global_prop']['value'].get((stfs[-1], 'Weight'), 1)
+
+    def operational(stf_built, stf, depreciation):
+        if stf == stfs[-1]:
+            return stf + weight - 1 <= stf_built + depreciation
+        stf_next = stfs[stfs.index(stf) + 1]
+        return (stf_built <= stf and
+                (stf + stf_next) / 2 <= stf_built + depreciation)
+
+    def capacity_terms(frame):
+        if not mode['int']:
+            return {key: 1 for key in frame.index}
+        depreciation = frame['depreciation']
+        return {key: sum(1 for stf in stfs
+                         if (stf,) + key[1:] in depreciation and
+                         operational(stf, key[0],
+                                     depreciation[(stf,) + key[1:]]))
+                for key in frame.index}
+    cap_pro = capacity_terms(process)
+
+    # transmissions
+    tra_tuples, tra_tuples_dc = [], []
+    if mode['tra']:
+        transmission = data['transmission'].dropna(axis=0, how='all')
+        tra_tuples = list(transmission.index)
+        if mode['dpf']:
+            dc = set(transmission.index[transmission['reactance'] > 0])
+            tra_tuples_dc = [key for key in dc
+                             if (key[0], key[2], key[1]) + key[3:] not in dc
+                             or key[1] < key[2]]
+            tra_tuples = [key for key in tra_tuples
+                          if key not in dc] + tra_tuples_dc
+        cap_tra = capacity_terms(transmission)
+
+    # storages
+    sto_tuples = []
+    if mode['sto']:
+        storage = data['storage'].dropna(axis=0, how='all')
+        sto_tuples = list(storage.index)
+        cap_sto_c = cap_sto_p = capacity_terms(storage)
+
+    # terms of the commodity balance by (stf, sit, com)
+    balance = Counter()
+    for keys, plain, direction in [(pro_input, plain_input, 'In'),
+                                   (pro_output, plain_output, 'Out')]:
+        for key in keys:
+            # substituted by a zero ratio, the term drops out
+            if (substitute and key in plain and
+                    ratio[key[0], key[2], key[3], direction] == 0):
+                continue
+            balance[key[0], key[1], key[3]] += 1
+    for (stf, sin, sout, tra, com) in tra_tuples:
+        balance[stf, sin, com] += 1
+        balance[stf, sout, com] += 1
+    for (stf, sit, sto, com) in sto_tuples:
+        balance[stf, sit, com] += 2
+
+    # demand side management: number of downshift timesteps per upshift
+    dsm_tuples = []
+    if mode['dsm']:
+        dsm = data['dsm'].dropna(axis=0, how='all')
+        dsm_tuples = list(dsm.index)
+        dsm_delay = {key: min(max(int(delay / dt), 1), tm)
+                     for key, delay in dsm['delay'].items()}
+        dsm_recov = {key: min(max(int(recov / dt), 1), tm)
+                     for key, recov in dsm['recov'].items()}
+        # sum of the timesteps within the delay of each timestep
+        dsm_window = {key: tm * (2 * delay + 1) - delay * (delay + 1)
+                      for key, delay in dsm_delay.items()}
+
+    # commodity
+    cost_types = 5 + (2 if mode['bsp'] else 0)
+    add('costs', 'Var', cost_types)
+    stock = [key for key in com_tuples if key[2] in com_stock]
+    add('e_co_stock', 'Var', tm * len(stock))
+    vertex = [key for key in com_tuples
+              if key[2] not in com_env and key[2] not in com_supim]
+    add('res_vertex', 'Constraint', tm * len(vertex),
+        sum(tm * (balance[key[:3]] + (key[2] in com_stock) +
+                  (key[2] in com_sell) + (key[2] in com_buy)) +
+            (dsm_window[key[:3]] + tm if key[:3] in dsm_tuples else 0)
+            for key in vertex))
+    add('res_stock_step', 'Constraint', tm * len(stock), tm * len(stock))
+    add('res_stock_total', 'Constraint', len(stock), tm * len(stock))
+    env = [key for key in com_tuples if key[2] in com_env]
+    env_terms = sum(balance[key[:3]] for key in env)
+    add('res_env_step', 'Constraint', tm * len(env), tm * env_terms)
+    add('res_env_total', 'Constraint', len(env), tm * env_terms)
+
+    # process
+    add('cap_pro_new', 'Var', len(pro_tuples))
+    add('tau_pro', 'Var', t * len(pro_tuples))
+    if substitute:
+        add('e_pro_in_var', 'Var', tm * len(pro_partial_input))
+        add('e_pro_out_var', 'Var',
+            tm * len(set(pro_output) - plain_output))
+    else:
+        add('e_pro_in', 'Var', tm * len(pro_input))
+        add('e_pro_out', 'Var', tm * len(pro_output))
+        add('def_process_input', 'Constraint', tm * len(plain_input),
+            tm * sum(1 + (ratio[key[0], key[2], key[3], 'In'] != 0)
+                     for key in plain_input))
+        add('def_process_output', 'Constraint', tm * len(plain_output),
+            tm * sum(1 + (ratio[key[0], key[2], key[3], 'Out'] != 0)
+                     for key in plain_output))
+    # timesteps with intermittent supply by (stf, sit, com)
+    supim = data['supim']
+    supim = supim[supim.index.get_level_values(-1).isin(timesteps[1:])]
+    supply = (supim != 0).groupby(level=0).sum()
+    supply = {(stf,) + column: count
+              for stf, row in supply.iterrows()
+              for column, count in row.items()}
+    supim_input = [key for key in pro_input if key[3] in com_supim]
+    add('def_intermittent_supply', 'Constraint', tm * len(supim_input),
+        sum(tm + supply.get((key[0], key[1], key[3]), tm) *
+            cap_pro[key[:3]] for key in supim_input))
+    add('res_process_throughput_by_capacity', 'Constraint',
+        tm * len(pro_tuples),
+        tm * sum(1 + cap_pro[key] for key in pro_tuples))
+    for name in ['res_process_maxgrad_lower', 'res_process_maxgrad_upper']:
+        add(name, 'Constraint', tm * len(pro_maxgrad),
+            tm * sum(2 + cap_pro[key] for key in pro_maxgrad))
+    add('res_process_capacity', 'Constraint', len(pro_tuples),
+        sum(cap_pro.values()))
+    area = process['area-per-cap']
+    area_sites = set(key[:2] for key in area[area > 0].index)
+    site_area = data['site']['area']
+    area_sites = [key for key in area_sites if site_area.get(key, -1) >= 0]
+    add('res_area', 'Constraint', len(area_sites),
+        sum(cap_pro[key] for key in area[area >= 0].index
+            if key[:2] in area_sites))
+    add('res_throughput_by_capacity_min', 'Constraint',
+        tm * len(pro_partial),
+        tm * sum(1 + cap_pro[key] for key in pro_partial))
+    add('def_partial_process_input', 'Constraint',
+        tm * len(pro_partial_input),
+        tm * sum(2 + cap_pro[key[:3]] for key in pro_partial_input))
+    partial_output = set(pro_partial_output) - set(pro_timevar_output)
+    add('def_partial_process_output', 'Constraint',
+        tm * len(partial_output),
+        tm * sum(2 + cap_pro[key[:3]] for key in partial_output))
+    if mode['tve']:
+        timevar_partial = set(pro_timevar_output) & set(pro_partial_output)
+        timevar_output = set(pro_timevar_output) - timevar_partial
+        add('def_process_timevar_output', 'Constraint',
+            tm * len(timevar_output),
+            tm * sum(1 + (ratio[key[0], key[2], key[3], 'Out'] != 0)
+                     for key in timevar_output))
+        add('def_process_partial_timevar_output', 'Constraint',
+            tm * len(timevar_partial),
+            tm * sum(2 + cap_pro[key[:3]] for key in timevar_partial))
+
+    # transmission
+    if mode['tra'] and mode['dpf']:
+        add('cap_tra_new', 'Var', len(tra_tuples))
+        add('e_tra_abs', 'Var', tm * len(tra_tuples_dc))
+        add('e_tra_in', 'Var', tm * len(tra_tuples))
+        add('e_tra_out', 'Var', tm * len(tra_tuples))
+        add('voltage_angle', 'Var', tm * len(set(key[:2]
+                                                 for key in com_tuples)))
+        add('def_transmission_output', 'Constraint', tm * len(tra_tuples),
+            2 * tm * len(tra_tuples))
+        for name, nonzeros in [('def_dc_power_flow', 3),
+                               ('def_angle_limit', 2), ('e_tra_abs1', 2),
+                               ('e_tra_abs2', 2)]:
+            add(name, 'Constraint', tm * len(tra_tuples_dc),
+                nonzeros * tm * len(tra_tuples_dc))
+        add('res_transmission_input_by_capacity', 'Constraint',
+            tm * len(tra_tuples),
+            tm * sum(1 + cap_tra.get(key, 1) for key in tra_tuples))
+        add('res_transmission_dc_input_by_capacity', 'Constraint',
+            tm * len(tra_tuples_dc),
+            tm * sum(1 + cap_tra.get(key, 1) for key in tra_tuples_dc))
+        add('res_transmission_capacity', 'Constraint', len(tra_tuples),
+            sum(cap_tra.get(key, 1) for key in tra_tuples))
+        tra_tuples_tp = [key for key in tra_tuples
+                         if key not in tra_tuples_dc]
+        add('res_transmission_symmetry', 'Constraint', len(tra_tuples_tp),
+            2 * sum(cap_tra[key] for key in tra_tuples_tp))
+    elif mode['tra']:
+        add('cap_tra_new', 'Var', len(tra_tuples))
+        add('e_tra_in', 'Var', tm * len(tra_tuples))
+        add('e_tra_out', 'Var', tm * len(tra_tuples))
+        if track_origin:
+            # processes with an output of a transmitted commodity (c.f.
+            # origin_pro_tuples)
+            origin = {}
+            for (stf, sit, pro, com) in pro_output:
+                origin.setdefault((stf, com), set()).add(pro)
+            origin_tuples = [key + (pro,) for key in tra_tuples
+                             for pro in origin.get((key[0], key[4]), ())]
+            add('e_tra_in_p', 'Var', tm * len(origin_tuples))
+            add('e_tra_out_p', 'Var', tm * len(origin_tuples))
+            for name in ['def_e_tra_in', 'def_e_tra_out']:
+                add(name, 'Constraint', tm * len(tra_tuples),
+                    tm * (len(tra_tuples) + len(origin_tuples)))
+            add('def_transmission_output', 'Constraint',
+                tm * len(origin_tuples), 2 * tm * len(origin_tuples))
+            # per process balance of the transmission commodities by site
+            exports = Counter((key[0], key[1], key[4]) for key in tra_tuples)
+            imports = Counter((key[0], key[2], key[4]) for key in tra_tuples)
+            outputs = set(pro_output)
+            balance_tuples = set((key[0], key[1], key[4], key[5])
+                                 for key in origin_tuples)
+            add('res_transmission_balance_per_process', 'Constraint',
+                tm * len(balance_tuples),
+                tm * sum(exports[key[:3]] + imports[key[:3]] +
+                         ((key[0], key[1], key[3], key[2]) in outputs)
+                         for key in balance_tuples))
+        else:
+            add('def_transmission_output', 'Constraint',
+                tm * len(tra_tuples), 2 * tm * len(tra_tuples))
+        add('res_transmission_input_by_capacity', 'Constraint',
+            tm * len(tra_tuples),
+            tm * sum(1 + cap_tra[key] for key in tra_tuples))
+        add('res_transmission_capacity', 'Constraint', len(tra_tuples),
+            sum(cap_tra.values()))
+        add('res_transmission_symmetry', 'Constraint', len(tra_tuples),
+            2 * sum(cap_tra.values()))
+
+    # storage
+    if mode['sto']:
+        nsto = len(sto_tuples)
+        add('cap_sto_c_new', 'Var', nsto)
+        add('cap_sto_p_new', 'Var', nsto)
+        add('e_sto_in', 'Var', tm * nsto)
+        add('e_sto_out', 'Var', tm * nsto)
+        add('e_sto_con', 'Var', t * nsto)
+        add('def_storage_state', 'Constraint', tm * nsto, 4 * tm * nsto)
+        for name in ['res_storage_input_by_power',
+                     'res_storage_output_by_power']:
+            add(name, 'Constraint', tm * nsto,
+                tm * sum(1 + cap_sto_p[key] for key in sto_tuples))
+        add('res_storage_state_by_capacity', 'Constraint', t * nsto,
+            t * sum(1 + cap_sto_c[key] for key in sto_tuples))
+        add('res_storage_power', 'Constraint', nsto,
+            sum(cap_sto_p.values()))
+        add('res_storage_capacity', 'Constraint', nsto,
+            sum(cap_sto_c.values()))
+        init = (storage['init'] >= 0).sum()
+        add('def_initial_storage_state', 'Constraint', init,
+            sum(1 + cap_sto_c[key] for key in storage.index
+                if storage['init'][key] >= 0))
+        add('res_storage_state_cyclicity', 'Constraint', nsto, 2 * nsto)
+        ep_ratio = []
+        if 'ep-ratio' in storage:
+            ep_ratio = [key for key, value in storage['ep-ratio'].items()
+                        if value >= 0]
+        add('def_storage_energy_power_ratio', 'Constraint', len(ep_ratio),
+            sum(cap_sto_c[key] + cap_sto_p[key] for key in ep_ratio))
+
+    # demand side management
+    if mode['dsm']:
+        ndsm = len(dsm_tuples)
+        window = sum(dsm_window.values())
+        add('dsm_up', 'Var', tm * ndsm)
+        add('dsm_down', 'Var', window)
+        add('def_dsm_variables', 'Constraint', tm * ndsm, window + tm * ndsm)
+        add('res_dsm_upward', 'Constraint', tm * ndsm, tm * ndsm)
+        add('res_dsm_downward', 'Constraint', tm * ndsm, window)
+        add('res_dsm_maximum', 'Constraint', tm * ndsm, window + tm * ndsm)
+        add('res_dsm_recovery', 'Constraint', tm * ndsm,
+            sum(tm * recov - recov * (recov - 1) // 2
+                for recov in dsm_recov.values()))
+
+    # buy and sell prices
+    if mode['bsp']:
+        for name, coms in [('sell', com_sell), ('buy', com_buy)]:
+            tuples = [key for key in com_tuples if key[2] in coms]
+            add('e_co_{}'.format(name), 'Var', tm * len(tuples))
+            add('res_{}_step'.format(name), 'Constraint', tm * len(tuples),
+                tm * len(tuples))
+            add('res_{}_total'.format(name), 'Constraint', len(tuples),
+                tm * len(tuples))
+        buy_input = [key for key in pro_input if key[3] in com_buy]
+        add('res_sell_buy_symmetry', 'Constraint', len(buy_input),
+            2 * len(buy_input))
+
+    # costs and global limits, each cost type without zero cost terms
+    def costly(frame, column, terms=None):
+        return sum(1 if terms is None else terms[key]
+                   for key, cost in frame[column].items() if cost != 0)
+    units = [(process, '', cap_pro)]
+    if mode['tra']:
+        units.append((transmission, '', cap_tra))
+    if mode['sto']:
+        units.extend([(storage, '-c', cap_sto_c), (storage, '-p', cap_sto_p)])
+    costs = (sum(costly(frame, 'inv-cost' + suffix)
+                 for frame, suffix, _ in units) +
+             sum(costly(frame, 'fix-cost' + suffix, terms)
+                 for frame, suffix, terms in units) +
+             tm * (costly(process, 'var-cost') +
+                   costly(data['commodity'].loc[stock], 'price') +
+                   sum(balance[key[:3]] for key in env
+                       if data['commodity']['price'][key] != 0)))
+    if mode['tra']:
+        costs += tm * costly(transmission, 'var-cost')
+    if mode['sto']:
+        costs += tm * (costly(storage, 'var-cost-c') +
+                       2 * costly(storage, 'var-cost-p'))
+    if mode['bsp']:
+        costs += tm * len([key for key in com_tuples
+                           if key[2] in com_sell or key[2] in com_buy])
+    add('def_costs', 'Constraint', cost_types, cost_types + costs)
+    limits = data['global_prop']['value']
+    co2_terms = {stf: tm * sum(balance[key[:3]] for key in env
+                               if key[0] == stf and key[2] == 'CO2')
+                 for stf in stfs}
+    for stf in stfs:
+        for name, limit, nonzeros in [
+                ('res_global_co2_limit', 'CO2 limit', co2_terms[stf]),
+                ('res_global_cost_limit', 'Cost limit', cost_types)]:
+            value = limits.get((stf, limit), math.inf)
+            if not math.isinf(value) and value >= 0:
+                # CO2 limits with the cost objective and vice versa, both
+                # with an intertemporal model
+                if (mode['int'] or
+                        (objective == 'cost') == (limit == 'CO2 limit')):
+                    add(name, 'Constraint', 1, nonzeros)
+    if mode['int']:
+        for name, budget, nonzeros in [
+                ('res_global_co2_budget', 'CO2 budget',
+                 sum(co2_terms.values())),
+                ('res_global_cost_budget', 'Cost budget', cost_types)]:
+            value = limits.get((stfs[0], budget), math.inf)
+            if (not math.isinf(value) and value >= 0 and
+                    (objective == 'cost') == (budget == 'CO2 budget')):
+                add(name, 'Constraint', 1, nonzeros)
+
+    size = pd.DataFrame.from_dict(size, orient='index',
+                                 columns=SIZE_COLUMNS[1:])
+    size.index.name = SIZE_COLUMNS[0]
+    return size
+
+
+def estimate_memory(size):
+    """Estimate the memory of a model from its estimated size.
+
+    The forecast covers the pyomo model built by create_model only; writing
+    the problem to a solver and solving it needs memory of its own, usually
+    of the same order for a large model.
+
+    Args:
+        - size: a model size table, as returned by estimate_model_size
+
+    Returns:
+        the forecast memory in MB
+    """
+    by_type = size.groupby('type')['indices'].sum()
+    nonzeros = size['nonzeros'].sum()
+    return (by_type.get('Var', 0) * BYTES_PER_VARIABLE +
+            by_type.get('Constraint', 0) * BYTES_PER_CONSTRAINT +
+            nonzeros * BYTES_PER_NONZERO) / 2**20
@@ -14,32 +14,40 @@ def add_buy_sell_price(m):
         within=m.com,
         initialize=commodity_subset(m.com_tuples, 'Buy'),
         doc='Commodities that can be purchased')
+    m.com_sell_tuples = pyomo.Set(
+        within=m.stf * m.sit * m.com * m.com_type,
+        initialize=sorted(commodity_subset(m.com_tuples, m.com_sell)),
+        doc='Sell commodities by site, e.g. (2020,Mid,Elec sell,Sell)')
+    m.com_buy_tuples = pyomo.Set(
+        within=m.stf * m.sit * m.com * m.com_type,
+        initialize=sorted(commodity_subset(m.com_tuples, m.com_buy)),
+        doc='Buy commodities by site, e.g. (2020,Mid,Elec buy,Buy)')
 
     # Variables
     m.e_co_sell = pyomo.Var(
-        m.tm, m.com_tuples,
+        m.tm, m.com_sell_tuples,
         within=pyomo.NonNegativeReals,
         doc='Use of sell commodity source (MW) per timestep')
     m.e_co_buy = pyomo.Var(
-        m.tm, m.com_tuples,
+        m.tm, m.com_buy_tuples,
         within=pyomo.NonNegativeReals,
         doc='Use of buy commodity source (MW) per timestep')
 
     # Rules
     m.res_sell_step = pyomo.Constraint(
-        m.tm, m.com_tuples,
+        m.tm, m.com_sell_tuples,
         rule=res_sell_step_rule,
         doc='sell commodity output per step <= commodity.maxperstep')
     m.res_sell_total = pyomo.Constraint(
-        m.com_tuples,
+        m.com_sell_tuples,
         rule=res_sell_total_rule,
         doc='total sell commodity output <= commodity.max')
     m.res_buy_step = pyomo.Constraint(
-        m.tm, m.com_tuples,
+        m.tm, m.com_buy_tuples,
         rule=res_buy_step_rule,
         doc='buy commodity output per step <= commodity.maxperstep')
     m.res_buy_total = pyomo.Constraint(
-        m.com_tuples,
+        m.com_buy_tuples,
         rule=res_buy_total_rule,
         doc='total buy commodity output <= commodity.max')
 
@@ -56,54 +64,42 @@ def add_buy_sell_price(m):
 
 # limit sell commodity use per time step
 def res_sell_step_rule(m, tm, stf, sit, com, com_type):
-    if com not in m.com_sell:
-        return pyomo.Constraint.Skip
-    else:
-        return (m.e_co_sell[tm, stf, sit, com, com_type] <=
-                m.dt * m.commodity_dict['maxperhour']
-                [(stf, sit, com, com_type)])
+    return (m.e_co_sell[tm, stf, sit, com, com_type] <=
+            m.dt * m.commodity_dict['maxperhour'][(stf, sit, com, com_type)])
 
 
 # limit sell commodity use in total (scaled to annual consumption, thanks
 # to m.weight)
 def res_sell_total_rule(m, stf, sit, com, com_type):
-    if com not in m.com_sell:
-        return pyomo.Constraint.Skip
-    else:
-        # calculate total sale of commodity com
-        total_consumption = 0
-        for tm in m.tm:
-            total_consumption += (
-                m.e_co_sell[tm, stf, sit, com, com_type])
-        total_consumption *= m.weight
-        return (total_consumption <=
-                m.commodity_dict['max'][(stf, sit, com, com_type)])
+    # calculate total sale of commodity com
+    total_consumption = 0
+    for tm in m.tm:
+        total_consumption += (
+            m.e_co_sell[tm, stf, sit, com, com_type] *
+            m.timestep_weight[tm])
+    total_consumption *= m.weight
+    return (total_consumption <=
+            m.commodity_dict['max'][(stf, sit, com, com_type)])
 
 
 # limit buy commodity use per time step
 def res_buy_step_rule(m, tm, stf, sit, com, com_type):
-    if com not in m.com_buy:
-        return pyomo.Constraint.Skip
-    else:
-        return (m.e_co_buy[tm, stf, sit, com, com_type] <=
-                m.dt * m.commodity_dict['maxperhour']
-                [(stf, sit, com, com_type)])
+    return (m.e_co_buy[tm, stf, sit, com, com_type] <=
+            m.dt * m.commodity_dict['maxperhour'][(stf, sit, com, com_type)])
 
 
 # limit buy commodity use in total (scaled to annual consumption, thanks
 # to m.weight)
 def res_buy_total_rule(m, stf, sit, com, com_type):
-    if com not in m.com_buy:
-        return pyomo.Constraint.Skip
-    else:
-        # calculate total sale of commodity com
-        total_consumption = 0
-        for tm in m.tm:
-            total_consumption += (
-                m.e_co_buy[tm, stf, sit, com, com_type])
-        total_consumption *= m.weight
-        return (total_consumption <=
-                m.commodity_dict['max'][(stf, sit, com, com_type)])
+    # calculate total sale of commodity com
+    total_consumption = 0
+    for tm in m.tm:
+        total_consumption += (
+            m.e_co_buy[tm, stf, sit, com, com_type] *
+            m.timestep_weight[tm])
+    total_consumption *= m.weight
+    return (total_consumption <=
+            m.commodity_dict['max'][(stf, sit, com, com_type)])
 
 
 # power connection capacity: Sell == Buy
@@ -131,8 +127,8 @@ def search_sell_buy_tuple(m, stf, sit_in, pro_in, coin):
     Returns:
         a process
     """
-    pro_output_tuples = [x for x in list(m.pro_output_tuples.value) if x[1] == sit_in]
-    pro_input_tuples = [x for x in list(m.pro_input_tuples.value) if x[1] == sit_in]
+    pro_output_tuples = [x for x in list(m.pro_output_tuples) if x[1] == sit_in]
+    pro_input_tuples = [x for x in list(m.pro_input_tuples) if x[1] == sit_in]
     # search the output commodities for the "buy" process
     # buy_out = (stf, site, output_commodity)
     buy_out = set([(x[0], x[1], x[3])
@@ -171,12 +167,12 @@ def bsp_surplus(m, tm, stf, sit, com, com_type):
 
 
 def revenue_costs(m):
-    sell_tuples = commodity_subset(m.com_tuples, m.com_sell)
+    sell_tuples = m.com_sell_tuples
     try:
         return -sum(
             m.e_co_sell[(tm,) + c] *
             m.buy_sell_price_dict[c[2]][(c[0], tm)] * m.weight *
-            m.commodity_dict['price'][c] *
+            m.timestep_weight[tm] * m.commodity_dict['price'][c] *
             m.commodity_dict['cost_factor'][c]
             for tm in m.tm
             for c in sell_tuples)
@@ -184,19 +180,19 @@ def revenue_costs(m):
         return -sum(
             m.e_co_sell[(tm,) + c] *
             m.buy_sell_price_dict[c[2], ][(c[0], tm)] * m.weight *
-            m.commodity_dict['price'][c] *
+            m.timestep_weight[tm] * m.commodity_dict['price'][c] *
             m.commodity_dict['cost_factor'][c]
             for tm in m.tm
             for c in sell_tuples)
 
 
 def purchase_costs(m):
-    buy_tuples = commodity_subset(m.com_tuples, m.com_buy)
+    buy_tuples = m.com_buy_tuples
     try:
         return sum(
             m.e_co_buy[(tm,) + c] *
             m.buy_sell_price_dict[c[2]][(c[0], tm)] * m.weight *
-            m.commodity_dict['price'][c] *
+            m.timestep_weight[tm] * m.commodity_dict['price'][c] *
             m.commodity_dict['cost_factor'][c]
             for tm in m.tm
             for c in buy_tuples)
@@ -204,7 +200,7 @@ def purchase_costs(m):
         return sum(
             m.e_co_buy[(tm,) + c] *
             m.buy_sell_price_dict[c[2], ][(c[0], tm)] * m.weight *
-            m.commodity_dict['price'][c] *
+            m.timestep_weight[tm] * m.commodity_dict['price'][c] *
             m.commodity_dict['cost_factor'][c]
             for tm in m.tm
             for c in buy_tuples)
@@ -2,22 +2,29 @@ import math
 import pyomo.core as pyomo
 
 
-def add_time_variable_efficiency(m):
+def timevar_output_tuples(m):
+    """ Process outputs with time variable efficiency.
 
-    # process tuples for time variable efficiency
-    tve_stflist = set()
+    Args:
+        m: the model object (with the set com_env)
+
+    Returns:
+        a list of (stf, sit, pro, com) tuples; the set
+        m.pro_timevar_output_tuples is declared from it in create_model,
+        before the process variables
+    """
     # get all support timeframes for which time variable efficiency is enabled
+    tve_stflist = set()
     for key in m.eff_factor_dict[tuple(m.eff_factor_dict.keys())[0]]:
         tve_stflist.add(tuple(key)[0])
-    m.pro_timevar_output_tuples = pyomo.Set(
-        within=m.stf * m.sit * m.pro * m.com,
-        initialize=[(stf, site, process, commodity)
-                    for stf in tve_stflist
-                    for (site, process) in tuple(m.eff_factor_dict.keys())
-                    for (st, pro, commodity) in tuple(m.r_out_dict.keys())
-                    if process == pro and st == stf and commodity not in
-                    m.com_env],
-        doc='Outputs of processes with time dependent efficiency')
+    return [(stf, site, process, commodity)
+            for stf in tve_stflist
+            for (site, process) in tuple(m.eff_factor_dict.keys())
+            for (st, pro, commodity) in tuple(m.r_out_dict.keys())
+            if process == pro and st == stf and commodity not in m.com_env]
+
+
+def add_time_variable_efficiency(m):
 
     # time variable efficiency rules
     m.def_process_timevar_output = pyomo.Constraint(
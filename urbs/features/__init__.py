@@ -12,4 +12,4 @@ from .storage import add_storage, storage_balance, storage_cost
 from .dsm import add_dsm, dsm_surplus
 from .BuySellPrice import add_buy_sell_price, bsp_surplus, revenue_costs, \
                           purchase_costs
-from .TimeVarEff import add_time_variable_efficiency
\ No newline at end of file
+from .TimeVarEff import add_time_variable_efficiency, timevar_output_tuples
\ No newline at end of file
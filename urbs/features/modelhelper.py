@@ -1,4 +1,4 @@
-from .transmission import transmission_balance
+from .transmission import transmission_balance, dc_transmission_tuples
 from .storage import storage_balance
 
 
@@ -112,6 +112,25 @@ def effective_distance(dist, m):
         return (1 - (1 + discount) ** (-dist)) / discount
 
 
+def cost_factor(m, stf):
+    """Return the factor of the operation costs of a support timeframe.
+
+    In an intertemporal model, variable, fuel, environmental, revenue and
+    purchase costs of a support timeframe are discounted and repeated until
+    the next support timeframe (c.f. pyomo_model_prep), in a single-year
+    model they are not.
+
+    Args:
+        - m: an intertemporal urbs model
+        - stf: a support timeframe
+
+    Returns:
+        the cost factor
+    """
+    return (discount_factor(stf, m) *
+            effective_distance(stf_dist(stf, m), m))
+
+
 def commodity_balance(m, tm, stf, sit, com):
     """Calculate commodity balance at given timestep.
     For a given commodity co and timestep tm, calculate the balance of
@@ -127,16 +146,12 @@ def commodity_balance(m, tm, stf, sit, com):
     Returns
         balance: net value of consumed (positive) or provided (negative) power
     """
-    balance = (sum(m.e_pro_in[(tm, stframe, site, process, com)]
+    balance = (sum(m.e_pro_in[(tm,) + p]
                    # usage as input for process increases balance
-                   for stframe, site, process in m.pro_tuples
-                   if site == sit and stframe == stf and
-                   (stframe, process, com) in m.r_in_dict) -
-               sum(m.e_pro_out[(tm, stframe, site, process, com)]
+                   for p in m.balance_pro_in_dict.get((stf, sit, com), ())) -
+               sum(m.e_pro_out[(tm,) + p]
                    # output from processes decreases balance
-                   for stframe, site, process in m.pro_tuples
-                   if site == sit and stframe == stf and
-                   (stframe, process, com) in m.r_out_dict))
+                   for p in m.balance_pro_out_dict.get((stf, sit, com), ())))
     if m.mode['tra']:
         balance += transmission_balance(m, tm, stf, sit, com)
     if m.mode['sto']:
@@ -145,6 +160,61 @@ def commodity_balance(m, tm, stf, sit, com):
     return balance
 
 
+def commodity_balance_dicts(m):
+    """ Adjacency dictionaries for the commodity balance helpers.
+    For every (stf, site, commodity) tuple, list the keys of the process
+    inputs/outputs, transmission exports/imports and storages that touch it,
+    so that commodity_balance, transmission_balance and storage_balance do
+    not have to scan all process, transmission and storage tuples for each
+    timestep. Called once in pyomo_model_prep.
+    Args:
+        m: the model object, with the data dictionaries already set
+    Returns:
+        Nothing; sets m.balance_pro_in_dict, m.balance_pro_out_dict,
+        m.balance_tra_in_dict, m.balance_tra_out_dict and m.balance_sto_dict
+    """
+    def add_key(index, key, value):
+        index.setdefault(key, []).append(value)
+
+    # commodities by (stf, process), from the process-commodity ratios
+    com_in = {}
+    for (stf, pro, com) in m.r_in_dict:
+        add_key(com_in, (stf, pro), com)
+    com_out = {}
+    for (stf, pro, com) in m.r_out_dict:
+        add_key(com_out, (stf, pro), com)
+
+    m.balance_pro_in_dict = {}
+    m.balance_pro_out_dict = {}
+    for (stf, sit, pro) in m.process_dict['inv-cost']:
+        for com in com_in.get((stf, pro), ()):
+            add_key(m.balance_pro_in_dict, (stf, sit, com),
+                    (stf, sit, pro, com))
+        for com in com_out.get((stf, pro), ()):
+            add_key(m.balance_pro_out_dict, (stf, sit, com),
+                    (stf, sit, pro, com))
+
+    m.balance_tra_in_dict = {}
+    m.balance_tra_out_dict = {}
+    if m.mode['tra']:
+        if m.mode['dpf']:
+            tra_tuples = dc_transmission_tuples(m)[0]
+        else:
+            tra_tuples = m.transmission_dict['eff'].keys()
+        for (stf, sin, sout, tra, com) in tra_tuples:
+            # exports leave site in, imports arrive at site out
+            add_key(m.balance_tra_in_dict, (stf, sin, com),
+                    (stf, sin, sout, tra, com))
+            add_key(m.balance_tra_out_dict, (stf, sout, com),
+                    (stf, sin, sout, tra, com))
+
+    m.balance_sto_dict = {}
+    if m.mode['sto']:
+        for (stf, sit, sto, com) in m.storage_dict['eff-in']:
+            add_key(m.balance_sto_dict, (stf, sit, com),
+                    (stf, sit, sto, com))
+
+
 def commodity_subset(com_tuples, type_name):
     """ Unique list of commodity names for given type.
     Args:
@@ -255,12 +255,10 @@ def storage_balance(m, tm, stf, sit, com):
     For a given commodity co and timestep tm, calculate the balance of
     storage input and output """
 
-    return sum(m.e_sto_in[(tm, stframe, site, storage, com)] -
-               m.e_sto_out[(tm, stframe, site, storage, com)]
+    return sum(m.e_sto_in[(tm,) + s] - m.e_sto_out[(tm,) + s]
                # usage as input for storage increases consumption
                # output from storage decreases consumption
-               for stframe, site, storage, commodity in m.sto_tuples
-               if site == sit and stframe == stf and commodity == com)
+               for s in m.balance_sto_dict.get((stf, sit, com), ()))
 
 
 # storage costs
@@ -290,10 +288,12 @@ def storage_cost(m, cost_type):
                    for s in m.sto_tuples)
     elif cost_type == 'Variable':
         return sum(m.e_sto_con[(tm,) + s] * m.weight *
+                   m.timestep_weight[tm] *
                    m.storage_dict['var-cost-c'][s] *
                    m.storage_dict['cost_factor'][s] +
                    (m.e_sto_in[(tm,) + s] + m.e_sto_out[(tm,) + s]) *
-                   m.weight * m.storage_dict['var-cost-p'][s] *
+                   m.weight * m.timestep_weight[tm] *
+                   m.storage_dict['var-cost-p'][s] *
                    m.storage_dict['cost_factor'][s]
                    for tm in m.tm
                    for s in m.sto_tuples)
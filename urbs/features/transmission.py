@@ -43,20 +43,6 @@ def add_transmission(m):
         doc='Combinations of possible transmissions, e.g. '
             '(2020,South,Mid,hvac,Elec)')
 
-    indexlist = set()
-
-    for key in m.transmission_dict["eff"]:
-        indexlist.add(tuple([*key[0:2],key[4]]))
-
-    m.tra_pro_tuples = pyomo.Set(
-        within= m.stf * m.sit * m.com * m.pro,
-        initialize=[(stf, sit, com, pro)
-                    for (stf, sit, com) in indexlist
-                    for pro in m.pro
-                    ],
-        doc='Combination of possible transmmited commodity'
-    )
-
     if m.mode['int']:
         m.operational_tra_tuples = pyomo.Set(
             within=m.sit * m.sit * m.tra * m.com * m.stf * m.stf,
@@ -95,59 +81,116 @@ def add_transmission(m):
         within=pyomo.NonNegativeReals,
         doc='Power flow out of transmission line (MW) per timestep')
 
+    # transmission
+    if m.track_origin:
+        add_transmission_origin(m)
+    else:
+        m.def_transmission_output = pyomo.Constraint(
+            m.tm, m.tra_tuples,
+            rule=def_transmission_output_rule,
+            doc='transmission output = transmission input * efficiency')
+
+    m.res_transmission_input_by_capacity = pyomo.Constraint(
+        m.tm, m.tra_tuples,
+        rule=res_transmission_input_by_capacity_rule,
+        doc='transmission input <= total transmission capacity')
+
+    m.res_transmission_capacity = pyomo.Constraint(
+        m.tra_tuples,
+        rule=res_transmission_capacity_rule,
+        doc='transmission.cap-lo <= total transmission capacity <= '
+            'transmission.cap-up')
+    m.res_transmission_symmetry = pyomo.Constraint(
+        m.tra_tuples,
+        rule=res_transmission_symmetry_rule,
+        doc='total transmission capacity must be symmetric in both directions')
+
+    return m
+
+
+def origin_pro_tuples(m):
+    """ Processes a transmitted commodity can originate from.
+
+    Only processes with an output of the commodity at some site of the same
+    support timeframe can carry a flow: the flow of any other process would
+    have to be imported at every site it is exported from.
+
+    Args:
+        m: the model object (after pyomo_model_prep)
+
+    Returns:
+        dict of {(stf, com): list of processes}
+    """
+    tra_coms = set((key[0], key[4]) for key in m.transmission_dict['eff'])
+    origin = {}
+    for (stf, sit, pro, com) in m.pro_output_tuples:
+        if (stf, com) in tra_coms and pro not in origin.get((stf, com), ()):
+            origin.setdefault((stf, com), []).append(pro)
+    return origin
+
+
+# tracks the process origin of transmission flows, so that a site can only
+# export (per process) what it generates or imports
+def add_transmission_origin(m):
+    m.origin_pro_dict = origin_pro_tuples(m)
+
+    m.tra_origin_tuples = pyomo.Set(
+        within=m.stf * m.sit * m.sit * m.tra * m.com * m.pro,
+        initialize=[t + (pro,)
+                    for t in m.tra_tuples
+                    for pro in m.origin_pro_dict.get((t[0], t[4]), ())],
+        doc='Transmissions by origin process, e.g. '
+            '(2020,South,Mid,hvac,Elec,Hydro plant)')
+    m.tra_pro_tuples = pyomo.Set(
+        within=m.stf * m.sit * m.com * m.pro,
+        initialize=sorted(set((stf, sin, com, pro)
+                              for (stf, sin, sout, tra, com, pro)
+                              in m.tra_origin_tuples)),
+        doc='Exporting sites by transmitted commodity and origin process, '
+            'e.g. (2020,South,Elec,Hydro plant)')
+
     m.e_tra_in_p = pyomo.Var(
-        m.tm, m.tra_tuples, m.pro,
+        m.tm, m.tra_origin_tuples,
         within=pyomo.NonNegativeReals,
-        doc='Power flow into transmission line (MW) per timestep')
+        doc='Power flow into transmission line (MW) per timestep and '
+            'origin process')
     m.e_tra_out_p = pyomo.Var(
-        m.tm, m.tra_tuples, m.pro,
+        m.tm, m.tra_origin_tuples,
         within=pyomo.NonNegativeReals,
-        doc='Power flow out of transmission line (MW) per timestep')
+        doc='Power flow out of transmission line (MW) per timestep and '
+            'origin process')
 
     m.def_e_tra_in = pyomo.Constraint(
         m.tm, m.tra_tuples,
         rule=def_e_tra_in,
-        doc='transmission input = total transmission input per process'
-    )
-
+        doc='transmission input = total transmission input per process')
     m.def_e_tra_out = pyomo.Constraint(
         m.tm, m.tra_tuples,
         rule=def_e_tra_out,
-        doc='transmissio output = total transmission output per process'
-    )
-
-    # transmission
+        doc='transmission output = total transmission output per process')
     m.def_transmission_output = pyomo.Constraint(
-        m.tm, m.tra_tuples, m.pro,  # for each available process
-        rule=def_transmission_output_rule,
+        m.tm, m.tra_origin_tuples,
+        rule=def_transmission_output_p_rule,
         doc='transmission output = transmission input * efficiency')
-
     m.res_transmission_balance_per_process = pyomo.Constraint(
         m.tm, m.tra_pro_tuples,
         rule=transmission_balance_p,
-        doc='trans'
-    )
+        doc='exports - imports per process <= process output')
 
-    m.res_transmission_input_by_capacity = pyomo.Constraint(
-        m.tm, m.tra_tuples,
-        rule=res_transmission_input_by_capacity_rule,
-        doc='transmission input <= total transmission capacity')
+    return m
 
-    m.res_transmission_capacity = pyomo.Constraint(
-        m.tra_tuples,
-        rule=res_transmission_capacity_rule,
-        doc='transmission.cap-lo <= total transmission capacity <= '
-            'transmission.cap-up')
-    m.res_transmission_symmetry = pyomo.Constraint(
-        m.tra_tuples,
-        rule=res_transmission_symmetry_rule,
-        doc='total transmission capacity must be symmetric in both directions')
 
-    return m
+def dc_transmission_tuples(m):
+    """ Transmission tuples for a model with DCPF transmission lines.
 
+    Args:
+        m: the model object (after pyomo_model_prep)
 
-# adds the transmission features to model with DCPF model features
-def add_transmission_dc(m):
+    Returns:
+        (tra_tuples, tra_tuples_dc, tra_tuples_tp) tuple of sets; all
+        transmissions without duplicate dc transmissions, the bidirectional
+        dc transmissions and the transport transmissions
+    """
     # defining transmission tuple sets for transport and DCPF model separately
     tra_tuples = set()
     tra_tuples_dc = set()
@@ -158,6 +201,12 @@ def add_transmission_dc(m):
     tra_tuples_tp = tra_tuples - tra_tuples_dc
     tra_tuples_dc = remove_duplicate_transmission(tra_tuples_dc)
     tra_tuples = tra_tuples_dc | tra_tuples_tp
+    return tra_tuples, tra_tuples_dc, tra_tuples_tp
+
+
+# adds the transmission features to model with DCPF model features
+def add_transmission_dc(m):
+    tra_tuples, tra_tuples_dc, tra_tuples_tp = dc_transmission_tuples(m)
 
     # tranmission (e.g. hvac, hvdc, pipeline...)
     indexlist = set()
@@ -316,9 +365,14 @@ def def_transmission_capacity_rule(m, stf, sin, sout, tra, com):
 
 
 # transmission output == transmission input * efficiency
+def def_transmission_output_rule(m, tm, stf, sin, sout, tra, com):
+    return (m.e_tra_out[tm, stf, sin, sout, tra, com] ==
+            m.e_tra_in[tm, stf, sin, sout, tra, com] *
+            m.transmission_dict['eff'][(stf, sin, sout, tra, com)])
 
 
-def def_transmission_output_rule(m, tm, stf, sin, sout, tra, com, pro):
+# per origin process
+def def_transmission_output_p_rule(m, tm, stf, sin, sout, tra, com, pro):
     return (m.e_tra_out_p[tm, stf, sin, sout, tra, com, pro] ==
             m.e_tra_in_p[tm, stf, sin, sout, tra, com, pro] *
             m.transmission_dict['eff'][(stf, sin, sout, tra, com)])
@@ -382,20 +436,12 @@ def transmission_balance_p(m, tm, stf, sit, com, pro):
 
     generation = m.e_pro_out[tm, stf, sit, pro, com] if (stf, sit, pro, com) in m.pro_output_tuples else 0
 
-    return (sum(m.e_tra_in_p[(tm, stframe, site_in, site_out,
-                              transmission, com, pro)]
+    return (sum(m.e_tra_in_p[(tm,) + t + (pro,)]
                 # exports increase balance
-                for stframe, site_in, site_out, transmission, commodity
-                in m.tra_tuples
-                if (site_in == sit and stframe == stf and
-                    commodity == com)) -
-            sum(m.e_tra_out_p[(tm, stframe, site_in, site_out,
-                               transmission, com, pro)]
+                for t in m.balance_tra_in_dict.get((stf, sit, com), ())) -
+            sum(m.e_tra_out_p[(tm,) + t + (pro,)]
                 # imports decrease balance
-                for stframe, site_in, site_out, transmission, commodity
-                in m.tra_tuples
-                if (site_out == sit and stframe == stf and
-                    commodity == com))
+                for t in m.balance_tra_out_dict.get((stf, sit, com), ()))
             # generation balance
             - generation) <= 0
 
@@ -405,20 +451,12 @@ def transmission_balance(m, tm, stf, sit, com):
     For a given commodity co and timestep tm, calculate the balance of
     import and export """
 
-    return (sum(m.e_tra_in[(tm, stframe, site_in, site_out,
-                            transmission, com)]
+    return (sum(m.e_tra_in[(tm,) + t]
                 # exports increase balance
-                for stframe, site_in, site_out, transmission, commodity
-                in m.tra_tuples
-                if (site_in == sit and stframe == stf and
-                    commodity == com)) -
-            sum(m.e_tra_out[(tm, stframe, site_in, site_out,
-                             transmission, com)]
+                for t in m.balance_tra_in_dict.get((stf, sit, com), ())) -
+            sum(m.e_tra_out[(tm,) + t]
                 # imports decrease balance
-                for stframe, site_in, site_out, transmission, commodity
-                in m.tra_tuples
-                if (site_out == sit and stframe == stf and
-                    commodity == com)))
+                for t in m.balance_tra_out_dict.get((stf, sit, com), ())))
 
 
 # transmission cost function
@@ -442,17 +480,20 @@ def transmission_cost(m, cost_type):
     elif cost_type == 'Variable':
         if m.mode['dpf']:
             return sum(m.e_tra_in[(tm,) + t] * m.weight *
+                       m.timestep_weight[tm] *
                        m.transmission_dict['var-cost'][t] *
                        m.transmission_dict['cost_factor'][t]
                        for tm in m.tm
                        for t in m.tra_tuples_tp) + \
                    sum(m.e_tra_abs[(tm,) + t] * m.weight *
+                       m.timestep_weight[tm] *
                        m.transmission_dict['var-cost'][t] *
                        m.transmission_dict['cost_factor'][t]
                        for tm in m.tm
                        for t in m.tra_tuples_dc)
         else:
             return sum(m.e_tra_in[(tm,) + t] * m.weight *
+                       m.timestep_weight[tm] *
                        m.transmission_dict['var-cost'][t] *
                        m.transmission_dict['cost_factor'][t] / 2
                        for tm in m.tm
@@ -510,10 +551,10 @@ def inst_tra_tuples(m):
 def def_e_tra_in(m, tm, stf, sin, sout, tra, com):
     return m.e_tra_in[tm, stf, sin, sout, tra, com] == sum(
         m.e_tra_in_p[tm, stf, sin, sout, tra, com, pro]
-        for pro in m.pro)
+        for pro in m.origin_pro_dict.get((stf, com), ()))
 
 
 def def_e_tra_out(m, tm, stf, sin, sout, tra, com):
     return m.e_tra_out[tm, stf, sin, sout, tra, com] == sum(
         m.e_tra_out_p[tm, stf, sin, sout, tra, com, pro]
-        for pro in m.pro)
+        for pro in m.origin_pro_dict.get((stf, com), ()))
@@ -1,13 +1,31 @@
 import pandas as pd
 import os
 import glob
+import json
+import shutil
+import hashlib
+import tempfile
 from xlrd import XLRDError
 import pyomo.core as pyomo
 from .features.modelhelper import *
 from .identify import *
 
 
-def read_input(input_files, year):
+# name of the cache directory of read_input, next to the input files
+INPUT_CACHE = '.urbs_cache'
+
+# version of the cache entries, to be increased whenever read_input prepares
+# the data dict differently, so that older entries are not reused
+CACHE_VERSION = 1
+
+# prefix of cache entries and manifests being written, which are not read
+CACHE_TMP_PREFIX = '.tmp-'
+
+# input DataFrames with MultiIndex columns split from 'Site.Commodity' labels
+SPLIT_COLUMNS = ['demand', 'supim', 'buy_sell_price', 'eff_factor']
+
+
+def read_input(input_files, year, cache=True):
     """Read Excel input file and prepare URBS input dict.
 
     Reads the Excel spreadsheets that adheres to the structure shown in
@@ -17,6 +35,8 @@ def read_input(input_files, year):
     Args:
         - filename: filename to Excel spreadsheets
         - year: current year for non-intertemporal problems
+        - cache: (optional) set False to always parse the Excel files instead
+          of using the input cache (c.f. read_input_cache), default: True
 
     Returns:
         a dict of up to 12 DataFrames
@@ -28,6 +48,17 @@ def read_input(input_files, year):
     else:
         input_files = [input_files]
 
+    if cache:
+        try:
+            data = read_input_cache(input_files, year)
+        except Exception as error:
+            # the cache is optional, parse the Excel files instead
+            print("Warning from read_input: input cache not read "
+                  "({!r})".format(error))
+            data = None
+        if data is not None:
+            return data
+
     gl = []
     sit = []
     com = []
@@ -176,6 +207,173 @@ def read_input(input_files, year):
     for key in data:
         if isinstance(data[key].index, pd.core.index.MultiIndex):
             data[key].sort_index(inplace=True)
+
+    if cache:
+        write_input_cache(input_files, year, data)
+    return data
+
+
+def read_input_cache(input_files, year):
+    """Read the input data dict of given Excel files from the input cache.
+
+    The cache is the directory '.urbs_cache' next to the input files. It holds
+    the data dict of read_input as parquet files, one subdirectory per
+    content hash of the input files, year and CACHE_VERSION. Modification time and size of
+    the input files are compared first, so that unchanged input files need
+    not be hashed.
+
+    Args:
+        - input_files: list of Excel input filenames
+        - year: current year for non-intertemporal problems
+
+    Returns:
+        the cached data dict, or None if the input is not in the cache
+    """
+    if not input_files:
+        return None
+    cache_dir = os.path.join(os.path.dirname(input_files[0]), INPUT_CACHE)
+    if not os.path.isdir(cache_dir):
+        return None
+    files = input_file_stats(input_files)
+
+    # unchanged modification times and sizes
+    for entry in sorted(os.listdir(cache_dir)):
+        if entry.startswith(CACHE_TMP_PREFIX):
+            continue
+        manifest = read_cache_manifest(os.path.join(cache_dir, entry))
+        if (manifest is not None and
+                manifest.get('version') == CACHE_VERSION and
+                manifest['year'] == year and manifest['files'] == files):
+            return load_cache_entry(os.path.join(cache_dir, entry), manifest)
+
+    # touched, but possibly unchanged input files
+    entry_dir = os.path.join(cache_dir, input_hash(input_files, year))
+    manifest = read_cache_manifest(entry_dir)
+    if manifest is None or manifest.get('version') != CACHE_VERSION:
+        return None
+    manifest['files'] = files
+    try:
+        write_cache_manifest(entry_dir, manifest)
+    except OSError:
+        # the updated stats only spare hashing the input files next time
+        pass
+    return load_cache_entry(entry_dir, manifest)
+
+
+def write_input_cache(input_files, year, data):
+    """Write the input data dict of given Excel files to the input cache.
+
+    Older cache entries of the same input files are replaced. The entry is
+    written to a temporary directory first and then renamed, so that
+    processes reading the same input files at once (e.g. the workers of
+    run_scenarios_parallel) never see an incomplete entry; if another
+    process has cached the input meanwhile, its entry is kept. Nothing is
+    cached if no parquet engine (pyarrow or fastparquet) is installed, the
+    input directory is not writable or a DataFrame cannot be written as
+    parquet (e.g. a column of mixed types).
+
+    Args:
+        - input_files: list of Excel input filenames
+        - year: current year for non-intertemporal problems
+        - data: the data dict read from the input files
+
+    Returns:
+        Nothing
+    """
+    if not input_files:
+        return
+    cache_dir = os.path.join(os.path.dirname(input_files[0]), INPUT_CACHE)
+    entry_dir = os.path.join(cache_dir, input_hash(input_files, year))
+    files = input_file_stats(input_files)
+    manifest = {'version': CACHE_VERSION, 'year': year, 'files': files,
+                'keys': list(data.keys())}
+    tmp_dir = None
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(prefix=CACHE_TMP_PREFIX, dir=cache_dir)
+        for key, df in data.items():
+            if key in SPLIT_COLUMNS and len(df.columns) > 0:
+                # parquet needs string column labels
+                df = df.copy()
+                df.columns = ['.'.join(col) for col in df.columns]
+            df.to_parquet(os.path.join(tmp_dir, '{}.parquet'.format(key)))
+        # the manifest marks a complete cache entry
+        write_cache_manifest(tmp_dir, manifest)
+        try:
+            os.replace(tmp_dir, entry_dir)
+        except OSError:
+            # another process has cached the same input meanwhile
+            if read_cache_manifest(entry_dir) is None:
+                raise
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        tmp_dir = None
+
+        # older entries of the same input files, but not the current one
+        for entry in os.listdir(cache_dir):
+            if (entry == os.path.basename(entry_dir) or
+                    entry.startswith(CACHE_TMP_PREFIX)):
+                continue
+            old = read_cache_manifest(os.path.join(cache_dir, entry))
+            if (old is not None and old['year'] == year and
+                    sorted(old['files']) == sorted(files)):
+                shutil.rmtree(os.path.join(cache_dir, entry),
+                              ignore_errors=True)
+    except Exception as error:
+        # the cache is optional, e.g. pyarrow raises ArrowInvalid and
+        # ArrowTypeError, fastparquet ValueError for unsupported columns
+        print("Warning from read_input: input data not cached "
+              "({!r})".format(error))
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def input_file_stats(input_files):
+    # modification time and size by input filename
+    return {os.path.basename(filename): [os.path.getmtime(filename),
+                                        os.path.getsize(filename)]
+            for filename in input_files}
+
+
+def input_hash(input_files, year):
+    # content hash of the input files, the year and the cache version
+    sha = hashlib.sha1('{}.{}'.format(CACHE_VERSION, year).encode())
+    for filename in input_files:
+        sha.update(os.path.basename(filename).encode())
+        with open(filename, 'rb') as f:
+            sha.update(hashlib.sha1(f.read()).digest())
+    return sha.hexdigest()
+
+
+def read_cache_manifest(entry_dir):
+    # manifest of a complete cache entry, None otherwise
+    try:
+        with open(os.path.join(entry_dir, 'manifest.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_cache_manifest(entry_dir, manifest):
+    # replace the manifest of a cache entry at once, so that a concurrent
+    # read_cache_manifest never sees it half written
+    fd, tmp_file = tempfile.mkstemp(prefix=CACHE_TMP_PREFIX, dir=entry_dir)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_file, os.path.join(entry_dir, 'manifest.json'))
+    except BaseException:
+        os.remove(tmp_file)
+        raise
+
+
+def load_cache_entry(entry_dir, manifest):
+    # data dict from the parquet files of a cache entry
+    data = {}
+    for key in manifest['keys']:
+        data[key] = pd.read_parquet(
+            os.path.join(entry_dir, '{}.parquet'.format(key)))
+        if key in SPLIT_COLUMNS:
+            data[key].columns = split_columns(data[key].columns, '.')
     return data
 
 
@@ -222,6 +420,14 @@ def pyomo_model_prep(data, timesteps):
     m.demand_dict = data['demand'].to_dict()
     m.supim_dict = data['supim'].to_dict()
 
+    # number of timesteps each modelled timestep stands for, e.g. after
+    # aggregation into representative periods (cf. aggregate_timeseries)
+    if 'timestep_weight' in data:
+        weight = data['timestep_weight']['weight']
+        m.timestep_weight_dict = {t: weight[t] for t in timesteps[1:]}
+    else:
+        m.timestep_weight_dict = {t: 1 for t in timesteps[1:]}
+
     # additional features
     if m.mode['tra']:
         data['transmission'].dropna(axis=0, how='all', inplace=True)
@@ -555,6 +761,10 @@ def pyomo_model_prep(data, timesteps):
             sto_const_cap_c['inst-cap-p'], storage['inst-cap-p'].dropna())
         m.sto_const_cap_p_dict = sto_const_cap_p['inst-cap-p'].to_dict()
 
+    # (stf, sit, com) adjacency of processes, transmissions and storages
+    # for the commodity balance
+    commodity_balance_dicts(m)
+
     return m
 
 
@@ -0,0 +1,1257 @@
+import math
+import os
+import shutil
+import subprocess
+import tempfile
+import numpy as np
+import pandas as pd
+from .input import pyomo_model_prep
+from .features.modelhelper import commodity_subset, op_pro_tuples, \
+                                  inst_pro_tuples, stf_dist
+from .features.transmission import op_tra_tuples, inst_tra_tuples, \
+    origin_pro_tuples
+from .features.storage import op_sto_tuples, inst_sto_tuples
+from .features.dsm import dsm_time_tuples, dsm_recovery
+from .features.BuySellPrice import search_sell_buy_tuple
+from .saveload import ResultContainer
+
+
+class LinearProblem(object):
+    """ Linear program in sparse coordinate (COO) form.
+
+    Variables and constraints are added in blocks. Each block keeps its index
+    keys, index labels and (optionally) its timesteps, so that values and
+    duals can be returned in the format of get_entity. Like a pyomo
+    Constraint, every row has a lower and an upper bound on its body.
+    """
+
+    def __init__(self, name='urbs'):
+        self.name = name
+        self.variables = {}
+        self.constraints = {}
+        self.expressions = {}
+        self.n_cols = 0
+        self.n_rows = 0
+        self._lb = []
+        self._ub = []
+        self._lo = []
+        self._up = []
+        self._rows = []
+        self._cols = []
+        self._coefs = []
+        self._const_rows = []
+        self._const_values = []
+        self._obj_cols = []
+        self._obj_coefs = []
+
+    @staticmethod
+    def _block_ids(start, keys, times):
+        if times is None:
+            return np.arange(start, start + len(keys))
+        return np.arange(start, start + len(keys) * len(times)).reshape(
+            len(keys), len(times))
+
+    def add_variable(self, name, keys, labels, times=None, lb=0,
+                     ub=np.inf):
+        """Add a block of variables, one per key (and timestep).
+
+        Args:
+            - name: entity name, e.g. 'e_pro_out'
+            - keys: list of index tuples (without timestep)
+            - labels: index names, as returned by get_entity
+            - times: (optional) list of timesteps, prepended to every key
+            - lb, ub: lower and upper bound, broadcast to the block shape
+
+        Returns:
+            array of column ids, shape (len(keys),) or (len(keys), len(times))
+        """
+        ids = self._block_ids(self.n_cols, keys, times)
+        self.n_cols += ids.size
+        self._lb.append(np.broadcast_to(
+            np.asarray(lb, dtype=float), ids.shape).ravel())
+        self._ub.append(np.broadcast_to(
+            np.asarray(ub, dtype=float), ids.shape).ravel())
+        self.variables[name] = (ids, keys, labels, times)
+        return ids
+
+    def add_constraint(self, name, keys, labels, times=None,
+                       lower=-np.inf, upper=np.inf):
+        """Add a block of constraints lower <= body <= upper.
+
+        Args:
+            - name, keys, labels, times: see add_variable
+            - lower, upper: bounds, broadcast to the block shape
+
+        Returns:
+            array of row ids, shape (len(keys),) or (len(keys), len(times))
+        """
+        ids = self._block_ids(self.n_rows, keys, times)
+        self.n_rows += ids.size
+        self._lo.append(np.broadcast_to(
+            np.asarray(lower, dtype=float), ids.shape).ravel())
+        self._up.append(np.broadcast_to(
+            np.asarray(upper, dtype=float), ids.shape).ravel())
+        self.constraints[name] = (ids, keys, labels, times)
+        return ids
+
+    def add_terms(self, rows, cols, coef=1.0):
+        """Add coef * x[cols] to the body of rows (arrays are broadcast)."""
+        rows, cols, coef = np.broadcast_arrays(
+            rows, cols, np.asarray(coef, dtype=float))
+        self._rows.append(rows.ravel())
+        self._cols.append(cols.ravel())
+        self._coefs.append(coef.ravel())
+
+    def add_constant(self, rows, value):
+        """Add a constant to the body of rows (arrays are broadcast)."""
+        rows, value = np.broadcast_arrays(
+            rows, np.asarray(value, dtype=float))
+        self._const_rows.append(rows.ravel())
+        self._const_values.append(value.ravel())
+
+    def add_expression(self, rows, expr, index, coef=1.0):
+        """Add coef * expr[k] to the body of rows, for k in index.
+
+        Args:
+            - rows: array of row ids, first axis aligned with index
+            - expr: a LinearExpression
+            - index: list of expression key positions, one per row
+            - coef: coefficient, broadcast to the shape of rows
+        """
+        rows = np.asarray(rows)
+        coef = np.broadcast_to(np.asarray(coef, dtype=float), rows.shape)
+        for j, k in enumerate(index):
+            if expr.const[k]:
+                self.add_constant(rows[j], coef[j] * expr.const[k])
+            for col, a in expr.terms[k]:
+                self.add_terms(rows[j], col, coef[j] * a)
+
+    def add_objective(self, cols, coef=1.0):
+        """Add coef * x[cols] to the (minimized) objective function."""
+        cols, coef = np.broadcast_arrays(
+            cols, np.asarray(coef, dtype=float))
+        self._obj_cols.append(cols.ravel())
+        self._obj_coefs.append(coef.ravel())
+
+    def matrices(self):
+        """Assemble the problem arrays.
+
+        Duplicate (row, col) entries are summed up, zero entries dropped and
+        constants moved from the row bodies to the row bounds.
+
+        Returns:
+            (c, rows, cols, coefs, lo, up, lb, ub) tuple; the objective
+            vector, the constraint matrix triplets sorted by column, the row
+            bounds and the column bounds
+        """
+        def concat(arrays, dtype):
+            if arrays:
+                return np.concatenate(arrays).astype(dtype)
+            return np.zeros(0, dtype=dtype)
+
+        c = np.zeros(self.n_cols)
+        np.add.at(c, concat(self._obj_cols, int),
+                  concat(self._obj_coefs, float))
+        const = np.zeros(self.n_rows)
+        np.add.at(const, concat(self._const_rows, int),
+                  concat(self._const_values, float))
+
+        rows = concat(self._rows, int)
+        cols = concat(self._cols, int)
+        coefs = concat(self._coefs, float)
+        order = np.lexsort((rows, cols))
+        rows, cols, coefs = rows[order], cols[order], coefs[order]
+        if rows.size:
+            first = np.ones(rows.size, dtype=bool)
+            first[1:] = (rows[1:] != rows[:-1]) | (cols[1:] != cols[:-1])
+            starts = np.flatnonzero(first)
+            coefs = np.add.reduceat(coefs, starts)
+            rows, cols = rows[starts], cols[starts]
+        nonzero = coefs != 0
+
+        return (c, rows[nonzero], cols[nonzero], coefs[nonzero],
+                concat(self._lo, float) - const,
+                concat(self._up, float) - const,
+                concat(self._lb, float), concat(self._ub, float))
+
+    def write_mps(self, filename):
+        """Write the problem to a free MPS file.
+
+        Columns are named c<id>, rows r<id>. Rows without coefficients or
+        without finite bounds are omitted (pyomo skips them, too).
+
+        Args:
+            filename: MPS file to be written
+
+        Returns:
+            array of the written row ids
+        """
+        c, rows, cols, coefs, lo, up, lb, ub = self.matrices()
+
+        used = np.zeros(self.n_rows, dtype=bool)
+        used[rows] = True
+        written = np.flatnonzero(used & (np.isfinite(lo) | np.isfinite(up)))
+        keep = np.zeros(self.n_rows, dtype=bool)
+        keep[written] = True
+        entries = keep[rows]
+        rows, cols, coefs = rows[entries], cols[entries], coefs[entries]
+
+        # objective entries, plus a zero entry for columns without any
+        # coefficient (every column must appear in section COLUMNS)
+        empty = np.ones(self.n_cols, dtype=bool)
+        empty[cols] = False
+        obj_cols = np.flatnonzero((c != 0) | empty)
+        all_rows = np.concatenate([np.full(obj_cols.size, -1), rows])
+        all_cols = np.concatenate([obj_cols, cols])
+        all_coefs = np.concatenate([c[obj_cols], coefs])
+        order = np.argsort(all_cols, kind='stable')
+
+        lo, up = lo[written], up[written]
+        equal = lo == up
+        lower = ~equal & np.isfinite(lo)
+        sense = np.where(equal, 'E', np.where(lower, 'G', 'L'))
+        rhs = np.where(equal | lower, lo, up)
+        ranged = lower & np.isfinite(up)
+
+        with open(filename, 'w') as f:
+            f.write('NAME {} FREE\n'.format(self.name))
+            f.write('ROWS\n N obj\n')
+            f.writelines(' {} r{}\n'.format(s, r)
+                         for s, r in zip(sense.tolist(), written.tolist()))
+            f.write('COLUMNS\n')
+            f.writelines(' c{} r{} {!r}\n'.format(j, r, a) if r >= 0 else
+                         ' c{} obj {!r}\n'.format(j, a)
+                         for j, r, a in zip(all_cols[order].tolist(),
+                                            all_rows[order].tolist(),
+                                            all_coefs[order].tolist()))
+            f.write('RHS\n')
+            f.writelines(' rhs r{} {!r}\n'.format(r, b)
+                         for r, b in zip(written.tolist(), rhs.tolist())
+                         if b != 0)
+            if ranged.any():
+                f.write('RANGES\n')
+                f.writelines(' rng r{} {!r}\n'.format(r, b)
+                             for r, b in zip(written[ranged],
+                                             (up - lo)[ranged].tolist()))
+            f.write('BOUNDS\n')
+            for j in np.flatnonzero((lb != 0) | np.isfinite(ub)):
+                if np.isinf(lb[j]) and np.isinf(ub[j]):
+                    f.write(' FR bnd c{}\n'.format(j))
+                    continue
+                if np.isinf(lb[j]):
+                    f.write(' MI bnd c{}\n'.format(j))
+                elif lb[j] != 0:
+                    f.write(' LO bnd c{} {!r}\n'.format(j, lb[j]))
+                if np.isfinite(ub[j]):
+                    f.write(' UP bnd c{} {!r}\n'.format(j, ub[j]))
+            f.write('ENDATA\n')
+
+        return written
+
+    def entity(self, name, values):
+        """Return values of a variable or constraint block as Series.
+
+        Args:
+            - name: name of a variable or constraint block
+            - values: array of all column values (or all row duals)
+
+        Returns:
+            a Series in the format of get_entity
+        """
+        if name in self.variables:
+            ids, keys, labels, times = self.variables[name]
+        else:
+            ids, keys, labels, times = self.constraints[name]
+        return _block_series(name, values[ids], keys, labels, times)
+
+
+class LinearExpression(object):
+    """ Indexed affine expression const[k] + sum(coef * x[col]).
+
+    Stands in for the pyomo Expressions cap_pro, cap_tra, cap_sto_c and
+    cap_sto_p of create_model.
+    """
+
+    def __init__(self, keys, labels):
+        self.keys = keys
+        self.labels = labels
+        self.position = {key: k for k, key in enumerate(keys)}
+        self.const = np.zeros(len(keys))
+        self.terms = [[] for key in keys]
+
+    def add(self, key, col=None, coef=1.0):
+        """Add coef * x[col] or, if col is None, the constant coef."""
+        k = self.position[key]
+        if col is None:
+            self.const[k] += coef
+        else:
+            self.terms[k].append((col, coef))
+
+    def value(self, x):
+        """Evaluate the expression for all keys, given column values x."""
+        return np.array([self.const[k] +
+                         sum(a * x[col] for col, a in self.terms[k])
+                         for k in range(len(self.keys))])
+
+
+def _block_series(name, values, keys, labels, times=None):
+    # Series with index (t, *key) or key, cf. get_entity
+    if len(keys) == 0:
+        return pd.Series(name=name, dtype=float)
+    if isinstance(keys[0], tuple):
+        levels = [np.array(level, dtype=object) for level in zip(*keys)]
+    else:
+        levels = [np.array(keys, dtype=object)]
+    if times is not None:
+        n = len(times)
+        levels = [np.tile(np.asarray(times), len(keys))] + \
+                 [np.repeat(level, n) for level in levels]
+    if len(levels) == 1:
+        index = pd.Index(levels[0], name=labels[0])
+    else:
+        index = pd.MultiIndex.from_arrays(levels, names=labels)
+    return pd.Series(np.ravel(values), index=index, name=name).sort_index()
+
+
+def _timeseries(dictionary, column, stf, times):
+    # values of a timeseries dict (e.g. m.demand_dict) for given timesteps
+    series = dictionary[column]
+    return np.array([series[(stf, t)] for t in times], dtype=float)
+
+
+def create_lp(data, dt=1, timesteps=None, objective='cost',
+              track_origin=True):
+    """Assemble the urbs LP as sparse coefficient arrays.
+
+    Array-based alternative to create_model: the variables and constraints
+    are the same, but each constraint block is generated for all timesteps
+    at once with NumPy instead of one Python rule call per index. Supports
+    all features except DC power flow.
+
+    Args:
+        - data: a dict of up to 12
+        - dt: timestep duration in hours (default: 1)
+        - timesteps: optional list of timesteps, default: demand timeseries
+        - objective: Either "cost" or "CO2" for choice of objective function,
+          default: "cost"
+        - track_origin: track transmission flows by their origin process
+          (c.f. create_model), default: True
+
+    Returns:
+        a LinearProblem object
+    """
+    if not timesteps:
+        timesteps = data['demand'].index.tolist()
+    if objective not in ('cost', 'CO2'):
+        raise NotImplementedError("Non-implemented objective quantity. Set "
+                                  "either 'cost' or 'CO2' as the objective in "
+                                  "runme.py!")
+    m = pyomo_model_prep(data, timesteps)  # preparing model data
+    m.track_origin = track_origin
+    if m.mode['dpf']:
+        raise NotImplementedError("DC power flow is not supported by the "
+                                  "array-based backend, use create_model.")
+
+    lp = LinearProblem()
+    lp._data = data
+    lp.mode = m.mode
+    lp.demand_dict = m.demand_dict
+    lp.objective = objective
+    lp.timesteps = list(timesteps)
+    lp.tm = lp.timesteps[1:]
+    lp.dt = dt
+    # weight = length of year (hours) / length of simulation (hours), scaled
+    # per timestep by the number of timesteps it stands for
+    lp.timestep_weight = np.array([m.timestep_weight_dict[t] for t in lp.tm],
+                                  dtype=float)
+    lp.weight = float(8760) / (lp.timestep_weight.sum() * dt)
+    tm = lp.tm
+    weight = lp.weight * lp.timestep_weight
+
+    # Sets (cf. create_model)
+    m.stf = sorted(set(key[0] for key in m.commodity_dict['price']))
+    m.com_tuples = list(m.commodity_dict['price'].keys())
+    m.pro_tuples = list(m.process_dict['inv-cost'].keys())
+    m.pro = sorted(set(key[2] for key in m.pro_tuples))
+    m.com_stock = commodity_subset(m.com_tuples, 'Stock')
+    m.com_supim = commodity_subset(m.com_tuples, 'SupIm')
+    m.com_demand = commodity_subset(m.com_tuples, 'Demand')
+    m.com_env = commodity_subset(m.com_tuples, 'Env')
+    if m.mode['int']:
+        m.operational_pro_tuples = set(op_pro_tuples(m.pro_tuples, m))
+        m.inst_pro_tuples = set(inst_pro_tuples(m))
+    m.pro_input_tuples = [(stf, site, process, commodity)
+                          for (stf, site, process) in m.pro_tuples
+                          for (s, pro, commodity) in m.r_in_dict
+                          if process == pro and s == stf]
+    m.pro_output_tuples = [(stf, site, process, commodity)
+                           for (stf, site, process) in m.pro_tuples
+                           for (s, pro, commodity) in m.r_out_dict
+                           if process == pro and s == stf]
+    pro_maxgrad_tuples = [p for p in m.pro_tuples
+                          if m.process_dict['max-grad'][p] < 1.0 / dt]
+    pro_partial_tuples = list(dict.fromkeys(
+        (stf, site, process)
+        for (stf, site, process) in m.pro_tuples
+        for (s, pro, _) in m.r_in_min_fraction_dict
+        if process == pro and s == stf))
+    pro_partial_input_tuples = [
+        (stf, site, process, commodity)
+        for (stf, site, process) in pro_partial_tuples
+        for (s, pro, commodity) in m.r_in_min_fraction_dict
+        if process == pro and s == stf]
+    pro_partial_output_tuples = [
+        (stf, site, process, commodity)
+        for (stf, site, process) in pro_partial_tuples
+        for (s, pro, commodity) in m.r_out_min_fraction_dict
+        if process == pro and s == stf]
+    if m.mode['tve']:
+        tve_stflist = set(key[0] for key in
+                          m.eff_factor_dict[tuple(m.eff_factor_dict)[0]])
+        pro_timevar_output_tuples = list(dict.fromkeys(
+            (stf, site, process, commodity)
+            for stf in tve_stflist
+            for (site, process) in m.eff_factor_dict
+            for (st, pro, commodity) in m.r_out_dict
+            if process == pro and st == stf and commodity not in m.com_env))
+    else:
+        pro_timevar_output_tuples = []
+    stock_tuples = [c for c in m.com_tuples if c[2] in m.com_stock]
+    env_tuples = [c for c in m.com_tuples if c[2] in m.com_env]
+
+    # Variables
+    costs = lp.add_variable('costs', m.cost_type_list, ['cost_type'],
+                            lb=-np.inf)
+    e_co_stock = lp.add_variable('e_co_stock', stock_tuples,
+                                 ['t', 'stf', 'sit', 'com', 'com_type'], tm)
+    cap_pro_new = lp.add_variable('cap_pro_new', m.pro_tuples,
+                                  ['stf', 'sit', 'pro'])
+    cap_pro = _process_capacity(m, cap_pro_new)
+    lp.expressions['cap_pro'] = cap_pro
+    tau_pro = lp.add_variable('tau_pro', m.pro_tuples,
+                              ['t', 'stf', 'sit', 'pro'], lp.timesteps)
+    e_pro_in = lp.add_variable('e_pro_in', m.pro_input_tuples,
+                               ['t', 'stf', 'sit', 'pro', 'com'], tm)
+    e_pro_out = lp.add_variable('e_pro_out', m.pro_output_tuples,
+                                ['t', 'stf', 'sit', 'pro', 'com'], tm,
+                                lb=-np.inf)
+
+    # costs by type; the features add their terms to these rows
+    rows = lp.add_constraint('def_costs', m.cost_type_list, ['cost_type'],
+                             lower=0, upper=0)
+    lp.add_terms(rows, costs)
+    cost_row = dict(zip(m.cost_type_list, rows))
+
+    # commodity balance (cf. commodity_balance) as lists of (columns,
+    # coefficient) by (stf, sit, com); vertex terms of the features (dsm,
+    # bsp) as functions of the vertex rows by commodity tuple
+    balance = {}
+    surplus = {}
+    pro_in_idx = {p: k for k, p in enumerate(m.pro_input_tuples)}
+    pro_out_idx = {p: k for k, p in enumerate(m.pro_output_tuples)}
+    for key, tuples in m.balance_pro_in_dict.items():
+        balance.setdefault(key, []).extend(
+            (e_pro_in[pro_in_idx[p]], 1.0) for p in tuples)
+    for key, tuples in m.balance_pro_out_dict.items():
+        balance.setdefault(key, []).extend(
+            (e_pro_out[pro_out_idx[p]], -1.0) for p in tuples)
+
+    # Add additional features
+    if m.mode['tra']:
+        _add_transmission(lp, m, balance, cost_row, e_pro_out)
+    if m.mode['sto']:
+        _add_storage(lp, m, balance, cost_row)
+    if m.mode['dsm']:
+        _add_dsm(lp, m, surplus)
+    if m.mode['bsp']:
+        _add_buy_sell_price(lp, m, surplus, cost_row, cap_pro)
+
+    def add_balance(rows, key, coef):
+        for cols, sign in balance.get(key, ()):
+            lp.add_terms(rows, cols, coef * sign)
+
+    # commodity
+    vertex_tuples = [c for c in m.com_tuples
+                     if c[2] not in m.com_env and c[2] not in m.com_supim]
+    rows = lp.add_constraint(
+        'res_vertex', vertex_tuples, ['t', 'stf', 'sit', 'com', 'com_type'],
+        tm, lower=0, upper=0)
+    stock_idx = {c: k for k, c in enumerate(stock_tuples)}
+    for j, (stf, sit, com, com_type) in enumerate(vertex_tuples):
+        add_balance(rows[j], (stf, sit, com), -1.0)
+        if com in m.com_stock:
+            lp.add_terms(rows[j],
+                         e_co_stock[stock_idx[stf, sit, com, com_type]])
+        for add_surplus in surplus.get((stf, sit, com, com_type), ()):
+            add_surplus(rows[j])
+        if com in m.com_demand and (sit, com) in m.demand_dict:
+            lp.add_constant(rows[j], -_timeseries(m.demand_dict, (sit, com),
+                                                  stf, tm))
+
+    maxperhour = np.array([m.commodity_dict['maxperhour'][c]
+                           for c in stock_tuples]).reshape(-1, 1)
+    rows = lp.add_constraint(
+        'res_stock_step', stock_tuples,
+        ['t', 'stf', 'sit', 'com', 'com_type'], tm, upper=dt * maxperhour)
+    lp.add_terms(rows, e_co_stock)
+    rows = lp.add_constraint(
+        'res_stock_total', stock_tuples, ['stf', 'sit', 'com', 'com_type'],
+        upper=[m.commodity_dict['max'][c] for c in stock_tuples])
+    lp.add_terms(rows[:, np.newaxis], e_co_stock, weight)
+
+    maxperhour = np.array([m.commodity_dict['maxperhour'][c]
+                           for c in env_tuples]).reshape(-1, 1)
+    rows = lp.add_constraint(
+        'res_env_step', env_tuples, ['t', 'stf', 'sit', 'com', 'com_type'],
+        tm, upper=dt * maxperhour)
+    for j, c in enumerate(env_tuples):
+        add_balance(rows[j], c[:3], -1.0)
+    rows = lp.add_constraint(
+        'res_env_total', env_tuples, ['stf', 'sit', 'com', 'com_type'],
+        upper=[m.commodity_dict['max'][c] for c in env_tuples])
+    for j, c in enumerate(env_tuples):
+        add_balance(rows[j], c[:3], -weight)
+
+    # process
+    pro_idx = {p: k for k, p in enumerate(m.pro_tuples)}
+    labels = ['t', 'stf', 'sit', 'pro', 'com']
+
+    def ratio_rows(name, tuples, ratio, var, var_idx, ratio_min=None,
+                   eff=False):
+        # var == (tau_pro * throughput_factor
+        #         [+ dt * cap_pro * online_factor]) [* eff_factor]
+        rows = lp.add_constraint(name, tuples, labels, tm, lower=0, upper=0)
+        for j, (stf, sit, pro, com) in enumerate(tuples):
+            eff_factor = (_timeseries(m.eff_factor_dict, (sit, pro), stf, tm)
+                          if eff else np.ones(len(tm)))
+            R = ratio[(stf, pro, com)]
+            throughput_factor = R
+            if ratio_min is not None:
+                r = ratio_min[(stf, pro, com)]
+                min_fraction = m.process_dict['min-fraction'][
+                    (stf, sit, pro)]
+                online_factor = min_fraction * (r - R) / (1 - min_fraction)
+                throughput_factor = \
+                    (R - min_fraction * r) / (1 - min_fraction)
+                lp.add_expression(rows[j:j + 1], cap_pro,
+                                  [pro_idx[stf, sit, pro]],
+                                  -dt * online_factor * eff_factor[None, :])
+            lp.add_terms(rows[j], var[var_idx[stf, sit, pro, com]])
+            lp.add_terms(rows[j], tau_pro[pro_idx[stf, sit, pro], 1:],
+                         -throughput_factor * eff_factor)
+
+    partial_input = set(pro_partial_input_tuples)
+    partial_output = set(pro_partial_output_tuples)
+    timevar_output = set(pro_timevar_output_tuples)
+    ratio_rows('def_process_input',
+               [p for p in m.pro_input_tuples if p not in partial_input],
+               m.r_in_dict, e_pro_in, pro_in_idx)
+    ratio_rows('def_process_output',
+               [p for p in m.pro_output_tuples
+                if p not in partial_output and p not in timevar_output],
+               m.r_out_dict, e_pro_out, pro_out_idx)
+
+    tuples = [p for p in m.pro_input_tuples if p[3] in m.com_supim]
+    rows = lp.add_constraint('def_intermittent_supply', tuples, labels, tm,
+                             lower=0, upper=0)
+    for j, (stf, sit, pro, com) in enumerate(tuples):
+        lp.add_terms(rows[j], e_pro_in[pro_in_idx[stf, sit, pro, com]])
+        lp.add_expression(
+            rows[j:j + 1], cap_pro, [pro_idx[stf, sit, pro]],
+            -_timeseries(m.supim_dict, (sit, com), stf, tm)[None, :] * dt)
+
+    all_pro = range(len(m.pro_tuples))
+    rows = lp.add_constraint(
+        'res_process_throughput_by_capacity', m.pro_tuples,
+        ['t', 'stf', 'sit', 'pro'], tm, upper=0)
+    lp.add_terms(rows, tau_pro[:, 1:])
+    lp.add_expression(rows, cap_pro, all_pro, -dt)
+
+    # tau_pro[t-1] -/+ cap_pro * max-grad * dt <=/>= tau_pro[t]
+    index = [pro_idx[p] for p in pro_maxgrad_tuples]
+    max_grad = np.array([m.process_dict['max-grad'][p]
+                         for p in pro_maxgrad_tuples]).reshape(-1, 1)
+    rows = lp.add_constraint('res_process_maxgrad_lower', pro_maxgrad_tuples,
+                             ['t', 'stf', 'sit', 'pro'], tm, upper=0)
+    lp.add_terms(rows, tau_pro[index, :-1])
+    lp.add_terms(rows, tau_pro[index, 1:], -1.0)
+    lp.add_expression(rows, cap_pro, index,
+                      np.broadcast_to(-max_grad * dt, rows.shape))
+    rows = lp.add_constraint('res_process_maxgrad_upper', pro_maxgrad_tuples,
+                             ['t', 'stf', 'sit', 'pro'], tm, lower=0)
+    lp.add_terms(rows, tau_pro[index, :-1])
+    lp.add_terms(rows, tau_pro[index, 1:], -1.0)
+    lp.add_expression(rows, cap_pro, index,
+                      np.broadcast_to(max_grad * dt, rows.shape))
+
+    rows = lp.add_constraint(
+        'res_process_capacity', m.pro_tuples, ['stf', 'sit', 'pro'],
+        lower=[m.process_dict['cap-lo'][p] for p in m.pro_tuples],
+        upper=[m.process_dict['cap-up'][p] for p in m.pro_tuples])
+    lp.add_expression(rows, cap_pro, all_pro)
+
+    area_tuples = []
+    for (stf, sit) in m.site_dict['area']:
+        area_pro = [p for p in m.proc_area_dict
+                    if p[0] == stf and p[1] == sit]
+        if m.site_dict['area'][stf, sit] >= 0 and sum(
+                m.process_dict['area-per-cap'][p] for p in area_pro) > 0:
+            area_tuples.append(((stf, sit), area_pro))
+    rows = lp.add_constraint(
+        'res_area', [key for key, _ in area_tuples], ['stf', 'sit'],
+        upper=[m.site_dict['area'][key] for key, _ in area_tuples])
+    for j, (key, area_pro) in enumerate(area_tuples):
+        lp.add_expression(np.full(len(area_pro), rows[j]), cap_pro,
+                          [pro_idx[p] for p in area_pro],
+                          [m.process_dict['area-per-cap'][p]
+                           for p in area_pro])
+
+    index = [pro_idx[p] for p in pro_partial_tuples]
+    min_fraction = np.array([m.process_dict['min-fraction'][p]
+                             for p in pro_partial_tuples]).reshape(-1, 1)
+    rows = lp.add_constraint(
+        'res_throughput_by_capacity_min', pro_partial_tuples,
+        ['t', 'stf', 'sit', 'pro'], tm, lower=0)
+    lp.add_terms(rows, tau_pro[index, 1:])
+    lp.add_expression(rows, cap_pro, index,
+                      np.broadcast_to(-min_fraction * dt, rows.shape))
+    ratio_rows('def_partial_process_input', pro_partial_input_tuples,
+               m.r_in_dict, e_pro_in, pro_in_idx, m.r_in_min_fraction_dict)
+    ratio_rows('def_partial_process_output',
+               [p for p in pro_partial_output_tuples
+                if p not in timevar_output],
+               m.r_out_dict, e_pro_out, pro_out_idx,
+               m.r_out_min_fraction_dict)
+
+    # time variable efficiency
+    if m.mode['tve']:
+        ratio_rows('def_process_timevar_output',
+                   [p for p in pro_timevar_output_tuples
+                    if p not in partial_output],
+                   m.r_out_dict, e_pro_out, pro_out_idx, eff=True)
+        ratio_rows('def_process_partial_timevar_output',
+                   [p for p in pro_timevar_output_tuples
+                    if p in partial_output],
+                   m.r_out_dict, e_pro_out, pro_out_idx,
+                   m.r_out_min_fraction_dict, eff=True)
+
+    # costs (cf. def_costs_rule)
+    def column(name):
+        return np.array([m.process_dict[name][p] for p in m.pro_tuples])
+
+    invcost_factor = column('invcost-factor')
+    if m.mode['int']:
+        invcost_factor = invcost_factor - column('overpay-factor')
+    lp.add_terms(cost_row['Invest'], cap_pro_new,
+                 -column('inv-cost') * invcost_factor)
+    lp.add_expression(np.full(len(m.pro_tuples), cost_row['Fixed']),
+                      cap_pro, all_pro,
+                      -column('fix-cost') * column('cost_factor'))
+    lp.add_terms(cost_row['Variable'], tau_pro[:, 1:],
+                 -weight * (column('var-cost') *
+                            column('cost_factor')).reshape(-1, 1))
+    lp.add_terms(cost_row['Fuel'], e_co_stock, -weight * np.array(
+        [m.commodity_dict['price'][c] * m.commodity_dict['cost_factor'][c]
+         for c in stock_tuples]).reshape(-1, 1))
+    for c in env_tuples:
+        add_balance(cost_row['Environmental'], c[:3],
+                    weight * m.commodity_dict['price'][c] *
+                    m.commodity_dict['cost_factor'][c])
+
+    # objective and global constraints
+    co2_tuples = [key for key in balance if key[2] == 'CO2']
+
+    def global_limit(stf, prop):
+        limit = m.global_prop_dict['value'][stf, prop]
+        return not math.isinf(limit) and limit >= 0
+
+    def add_co2_limit():
+        limits = [stf for stf in m.stf if global_limit(stf, 'CO2 limit')]
+        rows = lp.add_constraint(
+            'res_global_co2_limit', limits, ['stf'],
+            upper=[m.global_prop_dict['value'][stf, 'CO2 limit']
+                   for stf in limits])
+        for row, stf in zip(rows, limits):
+            for key in co2_tuples:
+                if key[0] == stf:
+                    add_balance(row, key, -weight)
+
+    def add_cost_limit():
+        limits = [stf for stf in m.stf if global_limit(stf, 'Cost limit')]
+        rows = lp.add_constraint(
+            'res_global_cost_limit', limits, ['stf'],
+            upper=[m.global_prop_dict['value'][stf, 'Cost limit']
+                   for stf in limits])
+        lp.add_terms(rows[:, np.newaxis], costs)
+
+    if objective == 'cost':
+        add_co2_limit()
+        if m.mode['int']:
+            if global_limit(min(m.stf_list), 'CO2 budget'):
+                rows = lp.add_constraint(
+                    'res_global_co2_budget', [None], ['None'],
+                    upper=m.global_prop_dict['value'][min(m.stf),
+                                                      'CO2 budget'])
+                for key in co2_tuples:
+                    add_balance(rows[0], key, -weight * stf_dist(key[0], m))
+            add_cost_limit()
+        lp.add_objective(costs)
+    else:
+        add_cost_limit()
+        if m.mode['int']:
+            if global_limit(min(m.stf), 'Cost budget'):
+                rows = lp.add_constraint(
+                    'res_global_cost_budget', [None], ['None'],
+                    upper=m.global_prop_dict['value'][min(m.stf),
+                                                      'Cost budget'])
+                lp.add_terms(rows[0], costs)
+            add_co2_limit()
+        for key in co2_tuples:
+            factor = stf_dist(key[0], m) if m.mode['int'] else 1
+            for cols, sign in balance[key]:
+                lp.add_objective(cols, -sign * weight * factor)
+
+    return lp
+
+
+def _process_capacity(m, cap_pro_new):
+    # total process capacity, cf. def_process_capacity_rule
+    cap_pro = LinearExpression(m.pro_tuples, ['stf', 'sit', 'pro'])
+    pro_idx = {p: k for k, p in enumerate(m.pro_tuples)}
+    for (stf, sit, pro) in m.pro_tuples:
+        key = (stf, sit, pro)
+        if m.mode['int']:
+            if (sit, pro, stf) in m.inst_pro_tuples and \
+                    (sit, pro, min(m.stf)) in m.pro_const_cap_dict:
+                cap_pro.add(key, coef=m.process_dict['inst-cap'][key])
+                continue
+            for stf_built in m.stf:
+                if (sit, pro, stf_built, stf) in m.operational_pro_tuples:
+                    cap_pro.add(key, cap_pro_new[pro_idx[stf_built, sit,
+                                                         pro]])
+            if (sit, pro, stf) in m.inst_pro_tuples:
+                cap_pro.add(key, coef=m.process_dict['inst-cap']
+                            [(min(m.stf), sit, pro)])
+        elif (sit, pro, stf) in m.pro_const_cap_dict:
+            cap_pro.add(key, coef=m.process_dict['inst-cap'][key])
+        else:
+            cap_pro.add(key, cap_pro_new[pro_idx[key]])
+            cap_pro.add(key, coef=m.process_dict['inst-cap'][key])
+    return cap_pro
+
+
+def _unit_capacity(m, tuples, labels, cap_new, inst_cap, const_cap_dict,
+                   operational, installed):
+    # total transmission or storage capacity, cf.
+    # def_transmission_capacity_rule and def_storage_capacity_rule
+    cap = LinearExpression(tuples, labels)
+    idx = {key: k for k, key in enumerate(tuples)}
+    for key in tuples:
+        stf, unit = key[0], key[1:]
+        if m.mode['int']:
+            if unit + (stf,) in installed and \
+                    (min(m.stf),) + unit in const_cap_dict:
+                cap.add(key, coef=inst_cap[(min(m.stf),) + unit])
+                continue
+            for stf_built in m.stf:
+                if unit + (stf_built, stf) in operational:
+                    cap.add(key, cap_new[idx[(stf_built,) + unit]])
+            if unit + (stf,) in installed:
+                cap.add(key, coef=inst_cap[(min(m.stf),) + unit])
+        elif key in const_cap_dict:
+            cap.add(key, coef=inst_cap[key])
+        else:
+            cap.add(key, cap_new[idx[key]])
+            cap.add(key, coef=inst_cap[key])
+    return cap
+
+
+def _add_transmission(lp, m, balance, cost_row, e_pro_out):
+    # cf. add_transmission
+    tm = lp.tm
+    tra_tuples = list(m.transmission_dict['eff'].keys())
+    tra_idx = {t: k for k, t in enumerate(tra_tuples)}
+    labels = ['stf', 'sit', 'sit_', 'tra', 'com']
+    if m.mode['int']:
+        operational = set(op_tra_tuples(tra_tuples, m))
+        installed = set(inst_tra_tuples(m))
+    else:
+        operational = installed = set()
+
+    # Variables
+    cap_tra_new = lp.add_variable('cap_tra_new', tra_tuples, labels)
+    cap_tra = _unit_capacity(m, tra_tuples, labels, cap_tra_new,
+                             m.transmission_dict['inst-cap'],
+                             m.tra_const_cap_dict, operational, installed)
+    lp.expressions['cap_tra'] = cap_tra
+    e_tra_in = lp.add_variable('e_tra_in', tra_tuples, ['t'] + labels, tm)
+    e_tra_out = lp.add_variable('e_tra_out', tra_tuples, ['t'] + labels, tm)
+
+    if m.track_origin:
+        _add_transmission_origin(lp, m, tra_tuples, e_tra_in, e_tra_out,
+                                 e_pro_out)
+    else:
+        eff = np.array([m.transmission_dict['eff'][t] for t in tra_tuples])
+        rows = lp.add_constraint('def_transmission_output', tra_tuples,
+                                 ['t'] + labels, tm, lower=0, upper=0)
+        lp.add_terms(rows, e_tra_out)
+        lp.add_terms(rows, e_tra_in, -eff.reshape(-1, 1))
+
+    all_tra = range(len(tra_tuples))
+    rows = lp.add_constraint('res_transmission_input_by_capacity',
+                             tra_tuples, ['t'] + labels, tm, upper=0)
+    lp.add_terms(rows, e_tra_in)
+    lp.add_expression(rows, cap_tra, all_tra, -lp.dt)
+    rows = lp.add_constraint(
+        'res_transmission_capacity', tra_tuples, labels,
+        lower=[m.transmission_dict['cap-lo'][t] for t in tra_tuples],
+        upper=[m.transmission_dict['cap-up'][t] for t in tra_tuples])
+    lp.add_expression(rows, cap_tra, all_tra)
+    rows = lp.add_constraint('res_transmission_symmetry', tra_tuples, labels,
+                             lower=0, upper=0)
+    lp.add_expression(rows, cap_tra, all_tra)
+    lp.add_expression(rows, cap_tra,
+                      [tra_idx[stf, sout, sin, tra, com]
+                       for (stf, sin, sout, tra, com) in tra_tuples], -1.0)
+
+    # commodity balance: exports increase, imports decrease consumption
+    for k, t in enumerate(tra_tuples):
+        balance.setdefault((t[0], t[1], t[4]), []).append(
+            (e_tra_in[k], 1.0))
+        balance.setdefault((t[0], t[2], t[4]), []).append(
+            (e_tra_out[k], -1.0))
+
+    # costs (cf. transmission_cost)
+    def column(name):
+        return np.array([m.transmission_dict[name][t] for t in tra_tuples])
+
+    invcost_factor = column('invcost-factor')
+    if m.mode['int']:
+        invcost_factor = invcost_factor - column('overpay-factor')
+    lp.add_terms(cost_row['Invest'], cap_tra_new,
+                 -column('inv-cost') * invcost_factor / 2)
+    lp.add_expression(np.full(len(tra_tuples), cost_row['Fixed']), cap_tra,
+                      all_tra,
+                      -column('fix-cost') * column('cost_factor') / 2)
+    lp.add_terms(cost_row['Variable'], e_tra_in,
+                 -lp.weight * lp.timestep_weight *
+                 (column('var-cost') * column('cost_factor') / 2)
+                 .reshape(-1, 1))
+
+
+def _add_transmission_origin(lp, m, tra_tuples, e_tra_in, e_tra_out,
+                             e_pro_out):
+    # cf. add_transmission_origin
+    tm = lp.tm
+    labels = ['t', 'stf', 'sit', 'sit_', 'tra', 'com', 'pro']
+    origin = origin_pro_tuples(m)
+    origin_tuples = [t + (pro,) for t in tra_tuples
+                     for pro in origin.get((t[0], t[4]), ())]
+    tra_idx = {t: k for k, t in enumerate(tra_tuples)}
+    origin_idx = {t: k for k, t in enumerate(origin_tuples)}
+    e_tra_in_p = lp.add_variable('e_tra_in_p', origin_tuples, labels, tm)
+    e_tra_out_p = lp.add_variable('e_tra_out_p', origin_tuples, labels, tm)
+
+    # transmission flow == sum of flows per process
+    tra_rows = [tra_idx[t[:5]] for t in origin_tuples]
+    for name, total, per_pro in (('def_e_tra_in', e_tra_in, e_tra_in_p),
+                                 ('def_e_tra_out', e_tra_out, e_tra_out_p)):
+        rows = lp.add_constraint(name, tra_tuples, labels[:-1], tm,
+                                 lower=0, upper=0)
+        lp.add_terms(rows, total)
+        lp.add_terms(rows[tra_rows], per_pro, -1.0)
+
+    eff = np.array([m.transmission_dict['eff'][t[:5]] for t in origin_tuples])
+    rows = lp.add_constraint('def_transmission_output', origin_tuples,
+                             labels, tm, lower=0, upper=0)
+    lp.add_terms(rows, e_tra_out_p)
+    lp.add_terms(rows, e_tra_in_p, -eff.reshape(-1, 1))
+
+    # exports - imports per process <= its generation
+    pro_out_idx = {p: k for k, p in enumerate(m.pro_output_tuples)}
+    tra_pro_tuples = sorted(set((t[0], t[1], t[4], t[5])
+                                for t in origin_tuples))
+    rows = lp.add_constraint('res_transmission_balance_per_process',
+                             tra_pro_tuples, ['t', 'stf', 'sit', 'com', 'pro'],
+                             tm, upper=0)
+    for j, (stf, sit, com, pro) in enumerate(tra_pro_tuples):
+        for t in m.balance_tra_in_dict.get((stf, sit, com), ()):
+            lp.add_terms(rows[j], e_tra_in_p[origin_idx[t + (pro,)]])
+        for t in m.balance_tra_out_dict.get((stf, sit, com), ()):
+            lp.add_terms(rows[j], e_tra_out_p[origin_idx[t + (pro,)]], -1.0)
+        if (stf, sit, pro, com) in pro_out_idx:
+            lp.add_terms(rows[j], e_pro_out[pro_out_idx[stf, sit, pro, com]],
+                         -1.0)
+
+
+def _add_storage(lp, m, balance, cost_row):
+    # cf. add_storage
+    tm = lp.tm
+    sto_tuples = list(m.storage_dict['eff-in'].keys())
+    labels = ['stf', 'sit', 'sto', 'com']
+    if m.mode['int']:
+        operational = set(op_sto_tuples(sto_tuples, m))
+        installed = set(inst_sto_tuples(m))
+    else:
+        operational = installed = set()
+
+    # Variables
+    cap_sto_c_new = lp.add_variable('cap_sto_c_new', sto_tuples, labels)
+    cap_sto_p_new = lp.add_variable('cap_sto_p_new', sto_tuples, labels)
+    cap_sto_c = _unit_capacity(m, sto_tuples, labels, cap_sto_c_new,
+                               m.storage_dict['inst-cap-c'],
+                               m.sto_const_cap_c_dict, operational,
+                               installed)
+    cap_sto_p = _unit_capacity(m, sto_tuples, labels, cap_sto_p_new,
+                               m.storage_dict['inst-cap-p'],
+                               m.sto_const_cap_p_dict, operational,
+                               installed)
+    lp.expressions['cap_sto_c'] = cap_sto_c
+    lp.expressions['cap_sto_p'] = cap_sto_p
+    e_sto_in = lp.add_variable('e_sto_in', sto_tuples, ['t'] + labels, tm)
+    e_sto_out = lp.add_variable('e_sto_out', sto_tuples, ['t'] + labels, tm)
+    e_sto_con = lp.add_variable('e_sto_con', sto_tuples, ['t'] + labels,
+                                lp.timesteps)
+
+    def column(name):
+        return np.array([m.storage_dict[name][s]
+                         for s in sto_tuples]).reshape(-1, 1)
+
+    all_sto = range(len(sto_tuples))
+    sto_idx = {s: k for k, s in enumerate(sto_tuples)}
+
+    rows = lp.add_constraint('def_storage_state', sto_tuples,
+                             ['t'] + labels, tm, lower=0, upper=0)
+    lp.add_terms(rows, e_sto_con[:, 1:])
+    lp.add_terms(rows, e_sto_con[:, :-1], -(1 - column('discharge')) ** lp.dt)
+    lp.add_terms(rows, e_sto_in, -column('eff-in'))
+    lp.add_terms(rows, e_sto_out, 1 / column('eff-out'))
+
+    for name, var in (('res_storage_input_by_power', e_sto_in),
+                      ('res_storage_output_by_power', e_sto_out)):
+        rows = lp.add_constraint(name, sto_tuples, ['t'] + labels, tm,
+                                 upper=0)
+        lp.add_terms(rows, var)
+        lp.add_expression(rows, cap_sto_p, all_sto, -lp.dt)
+    rows = lp.add_constraint('res_storage_state_by_capacity', sto_tuples,
+                             ['t'] + labels, lp.timesteps, upper=0)
+    lp.add_terms(rows, e_sto_con)
+    lp.add_expression(rows, cap_sto_c, all_sto, -1.0)
+
+    rows = lp.add_constraint('res_storage_power', sto_tuples, labels,
+                             lower=column('cap-lo-p').ravel(),
+                             upper=column('cap-up-p').ravel())
+    lp.add_expression(rows, cap_sto_p, all_sto)
+    rows = lp.add_constraint('res_storage_capacity', sto_tuples, labels,
+                             lower=column('cap-lo-c').ravel(),
+                             upper=column('cap-up-c').ravel())
+    lp.add_expression(rows, cap_sto_c, all_sto)
+
+    tuples = list(m.stor_init_bound_dict.keys())
+    index = [sto_idx[s] for s in tuples]
+    rows = lp.add_constraint('def_initial_storage_state', tuples, labels,
+                             lower=0, upper=0)
+    lp.add_terms(rows, e_sto_con[index, 0])
+    lp.add_expression(rows, cap_sto_c, index,
+                      [-m.storage_dict['init'][s] for s in tuples])
+    rows = lp.add_constraint('res_storage_state_cyclicity', sto_tuples,
+                             labels, upper=0)
+    lp.add_terms(rows, e_sto_con[:, 0])
+    lp.add_terms(rows, e_sto_con[:, -1], -1.0)
+    tuples = list(m.sto_ep_ratio_dict.keys())
+    index = [sto_idx[s] for s in tuples]
+    rows = lp.add_constraint('def_storage_energy_power_ratio', tuples,
+                             labels, lower=0, upper=0)
+    lp.add_expression(rows, cap_sto_c, index)
+    lp.add_expression(rows, cap_sto_p, index,
+                      [-m.storage_dict['ep-ratio'][s] for s in tuples])
+
+    # commodity balance: storage input increases, output decreases
+    # consumption
+    for k, s in enumerate(sto_tuples):
+        balance.setdefault((s[0], s[1], s[3]), []).extend(
+            [(e_sto_in[k], 1.0), (e_sto_out[k], -1.0)])
+
+    # costs (cf. storage_cost)
+    invcost_factor = column('invcost-factor')
+    if m.mode['int']:
+        invcost_factor = invcost_factor - column('overpay-factor')
+    lp.add_terms(cost_row['Invest'], cap_sto_p_new,
+                 -(column('inv-cost-p') * invcost_factor).ravel())
+    lp.add_terms(cost_row['Invest'], cap_sto_c_new,
+                 -(column('inv-cost-c') * invcost_factor).ravel())
+    rows = np.full(len(sto_tuples), cost_row['Fixed'])
+    cost_factor = column('cost_factor')
+    lp.add_expression(rows, cap_sto_p, all_sto,
+                      -(column('fix-cost-p') * cost_factor).ravel())
+    lp.add_expression(rows, cap_sto_c, all_sto,
+                      -(column('fix-cost-c') * cost_factor).ravel())
+    lp.add_terms(cost_row['Variable'], e_sto_con[:, 1:],
+                 -lp.weight * lp.timestep_weight *
+                 column('var-cost-c') * cost_factor)
+    for var in (e_sto_in, e_sto_out):
+        lp.add_terms(cost_row['Variable'], var,
+                     -lp.weight * lp.timestep_weight *
+                     column('var-cost-p') * cost_factor)
+
+
+def _add_dsm(lp, m, surplus):
+    # cf. add_dsm
+    tm = lp.tm
+    position = {t: i for i, t in enumerate(tm)}
+    dsm_site_tuples = list(m.dsm_dict['delay'].keys())
+    labels = ['t', 'stf', 'sit', 'com']
+
+    def steps(name, key):
+        return max(int(1 / lp.dt * m.dsm_dict[name][key]), 1)
+
+    def column(name):
+        return np.array([m.dsm_dict[name][key]
+                         for key in dsm_site_tuples]).reshape(-1, 1)
+
+    # downshift in tt to compensate for upshift in t
+    dsm_down_tuples = [(t, tt) + key for key in dsm_site_tuples for t in tm
+                       for tt in dsm_time_tuples(t, tm, steps('delay', key))]
+
+    # Variables
+    dsm_up = lp.add_variable('dsm_up', dsm_site_tuples, labels, tm)
+    dsm_down = lp.add_variable('dsm_down', dsm_down_tuples,
+                               ['t', 't_', 'stf', 'sit', 'com'])
+
+    site_idx = {key: k for k, key in enumerate(dsm_site_tuples)}
+    down_site = np.array([site_idx[key[2:]] for key in dsm_down_tuples],
+                         dtype=int)
+    down_t = np.array([position[key[0]] for key in dsm_down_tuples],
+                      dtype=int)
+    down_tt = np.array([position[key[1]] for key in dsm_down_tuples],
+                       dtype=int)
+
+    # DSMup * efficiency factor n == DSMdo (summed)
+    rows = lp.add_constraint('def_dsm_variables', dsm_site_tuples, labels,
+                             tm, lower=0, upper=0)
+    lp.add_terms(rows[down_site, down_t], dsm_down)
+    lp.add_terms(rows, dsm_up, -column('eff'))
+
+    # DSMup <= Cup, DSMdo (summed) <= Cdo, DSMup + DSMdo <= max(Cup,Cdo)
+    rows = lp.add_constraint('res_dsm_upward', dsm_site_tuples, labels, tm,
+                             upper=lp.dt * column('cap-max-up'))
+    lp.add_terms(rows, dsm_up)
+    rows = lp.add_constraint('res_dsm_downward', dsm_site_tuples, labels,
+                             tm, upper=lp.dt * column('cap-max-do'))
+    lp.add_terms(rows[down_site, down_tt], dsm_down)
+    rows = lp.add_constraint(
+        'res_dsm_maximum', dsm_site_tuples, labels, tm,
+        upper=lp.dt * np.maximum(column('cap-max-up'),
+                                 column('cap-max-do')))
+    lp.add_terms(rows, dsm_up)
+    lp.add_terms(rows[down_site, down_tt], dsm_down)
+
+    # DSMup(t, t + recovery time R) <= Cup * delay time L
+    rows = lp.add_constraint('res_dsm_recovery', dsm_site_tuples, labels, tm,
+                             upper=column('cap-max-up') * column('delay'))
+    for k, key in enumerate(dsm_site_tuples):
+        recov = steps('recov', key)
+        for i, t in enumerate(tm):
+            lp.add_terms(rows[k, i], dsm_up[k, [
+                position[step] for step in dsm_recovery(t, tm, recov)]])
+
+    # vertex: - DSMup + DSMdo (summed), cf. dsm_surplus
+    def dsm_surplus(k):
+        down = np.flatnonzero(down_site == k)
+
+        def add_surplus(rows):
+            lp.add_terms(rows, dsm_up[k], -1.0)
+            lp.add_terms(rows[down_tt[down]], dsm_down[down])
+        return add_surplus
+
+    for c in m.com_tuples:
+        if c[:3] in site_idx:
+            surplus.setdefault(c, []).append(dsm_surplus(site_idx[c[:3]]))
+
+
+def _add_buy_sell_price(lp, m, surplus, cost_row, cap_pro):
+    # cf. add_buy_sell_price
+    tm = lp.tm
+    m.com_sell = commodity_subset(m.com_tuples, 'Sell')
+    m.com_buy = commodity_subset(m.com_tuples, 'Buy')
+    labels = ['t', 'stf', 'sit', 'com', 'com_type']
+    sell_tuples = [c for c in m.com_tuples if c[2] in m.com_sell]
+    buy_tuples = [c for c in m.com_tuples if c[2] in m.com_buy]
+
+    # Variables
+    e_co_sell = lp.add_variable('e_co_sell', sell_tuples, labels, tm)
+    e_co_buy = lp.add_variable('e_co_buy', buy_tuples, labels, tm)
+
+    for var, tuples, name in ((e_co_sell, sell_tuples, 'sell'),
+                              (e_co_buy, buy_tuples, 'buy')):
+        rows = lp.add_constraint(
+            'res_{}_step'.format(name), tuples, labels, tm,
+            upper=lp.dt * np.array([m.commodity_dict['maxperhour'][c]
+                                    for c in tuples]).reshape(-1, 1))
+        lp.add_terms(rows, var)
+        rows = lp.add_constraint(
+            'res_{}_total'.format(name), tuples, labels[1:],
+            upper=[m.commodity_dict['max'][c] for c in tuples])
+        lp.add_terms(rows[:, np.newaxis], var,
+                     lp.weight * lp.timestep_weight)
+
+    # power connection capacity: Sell == Buy
+    pro_idx = {p: k for k, p in enumerate(m.pro_tuples)}
+    symmetry = []
+    for (stf, sit, pro, com) in m.pro_input_tuples:
+        if com in m.com_buy:
+            sell_pro = search_sell_buy_tuple(m, stf, sit, pro, com)
+            if sell_pro is not None:
+                symmetry.append(((stf, sit, pro, com), sell_pro))
+    rows = lp.add_constraint('res_sell_buy_symmetry',
+                             [key for key, _ in symmetry],
+                             ['stf', 'sit', 'pro', 'com'], lower=0, upper=0)
+    lp.add_expression(rows, cap_pro, [pro_idx[key[:3]]
+                                      for key, _ in symmetry])
+    lp.add_expression(rows, cap_pro, [pro_idx[key[:2] + (sell_pro,)]
+                                      for key, sell_pro in symmetry], -1.0)
+
+    # vertex: - sell + buy, cf. bsp_surplus
+    for k, c in enumerate(sell_tuples):
+        surplus.setdefault(c, []).append(
+            lambda rows, k=k: lp.add_terms(rows, e_co_sell[k], -1.0))
+    for k, c in enumerate(buy_tuples):
+        surplus.setdefault(c, []).append(
+            lambda rows, k=k: lp.add_terms(rows, e_co_buy[k]))
+
+    # costs (cf. revenue_costs and purchase_costs)
+    def price(c):
+        try:
+            series = m.buy_sell_price_dict[c[2]]
+        except KeyError:
+            series = m.buy_sell_price_dict[c[2], ]
+        return (np.array([series[(c[0], t)] for t in tm]) * lp.weight *
+                lp.timestep_weight * m.commodity_dict['price'][c] *
+                m.commodity_dict['cost_factor'][c])
+
+    for k, c in enumerate(sell_tuples):
+        lp.add_terms(cost_row['Revenue'], e_co_sell[k], price(c))
+    for k, c in enumerate(buy_tuples):
+        lp.add_terms(cost_row['Purchase'], e_co_buy[k], -price(c))
+
+
+def solve_lp(lp, solver='glpk', logfile=None, tmpdir=None, threads=None):
+    """Solve a LinearProblem with glpk or cbc via an MPS file.
+
+    Args:
+        - lp: a LinearProblem, as returned by create_lp
+        - solver: 'glpk' or 'cbc' (the executable must be on the PATH)
+        - logfile: (optional) filename of the solver log
+        - tmpdir: (optional) directory for the MPS and solution file
+        - threads: (optional) number of solver threads (cbc only, glpk is
+          single-threaded)
+
+    Returns:
+        a ResultContainer with a result cache in the format of get_entity,
+        usable with report, result_figures and save
+    """
+    workdir = tempfile.mkdtemp(dir=tmpdir)
+    try:
+        mps_file = os.path.join(workdir, 'model.mps')
+        sol_file = os.path.join(workdir, 'model.sol')
+        written = lp.write_mps(mps_file)
+        if solver == 'glpk':
+            command = ['glpsol', '--freemps', mps_file, '-w', sol_file]
+            if logfile:
+                command += ['--log', logfile]
+            read_solution = _read_glpk_solution
+        elif solver == 'cbc':
+            command = ['cbc', mps_file]
+            if threads:
+                command += ['-threads', str(threads)]
+            command += ['-solve', '-printingOptions', 'all', '-solu', sol_file]
+            read_solution = _read_cbc_solution
+        else:
+            raise NotImplementedError("Solver '{}' is not supported by the "
+                                      "array-based backend; use glpk or "
+                                      "cbc.".format(solver))
+        output = subprocess.run(command, stdout=subprocess.PIPE,
+                                stderr=subprocess.STDOUT,
+                                universal_newlines=True).stdout
+        if logfile and solver == 'cbc':
+            with open(logfile, 'w') as f:
+                f.write(output)
+        x, duals = read_solution(sol_file, lp.n_cols, written)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    row_duals = np.full(lp.n_rows, np.nan)
+    row_duals[written] = duals
+    prob = ResultContainer(lp._data, lp_result_cache(lp, x, row_duals))
+    # attributes accessed by the reporting functions (cf. get_timeseries)
+    prob.mode = lp.mode
+    prob.demand_dict = lp.demand_dict
+    return prob
+
+
+def lp_result_cache(lp, x, duals):
+    """Result cache of a solved LinearProblem, cf. create_result_cache.
+
+    Args:
+        - lp: a LinearProblem
+        - x: array of column values
+        - duals: array of row duals, NaN for rows not passed to the solver
+
+    Returns:
+        dict of Series by entity name
+    """
+    result = {}
+    for name in lp.variables:
+        result[name] = lp.entity(name, x)
+    for name, expr in lp.expressions.items():
+        result[name] = _block_series(name, expr.value(x), expr.keys,
+                                     expr.labels)
+    for name in lp.constraints:
+        result[name] = lp.entity(name, duals).dropna()
+    result['tm'] = pd.Series(1, index=pd.Index(lp.tm, name='t'), name='tm')
+    result['dt'] = pd.Series([lp.dt], index=pd.Index([None], name='None'),
+                             name='dt')
+    result['weight'] = pd.Series([lp.weight],
+                                 index=pd.Index([None], name='None'),
+                                 name='weight')
+    result['timestep_weight'] = pd.Series(lp.timestep_weight,
+                                          index=pd.Index(lp.tm, name='t'),
+                                          name='timestep_weight')
+    return result
+
+
+def _read_glpk_solution(filename, n_cols, written):
+    # glpk raw solution format (glpsol -w): 's' status, 'i' rows, 'j' cols
+    with open(filename) as f:
+        lines = [line.split() for line in f if line[0] in 'sij']
+    status = lines[0]
+    if status[1] != 'bas' or status[4] != 'f' or status[5] != 'f':
+        raise RuntimeError('glpk did not find an optimal solution')
+    n_rows = int(status[2])
+    rows = [line for line in lines if line[0] == 'i']
+    cols = [line for line in lines if line[0] == 'j']
+    # glpk keeps the objective (free) row as first row
+    offset = n_rows - len(written)
+    duals = np.array([float(line[4]) for line in rows[offset:]])
+    x = np.array([float(line[3]) for line in cols])
+    return x[:n_cols], duals
+
+
+def _read_cbc_solution(filename, n_cols, written):
+    # cbc solution file: status line, then "index name value dual" lines
+    x = np.zeros(n_cols)
+    position = {r: i for i, r in enumerate(written)}
+    duals = np.zeros(len(written))
+    with open(filename) as f:
+        status = f.readline()
+        if not status.startswith('Optimal'):
+            raise RuntimeError('cbc did not find an optimal solution: '
+                               '{}'.format(status.strip()))
+        for line in f:
+            fields = line.replace('**', '').split()
+            name, value, dual = fields[1], fields[2], fields[3]
+            if name[0] == 'c':
+                x[int(name[1:])] = float(value)
+            elif name[0] == 'r':
+                duals[position[int(name[1:])]] = float(dual)
+    return x, duals
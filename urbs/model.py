@@ -1,12 +1,18 @@
 import math
+import numpy as np
 import pyomo.core as pyomo
 from datetime import datetime
 from .features import *
 from .input import *
+from .telemetry import BuildProfiler
+
+# global properties that can be changed by update_model
+GLOBAL_LIMITS = ['CO2 limit', 'CO2 budget', 'Cost limit', 'Cost budget']
 
 
 def create_model(data, dt=1, timesteps=None, objective='cost',
-                 dual=True):
+                 dual=True, mutable=False, profile=False, track_origin=True,
+                 substitute=False):
     """Create a pyomo ConcreteModel urbs object from given input data.
 
     Args:
@@ -17,6 +23,24 @@ def create_model(data, dt=1, timesteps=None, objective='cost',
           default: "cost"
         - dual: set True to add dual variables to model output
           (marginally slower), default: True
+        - mutable: set True to hold commodity prices, process capacity limits
+          and global limits in mutable parameters, which can then be changed
+          with update_model, default: False
+        - profile: set True to time the construction of each model component
+          and print a table of the most expensive ones; the table is kept in
+          m.build_profile (c.f. urbs.telemetry.BuildProfiler), default: False
+        - track_origin: track transmission flows by the process they
+          originate from, so that a site can only export what its processes
+          generate or what it imports (c.f. add_transmission_origin;
+          transport model only), default: True; set False for a smaller
+          model without res_transmission_balance_per_process, whose results
+          differ where that constraint binds (e.g. the costs of the single
+          year example drop by 8%)
+        - substitute: set True to replace e_pro_in and e_pro_out of all but
+          partial and time variable process inputs and outputs by their
+          definition tau_pro * ratio, which saves a variable and an equality
+          per timestep; e_pro_in and e_pro_out are then Expressions,
+          default: False
 
     Returns:
         a pyomo ConcreteModel object
@@ -26,9 +50,13 @@ def create_model(data, dt=1, timesteps=None, objective='cost',
     if not timesteps:
         timesteps = data['demand'].index.tolist()
     m = pyomo_model_prep(data, timesteps)  # preparing pyomo model
+    if profile:
+        profiler = BuildProfiler(m)
     m.name = 'urbs'
     m.created = datetime.now().strftime('%Y%m%dT%H%M')
     m._data = data
+    m.mutable = mutable
+    m.track_origin = track_origin
 
     # Parameters
 
@@ -38,7 +66,8 @@ def create_model(data, dt=1, timesteps=None, objective='cost',
     # costs are annual by default, variable costs are scaled by weight) and
     # among different simulation durations meaningful.
     m.weight = pyomo.Param(
-        initialize=float(8760) / ((len(m.timesteps) - 1) * dt),
+        initialize=float(8760) / (sum(m.timestep_weight_dict[t]
+                                      for t in m.timesteps[1:]) * dt),
         doc='Pre-factor for variable costs and emissions for an annual result')
 
     # dt = spacing between timesteps. Required for storage equation that
@@ -73,6 +102,13 @@ def create_model(data, dt=1, timesteps=None, objective='cost',
         ordered=True,
         doc='Set of modelled timesteps')
 
+    # timestep_weight = number of timesteps a modelled timestep stands for;
+    # scales costs and emissions together with weight (default: 1)
+    m.timestep_weight = pyomo.Param(
+        m.tm,
+        initialize=m.timestep_weight_dict,
+        doc='Number of timesteps represented by a modelled timestep')
+
     # support timeframes (e.g. 2020, 2030...)
     indexlist = set()
     for key in m.commodity_dict["price"]:
@@ -169,6 +205,32 @@ def create_model(data, dt=1, timesteps=None, objective='cost',
         initialize=commodity_subset(m.com_tuples, 'Env'),
         doc='Commodities that (might) have a maximum creation limit')
 
+    # commodity tuples for which a commodity balance is needed
+    m.com_balance_tuples = pyomo.Set(
+        within=m.stf * m.sit * m.com,
+        initialize=sorted(set((stf, sit, com)
+                              for (stf, sit, com, com_type) in m.com_tuples
+                              if com not in m.com_supim)),
+        doc='Commodities with a commodity balance by site,'
+            'e.g. (2020,Mid,Elec)')
+
+    # commodity tuples of the commodity constraints, so that these are only
+    # built where they apply
+    m.com_vertex_tuples = pyomo.Set(
+        within=m.stf * m.sit * m.com * m.com_type,
+        initialize=sorted(c for c in m.com_tuples
+                          if c[2] not in m.com_env and
+                          c[2] not in m.com_supim),
+        doc='Commodities with a vertex rule, e.g. (2020,Mid,Elec,Demand)')
+    m.com_stock_tuples = pyomo.Set(
+        within=m.stf * m.sit * m.com * m.com_type,
+        initialize=sorted(commodity_subset(m.com_tuples, m.com_stock)),
+        doc='Stock commodities by site, e.g. (2020,Mid,Gas,Stock)')
+    m.com_env_tuples = pyomo.Set(
+        within=m.stf * m.sit * m.com * m.com_type,
+        initialize=sorted(commodity_subset(m.com_tuples, m.com_env)),
+        doc='Environmental commodities by site, e.g. (2020,Mid,CO2,Env)')
+
     # process tuples for area rule
     m.pro_area_tuples = pyomo.Set(
         within=m.stf * m.sit * m.pro,
@@ -191,6 +253,11 @@ def create_model(data, dt=1, timesteps=None, objective='cost',
                     for (s, pro, commodity) in tuple(m.r_out_dict.keys())
                     if process == pro and s == stf],
         doc='Commodities produced by process by site, e.g. (2020,Mid,PV,Elec)')
+    m.pro_supim_input_tuples = pyomo.Set(
+        within=m.stf * m.sit * m.pro * m.com,
+        initialize=[p for p in m.pro_input_tuples if p[3] in m.com_supim],
+        doc='Intermittent commodities consumed by process by site,'
+            'e.g. (2020,Mid,PV,Solar)')
 
     # process tuples for maximum gradient feature
     m.pro_maxgrad_tuples = pyomo.Set(
@@ -228,6 +295,48 @@ def create_model(data, dt=1, timesteps=None, objective='cost',
                     if process == pro and s == stf],
         doc='Commodities with partial input ratio, e.g. (Mid,Coal PP,CO2)')
 
+    # process tuples for time variable efficiency
+    m.pro_timevar_output_tuples = pyomo.Set(
+        within=m.stf * m.sit * m.pro * m.com,
+        initialize=timevar_output_tuples(m) if m.mode['tve'] else [],
+        doc='Outputs of processes with time dependent efficiency')
+
+    # mutable parameters for scenarios (cf. update_model)
+    if mutable:
+        m.com_price = pyomo.Param(
+            m.com_tuples,
+            initialize=m.commodity_dict['price'],
+            mutable=True,
+            doc='Commodity price (EUR/MWh or factor for buy/sell prices)')
+        # cost rules look prices up in m.commodity_dict
+        m.commodity_dict['price'] = m.com_price
+        m.pro_cap_lo = pyomo.Param(
+            m.pro_tuples,
+            initialize=m.process_dict['cap-lo'],
+            mutable=True,
+            doc='Minimal process capacity (MW)')
+        m.pro_cap_up = pyomo.Param(
+            m.pro_tuples,
+            initialize=m.process_dict['cap-up'],
+            mutable=True,
+            doc='Maximal process capacity (MW)')
+        global_limits = {key: value
+                         for key, value in m.global_prop_dict['value'].items()
+                         if key[1] in GLOBAL_LIMITS}
+        m.global_limit_type = pyomo.Set(
+            initialize=GLOBAL_LIMITS,
+            doc='Set of global limit and budget types')
+        m.global_limit_tuples = pyomo.Set(
+            within=m.stf * m.global_limit_type,
+            initialize=tuple(global_limits.keys()),
+            doc='Combinations of support timeframes and global limits, '
+                'e.g. (2020,CO2 limit)')
+        m.global_limit = pyomo.Param(
+            m.global_limit_tuples,
+            initialize=global_limits,
+            mutable=True,
+            doc='Global CO2 and cost limits and budgets')
+
     # Variables
 
     # costs
@@ -238,7 +347,7 @@ def create_model(data, dt=1, timesteps=None, objective='cost',
 
     # commodity
     m.e_co_stock = pyomo.Var(
-        m.tm, m.com_tuples,
+        m.tm, m.com_stock_tuples,
         within=pyomo.NonNegativeReals,
         doc='Use of stock commodity source (MW) per timestep')
 
@@ -259,14 +368,36 @@ def create_model(data, dt=1, timesteps=None, objective='cost',
         m.t, m.pro_tuples,
         within=pyomo.NonNegativeReals,
         doc='Power flow (MW) through process')
-    m.e_pro_in = pyomo.Var(
-        m.tm, m.pro_input_tuples,
-        within=pyomo.NonNegativeReals,
-        doc='Power flow of commodity into process (MW) per timestep')
-    m.e_pro_out = pyomo.Var(
-        m.tm, m.pro_output_tuples,
-        within=pyomo.Reals,
-        doc='Power flow out of process (MW) per timestep')
+    if substitute:
+        # only partial and time variable inputs and outputs are variables
+        m.e_pro_in_var = pyomo.Var(
+            m.tm, m.pro_partial_input_tuples,
+            within=pyomo.NonNegativeReals,
+            doc='Power flow of commodity into partial process (MW) per '
+                'timestep')
+        m.e_pro_out_var = pyomo.Var(
+            m.tm, m.pro_output_tuples & (m.pro_partial_output_tuples |
+                                         m.pro_timevar_output_tuples),
+            within=pyomo.Reals,
+            doc='Power flow out of partial or time variable process (MW) per '
+                'timestep')
+        m.e_pro_in = pyomo.Expression(
+            m.tm, m.pro_input_tuples,
+            rule=e_pro_in_rule,
+            doc='Power flow of commodity into process (MW) per timestep')
+        m.e_pro_out = pyomo.Expression(
+            m.tm, m.pro_output_tuples,
+            rule=e_pro_out_rule,
+            doc='Power flow out of process (MW) per timestep')
+    else:
+        m.e_pro_in = pyomo.Var(
+            m.tm, m.pro_input_tuples,
+            within=pyomo.NonNegativeReals,
+            doc='Power flow of commodity into process (MW) per timestep')
+        m.e_pro_out = pyomo.Var(
+            m.tm, m.pro_output_tuples,
+            within=pyomo.Reals,
+            doc='Power flow out of process (MW) per timestep')
 
     # Add additional features
     # called features are declared in distinct files in features folder
@@ -283,10 +414,14 @@ def create_model(data, dt=1, timesteps=None, objective='cost',
         m = add_buy_sell_price(m)
     if m.mode['tve']:
         m = add_time_variable_efficiency(m)
-    else:
-        m.pro_timevar_output_tuples = pyomo.Set(
-            within=m.stf * m.sit * m.pro * m.com,
-            doc='empty set needed for (partial) process output')
+
+    # commodity balance as expression object, built once per (tm, stf, sit,
+    # com) and shared by vertex, environmental, cost and CO2 rules
+    m.e_balance = pyomo.Expression(
+        m.tm, m.com_balance_tuples,
+        rule=commodity_balance,
+        doc='Commodity balance (MW) per timestep, '
+            'consumption (positive) or creation (negative)')
 
     # Equation declarations
     # equation bodies are defined in separate functions, referred to here by
@@ -294,38 +429,39 @@ def create_model(data, dt=1, timesteps=None, objective='cost',
 
     # commodity
     m.res_vertex = pyomo.Constraint(
-        m.tm, m.com_tuples,
+        m.tm, m.com_vertex_tuples,
         rule=res_vertex_rule,
         doc='storage + transmission + process + source + buy - sell == demand')
     m.res_stock_step = pyomo.Constraint(
-        m.tm, m.com_tuples,
+        m.tm, m.com_stock_tuples,
         rule=res_stock_step_rule,
         doc='stock commodity input per step <= commodity.maxperstep')
     m.res_stock_total = pyomo.Constraint(
-        m.com_tuples,
+        m.com_stock_tuples,
         rule=res_stock_total_rule,
         doc='total stock commodity input <= commodity.max')
     m.res_env_step = pyomo.Constraint(
-        m.tm, m.com_tuples,
+        m.tm, m.com_env_tuples,
         rule=res_env_step_rule,
         doc='environmental output per step <= commodity.maxperstep')
     m.res_env_total = pyomo.Constraint(
-        m.com_tuples,
+        m.com_env_tuples,
         rule=res_env_total_rule,
         doc='total environmental commodity output <= commodity.max')
 
     # process
-    m.def_process_input = pyomo.Constraint(
-        m.tm, m.pro_input_tuples - m.pro_partial_input_tuples,
-        rule=def_process_input_rule,
-        doc='process input = process throughput * input ratio')
-    m.def_process_output = pyomo.Constraint(
-        m.tm, (m.pro_output_tuples - m.pro_partial_output_tuples -
-               m.pro_timevar_output_tuples),
-        rule=def_process_output_rule,
-        doc='process output = process throughput * output ratio')
+    if not substitute:
+        m.def_process_input = pyomo.Constraint(
+            m.tm, m.pro_input_tuples - m.pro_partial_input_tuples,
+            rule=def_process_input_rule,
+            doc='process input = process throughput * input ratio')
+        m.def_process_output = pyomo.Constraint(
+            m.tm, (m.pro_output_tuples - m.pro_partial_output_tuples -
+                   m.pro_timevar_output_tuples),
+            rule=def_process_output_rule,
+            doc='process output = process throughput * output ratio')
     m.def_intermittent_supply = pyomo.Constraint(
-        m.tm, m.pro_input_tuples,
+        m.tm, m.pro_supim_input_tuples,
         rule=def_intermittent_supply_rule,
         doc='process input = process capacity * supim timeseries')
     m.res_process_throughput_by_capacity = pyomo.Constraint(
@@ -432,9 +568,103 @@ def create_model(data, dt=1, timesteps=None, objective='cost',
     if dual:
         m.dual = pyomo.Suffix(direction=pyomo.Suffix.IMPORT)
 
+    if profile:
+        m.build_profile = profiler.stop()
+        print(m.build_profile.to_string())
+
     return m
 
 
+def update_model(m, data):
+    """Apply changed input data to a model created with mutable=True.
+
+    Commodity prices, process capacity limits and global limits/budgets are
+    changed in place. All other input must be unchanged, and changes must not
+    add or remove constraints, i.e. a capacity limit or global limit may not
+    change from or to infinity and a process may not change from or to
+    constant capacity (inst-cap == cap-up).
+
+    Args:
+        - m: a urbs model instance created with mutable=True
+        - data: a validated input data dict, e.g. the input data of m
+          modified by a scenario function
+
+    Returns:
+        True if the model was updated, False if the changes require a new
+        model (create_model)
+    """
+    if not m.mutable:
+        raise ValueError("update_model requires a model created with "
+                         "mutable=True!")
+
+    # the model input contains additional columns added by pyomo_model_prep;
+    # compare the columns of the new input only
+    old_data = m._data
+    if set(data.keys()) != set(old_data.keys()):
+        return False
+    mutable_columns = {'commodity': ['price'],
+                       'process': ['cap-lo', 'cap-up'],
+                       'global_prop': ['value']}
+    for name, df in data.items():
+        old = old_data[name]
+        if (not df.index.equals(old.index) or
+                not set(df.columns) <= set(old.columns)):
+            return False
+        fixed = [col for col in df.columns
+                 if col not in mutable_columns.get(name, [])]
+        if not df[fixed].equals(old[fixed]):
+            return False
+
+    # global properties other than limits and budgets are fixed; a limit is
+    # only a constraint if it is finite and not negative
+    value, old_value = data['global_prop']['value'], m.global_prop['value']
+    is_limit = value.index.get_level_values(1).isin(GLOBAL_LIMITS)
+    if not value[~is_limit].equals(old_value[~is_limit]):
+        return False
+    if not ((np.isfinite(value) & (value >= 0))[is_limit].equals(
+            (np.isfinite(old_value) & (old_value >= 0))[is_limit])):
+        return False
+
+    # infinite capacity limits are no bounds, and processes with constant
+    # capacity have no capacity variable
+    process, old_process = data['process'], old_data['process']
+    for col in ['cap-lo', 'cap-up']:
+        if not np.isfinite(process[col]).equals(
+                np.isfinite(old_process[col])):
+            return False
+    const_cap = process['inst-cap'] == process['cap-up']
+    if not const_cap.equals(old_process['inst-cap'] ==
+                            old_process['cap-up']):
+        return False
+    # in intertemporal mode constant capacity depends on all support
+    # timeframes of a process
+    const_pro = const_cap[const_cap].index.droplevel(0)
+    changed = process['cap-up'] != old_process['cap-up']
+    if changed[changed].index.droplevel(0).isin(const_pro).any():
+        return False
+
+    # update parameters and the input data of the model
+    price = data['commodity']['price'].to_dict()
+    for key in m.com_price:
+        m.com_price[key] = price[key]
+    for col, param in [('cap-lo', m.pro_cap_lo), ('cap-up', m.pro_cap_up)]:
+        cap = process[col].to_dict()
+        for key in param:
+            param[key] = cap[key]
+        m.process_dict[col] = cap
+        old_process[col] = process[col]
+    for key in m.global_limit:
+        m.global_limit[key] = value[key]
+    old_data['commodity']['price'] = data['commodity']['price']
+    m.global_prop['value'] = value
+    m.global_prop_dict['value'] = value.to_dict()
+
+    # the result cache belongs to the previous solution
+    if hasattr(m, '_result'):
+        del m._result
+    return True
+
+
 # Constraints
 
 # commodity
@@ -444,11 +674,8 @@ def create_model(data, dt=1, timesteps=None, objective='cost',
 # storage activity (calculated by function commodity_balance);
 # contains implicit constraint for stock commodity source term
 def res_vertex_rule(m, tm, stf, sit, com, com_type):
-    # environmental or supim commodities don't have this constraint (yet)
-    if com in m.com_env:
-        return pyomo.Constraint.Skip
-    if com in m.com_supim:
-        return pyomo.Constraint.Skip
+    # environmental or supim commodities don't have this constraint (yet),
+    # c.f. m.com_vertex_tuples
 
     # helper function commodity_balance calculates balance from input to
     # and output from processes, storage and transmission.
@@ -456,7 +683,7 @@ def res_vertex_rule(m, tm, stf, sit, com, com_type):
     #                       amount of commodity com
     # if power_surplus < 0: production/storage/exports consume a net
     #                       amount of the commodity com
-    power_surplus = - commodity_balance(m, tm, stf, sit, com)
+    power_surplus = - m.e_balance[tm, stf, sit, com]
 
     # if com is a stock commodity, the commodity source term e_co_stock
     # can supply a possibly negative power_surplus
@@ -487,28 +714,22 @@ def res_vertex_rule(m, tm, stf, sit, com, com_type):
 
 
 def res_stock_step_rule(m, tm, stf, sit, com, com_type):
-    if com not in m.com_stock:
-        return pyomo.Constraint.Skip
-    else:
-        return (m.e_co_stock[tm, stf, sit, com, com_type] <=
-                m.dt * m.commodity_dict['maxperhour']
-                [(stf, sit, com, com_type)])
+    return (m.e_co_stock[tm, stf, sit, com, com_type] <=
+            m.dt * m.commodity_dict['maxperhour'][(stf, sit, com, com_type)])
 
 
 # limit stock commodity use in total (scaled to annual consumption, thanks
 # to m.weight)
 def res_stock_total_rule(m, stf, sit, com, com_type):
-    if com not in m.com_stock:
-        return pyomo.Constraint.Skip
-    else:
-        # calculate total consumption of commodity com
-        total_consumption = 0
-        for tm in m.tm:
-            total_consumption += (
-                m.e_co_stock[tm, stf, sit, com, com_type])
-        total_consumption *= m.weight
-        return (total_consumption <=
-                m.commodity_dict['max'][(stf, sit, com, com_type)])
+    # calculate total consumption of commodity com
+    total_consumption = 0
+    for tm in m.tm:
+        total_consumption += (
+            m.e_co_stock[tm, stf, sit, com, com_type] *
+            m.timestep_weight[tm])
+    total_consumption *= m.weight
+    return (total_consumption <=
+            m.commodity_dict['max'][(stf, sit, com, com_type)])
 
 
 # environmental commodity creation == - commodity_balance of that commodity
@@ -516,28 +737,22 @@ def res_stock_total_rule(m, stf, sit, com, com_type):
 # any process activity;
 # limit environmental commodity output per time step
 def res_env_step_rule(m, tm, stf, sit, com, com_type):
-    if com not in m.com_env:
-        return pyomo.Constraint.Skip
-    else:
-        environmental_output = - commodity_balance(m, tm, stf, sit, com)
-        return (environmental_output <=
-                m.dt * m.commodity_dict['maxperhour']
-                [(stf, sit, com, com_type)])
+    environmental_output = - m.e_balance[tm, stf, sit, com]
+    return (environmental_output <=
+            m.dt * m.commodity_dict['maxperhour'][(stf, sit, com, com_type)])
 
 
 # limit environmental commodity output in total (scaled to annual
 # emissions, thanks to m.weight)
 def res_env_total_rule(m, stf, sit, com, com_type):
-    if com not in m.com_env:
-        return pyomo.Constraint.Skip
-    else:
-        # calculate total creation of environmental commodity com
-        env_output_sum = 0
-        for tm in m.tm:
-            env_output_sum += (- commodity_balance(m, tm, stf, sit, com))
-        env_output_sum *= m.weight
-        return (env_output_sum <=
-                m.commodity_dict['max'][(stf, sit, com, com_type)])
+    # calculate total creation of environmental commodity com
+    env_output_sum = 0
+    for tm in m.tm:
+        env_output_sum += (- m.e_balance[tm, stf, sit, com] *
+                           m.timestep_weight[tm])
+    env_output_sum *= m.weight
+    return (env_output_sum <=
+            m.commodity_dict['max'][(stf, sit, com, com_type)])
 
 
 # process
@@ -582,14 +797,29 @@ def def_process_output_rule(m, tm, stf, sit, pro, com):
             m.tau_pro[tm, stf, sit, pro] * m.r_out_dict[(stf, pro, com)])
 
 
+# process input power (for m.e_pro_in Expression, if substituted):
+# process throughput * input ratio, a variable for partial inputs
+def e_pro_in_rule(m, tm, stf, sit, pro, com):
+    if (stf, sit, pro, com) in m.pro_partial_input_tuples:
+        return m.e_pro_in_var[tm, stf, sit, pro, com]
+    return m.tau_pro[tm, stf, sit, pro] * m.r_in_dict[(stf, pro, com)]
+
+
+# process output power (for m.e_pro_out Expression, if substituted):
+# process throughput * output ratio, a variable for partial and time
+# variable outputs
+def e_pro_out_rule(m, tm, stf, sit, pro, com):
+    if ((stf, sit, pro, com) in m.pro_partial_output_tuples or
+            (stf, sit, pro, com) in m.pro_timevar_output_tuples):
+        return m.e_pro_out_var[tm, stf, sit, pro, com]
+    return m.tau_pro[tm, stf, sit, pro] * m.r_out_dict[(stf, pro, com)]
+
+
 # process input (for supim commodity) = process capacity * timeseries
 def def_intermittent_supply_rule(m, tm, stf, sit, pro, coin):
-    if coin in m.com_supim:
-        return (m.e_pro_in[tm, stf, sit, pro, coin] ==
-                m.cap_pro[stf, sit, pro] * m.supim_dict[(sit, coin)]
-                [(stf, tm)] * m.dt)
-    else:
-        return pyomo.Constraint.Skip
+    return (m.e_pro_in[tm, stf, sit, pro, coin] ==
+            m.cap_pro[stf, sit, pro] * m.supim_dict[(sit, coin)][(stf, tm)] *
+            m.dt)
 
 
 # process throughput <= process capacity
@@ -649,6 +879,10 @@ def def_partial_process_output_rule(m, tm, stf, sit, pro, coo):
 
 # lower bound <= process capacity <= upper bound
 def res_process_capacity_rule(m, stf, sit, pro):
+    if m.mutable:
+        return (mutable_bound(m.pro_cap_lo[stf, sit, pro]),
+                m.cap_pro[stf, sit, pro],
+                mutable_bound(m.pro_cap_up[stf, sit, pro]))
     return (m.process_dict['cap-lo'][stf, sit, pro],
             m.cap_pro[stf, sit, pro],
             m.process_dict['cap-up'][stf, sit, pro])
@@ -678,15 +912,16 @@ def res_global_co2_limit_rule(m, stf):
         co2_output_sum = 0
         for tm in m.tm:
             for sit in m.sit:
+                if (stf, sit, 'CO2') not in m.com_balance_tuples:
+                    continue
                 # minus because negative commodity_balance represents creation
                 # of that commodity.
-                co2_output_sum += (- commodity_balance(m, tm,
-                                                       stf, sit, 'CO2'))
+                co2_output_sum += (- m.e_balance[tm, stf, sit, 'CO2'] *
+                                   m.timestep_weight[tm])
 
         # scaling to annual output (cf. definition of m.weight)
         co2_output_sum *= m.weight
-        return (co2_output_sum <= m.global_prop_dict['value']
-                                                    [stf, 'CO2 limit'])
+        return (co2_output_sum <= global_limit_bound(m, (stf, 'CO2 limit')))
     else:
         return pyomo.Constraint.Skip
 
@@ -700,15 +935,16 @@ def res_global_co2_budget_rule(m):
         for stf in m.stf:
             for tm in m.tm:
                 for sit in m.sit:
+                    if (stf, sit, 'CO2') not in m.com_balance_tuples:
+                        continue
                     # minus because negative commodity_balance represents
                     # creation of that commodity.
-                    co2_output_sum += (- commodity_balance
-                                       (m, tm, stf, sit, 'CO2') *
-                                       m.weight *
+                    co2_output_sum += (- m.e_balance[tm, stf, sit, 'CO2'] *
+                                       m.weight * m.timestep_weight[tm] *
                                        stf_dist(stf, m))
 
         return (co2_output_sum <=
-                m.global_prop_dict['value'][min(m.stf), 'CO2 budget'])
+                global_limit_bound(m, (min(m.stf), 'CO2 budget')))
     else:
         return pyomo.Constraint.Skip
 
@@ -718,8 +954,8 @@ def res_global_cost_limit_rule(m, stf):
     if math.isinf(m.global_prop_dict["value"][stf, "Cost limit"]):
         return pyomo.Constraint.Skip
     elif m.global_prop_dict["value"][stf, "Cost limit"] >= 0:
-        return(pyomo.summation(m.costs) <= m.global_prop_dict["value"]
-               [stf, "Cost limit"])
+        return(pyomo.summation(m.costs) <=
+               global_limit_bound(m, (stf, "Cost limit")))
     else:
         return pyomo.Constraint.Skip
 
@@ -729,12 +965,28 @@ def res_global_cost_budget_rule(m):
     if math.isinf(m.global_prop_dict["value"][min(m.stf), "Cost budget"]):
         return pyomo.Constraint.Skip
     elif m.global_prop_dict["value"][min(m.stf), "Cost budget"] >= 0:
-        return(pyomo.summation(m.costs) <= m.global_prop_dict["value"]
-               [min(m.stf), "Cost budget"])
+        return(pyomo.summation(m.costs) <=
+               global_limit_bound(m, (min(m.stf), "Cost budget")))
     else:
         return pyomo.Constraint.Skip
 
 
+# constraint bound from a mutable parameter; None (i.e. no bound) if the
+# parameter value is not finite
+def mutable_bound(param):
+    if math.isfinite(pyomo.value(param)):
+        return param
+    return None
+
+
+# global limit or budget as constraint bound, a mutable parameter if the model
+# was created with mutable=True
+def global_limit_bound(m, key):
+    if m.mutable:
+        return m.global_limit[key]
+    return m.global_prop_dict['value'][key]
+
+
 # Costs and emissions
 def def_costs_rule(m, cost_type):
     #Calculate total costs by cost type.
@@ -784,7 +1036,7 @@ def def_costs_rule(m, cost_type):
 
     elif cost_type == 'Variable':
         cost = \
-            sum(m.tau_pro[(tm,) + p] * m.weight *
+            sum(m.tau_pro[(tm,) + p] * m.weight * m.timestep_weight[tm] *
                 m.process_dict['var-cost'][p] *
                 m.process_dict['cost_factor'][p]
                 for tm in m.tm
@@ -797,20 +1049,19 @@ def def_costs_rule(m, cost_type):
 
     elif cost_type == 'Fuel':
         return m.costs[cost_type] == sum(
-            m.e_co_stock[(tm,) + c] * m.weight *
+            m.e_co_stock[(tm,) + c] * m.weight * m.timestep_weight[tm] *
             m.commodity_dict['price'][c] *
             m.commodity_dict['cost_factor'][c]
-            for tm in m.tm for c in m.com_tuples
-            if c[2] in m.com_stock)
+            for tm in m.tm for c in m.com_stock_tuples)
 
     elif cost_type == 'Environmental':
         return m.costs[cost_type] == sum(
-            - commodity_balance(m, tm, stf, sit, com) * m.weight *
+            - m.e_balance[tm, stf, sit, com] * m.weight *
+            m.timestep_weight[tm] *
             m.commodity_dict['price'][(stf, sit, com, com_type)] *
             m.commodity_dict['cost_factor'][(stf, sit, com, com_type)]
             for tm in m.tm
-            for stf, sit, com, com_type in m.com_tuples
-            if com in m.com_env)
+            for stf, sit, com, com_type in m.com_env_tuples)
 
     # Revenue and Purchase costs defined in BuySellPrice.py
     elif cost_type == 'Revenue':
@@ -833,13 +1084,16 @@ def co2_rule(m):
     for stf in m.stf:
         for tm in m.tm:
             for sit in m.sit:
+                if (stf, sit, 'CO2') not in m.com_balance_tuples:
+                    continue
                 # minus because negative commodity_balance represents
                 # creation of that commodity.
                 if m.mode['int']:
-                    co2_output_sum += (- commodity_balance(m, tm, stf, sit, 'CO2') *
-                                       m.weight * stf_dist(stf, m))
+                    co2_output_sum += (- m.e_balance[tm, stf, sit, 'CO2'] *
+                                       m.weight * m.timestep_weight[tm] *
+                                       stf_dist(stf, m))
                 else:
-                    co2_output_sum += (- commodity_balance(m, tm, stf, sit, 'CO2') *
-                                       m.weight)
+                    co2_output_sum += (- m.e_balance[tm, stf, sit, 'CO2'] *
+                                       m.weight * m.timestep_weight[tm])
 
     return (co2_output_sum)
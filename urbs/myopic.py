@@ -0,0 +1,251 @@
+import copy
+import math
+import pandas as pd
+import pyomo.core as pyomo
+from .model import create_model
+from .input import pyomo_model_prep
+from .features.modelhelper import op_pro_tuples, inst_pro_tuples, \
+                                  cost_factor
+from .features.transmission import op_tra_tuples, inst_tra_tuples
+from .features.storage import op_sto_tuples, inst_sto_tuples
+from .pyomoio import get_entity
+from .saveload import ResultContainer, create_result_cache
+
+# new capacities carried forward as installed capacities, by input sheet:
+# (new capacity variable, installed capacity column, upper limit column)
+CARRIED_CAPACITIES = {
+    'process': [('cap_pro_new', 'inst-cap', 'cap-up')],
+    'transmission': [('cap_tra_new', 'inst-cap', 'cap-up')],
+    'storage': [('cap_sto_c_new', 'inst-cap-c', 'cap-up-c'),
+                ('cap_sto_p_new', 'inst-cap-p', 'cap-up-p')]}
+
+# budgets that couple all support timeframes, by objective
+HORIZON_BUDGETS = {'cost': 'CO2 budget', 'CO2': 'Cost budget'}
+
+
+def solve_myopic(data, dt, timesteps, objective, optim, entities=None,
+                 dual=False):
+    """Solve an intertemporal model myopically, one support timeframe at a
+    time.
+
+    Each support timeframe is solved as a single-year model of its input
+    data, in ascending order. The capacities built in earlier support
+    timeframes are carried forward as installed capacity (inst-cap) while
+    they are operational, by the same depreciation and lifetime rules as in
+    the intertemporal model (c.f. op_pro_tuples and inst_pro_tuples). Upper
+    capacity limits below the carried capacity are raised to it.
+
+    The results of all support timeframes are merged into one result
+    container. Its costs are those of the intertemporal model for the
+    capacities and operation found, i.e. discounted and with rest values,
+    so that they compare to a perfect foresight run. The CO2 budget (or the
+    cost budget for the CO2 objective) couples all support timeframes and is
+    not supported.
+
+    Args:
+        - data: intertemporal input data dict
+        - dt: timestep duration in hours
+        - timesteps: list of timesteps
+        - objective: objective function, "cost" or "CO2"
+        - optim: a pyomo solver (c.f. runfunctions.setup_solver)
+        - entities: (optional) entities to extract from each support
+          timeframe (c.f. create_result_cache)
+        - dual: set True to add dual variables to the models
+
+    Returns:
+        a result container with the merged result cache of all support
+        timeframes, usable with report, plot and save
+    """
+    horizon_data = copy.deepcopy(data)
+    prep = horizon_model(horizon_data, timesteps)
+    if not prep.mode['int']:
+        raise ValueError("Myopic planning needs an intertemporal model!")
+    limits = prep.global_prop_dict['value']
+    budget = HORIZON_BUDGETS[objective]
+    if not math.isinf(limits.get((min(prep.stf), budget), math.inf)):
+        raise NotImplementedError("Myopic planning does not support a "
+                                  "{}!".format(budget))
+
+    lifetimes = lifetime_tuples(prep)
+    built = {variable: {}
+             for capacities in CARRIED_CAPACITIES.values()
+             for variable, _, _ in capacities}
+    caches = {}
+    for stf in sorted(prep.stf):
+        m = create_model(myopic_data(data, stf, built, lifetimes), dt,
+                         timesteps, objective, dual=dual)
+        result = optim.solve(m, tee=True)
+        if str(result.solver.termination_condition) != 'optimal':
+            # e.g. capacities of earlier support timeframes with a minimal
+            # part load may exceed a lower CO2 limit
+            raise RuntimeError(
+                "Support timeframe {} not solved to optimality: {}".format(
+                    stf, result.solver.termination_condition))
+        caches[stf] = create_result_cache(m, entities)
+        for variable in built:
+            if hasattr(m, variable):
+                values = get_entity(m, variable).fillna(0)
+                built[variable].update(values.to_dict())
+        del m
+
+    prob = ResultContainer(horizon_data,
+                           merge_results(prep, caches, built))
+    prob.mode = prep.mode
+    prob.demand_dict = prep.demand_dict
+    return prob
+
+
+def horizon_model(data, timesteps):
+    """Prepare the input data of an intertemporal model without building it.
+
+    Args:
+        - data: intertemporal input data dict, prepared in place
+        - timesteps: list of timesteps
+
+    Returns:
+        a rudimentary pyomo ConcreteModel with the prepared input (c.f.
+        pyomo_model_prep) and the set of support timeframes stf
+    """
+    m = pyomo_model_prep(data, timesteps)
+    m.stf = pyomo.Set(
+        initialize=m.stf_list,
+        doc='Set of modeled support timeframes (e.g. years)')
+    return m
+
+
+def lifetime_tuples(m):
+    """Return the operational status of units over the support timeframes.
+
+    Args:
+        - m: an intertemporal model (c.f. horizon_model)
+
+    Returns:
+        dict of {input sheet: (operational tuples, installed tuples)}, c.f.
+        op_pro_tuples and inst_pro_tuples
+    """
+    tuples = {'process': (
+        set(op_pro_tuples(m.process_dict['inv-cost'].keys(), m)),
+        set(inst_pro_tuples(m)))}
+    if m.mode['tra']:
+        tuples['transmission'] = (
+            set(op_tra_tuples(m.transmission_dict['eff'].keys(), m)),
+            set(inst_tra_tuples(m)))
+    if m.mode['sto']:
+        tuples['storage'] = (
+            set(op_sto_tuples(m.storage_dict['eff-in'].keys(), m)),
+            set(inst_sto_tuples(m)))
+    return tuples
+
+
+def myopic_data(data, stf, built, lifetimes):
+    """Return the input data of a support timeframe for a myopic run.
+
+    The installed capacity of a unit is the one installed in the first
+    support timeframe, while within its lifetime, plus the capacities built
+    in earlier support timeframes, while within their depreciation period.
+    Units that would not be operational in the support timeframe they are
+    built in cannot be expanded.
+
+    Args:
+        - data: intertemporal input data dict
+        - stf: a support timeframe
+        - built: dict of {new capacity variable: {key: capacity}} of the
+          support timeframes solved so far
+        - lifetimes: operational status of units (c.f. lifetime_tuples)
+
+    Returns:
+        input data dict of a single-year model
+    """
+    stfs = sorted(data['global_prop'].index.get_level_values(0).unique())
+    stf_data = {}
+    for name, frame in data.items():
+        if not frame.empty:
+            frame = frame[frame.index.get_level_values(0) == stf].copy()
+            frame.index = frame.index.remove_unused_levels()
+        if name in lifetimes and not frame.empty:
+            operational, installed = lifetimes[name]
+            for variable, inst_column, up_column in CARRIED_CAPACITIES[name]:
+                initial = data[name][inst_column]
+                capacities = []
+                expandable = []
+                for index in frame.index:
+                    key = index[1:]
+                    capacity = sum(
+                        built[variable].get((stf_built,) + key, 0)
+                        for stf_built in stfs
+                        if key + (stf_built, stf) in operational)
+                    if key + (stf,) in installed:
+                        capacity += initial.get((stfs[0],) + key, 0)
+                    capacities.append(capacity)
+                    expandable.append(key + (stf, stf) in operational)
+                frame[inst_column] = capacities
+                frame[up_column] = frame[[up_column, inst_column]].max(
+                    axis=1).where(expandable, frame[inst_column])
+        stf_data[name] = frame
+    return stf_data
+
+
+def merge_results(m, caches, built):
+    """Merge the result caches of all support timeframes.
+
+    Entities are concatenated over the support timeframes. Costs are
+    converted to those of the intertemporal model: invest costs of the new
+    capacities by the intertemporal invest factors minus rest values, all
+    other costs by the cost factor of their support timeframe.
+
+    Args:
+        - m: an intertemporal model (c.f. horizon_model)
+        - caches: dict of {stf: result cache}
+        - built: dict of {new capacity variable: {key: capacity}}
+
+    Returns:
+        the merged result cache
+    """
+    result = {}
+    first = caches[min(caches)]
+    for name in first:
+        entity = pd.concat([cache[name] for cache in caches.values()
+                            if name in cache])
+        result[name] = entity[~entity.index.duplicated()]
+
+    if 'costs' in result:
+        costs = first['costs'].copy()
+        for cost_type in costs.index:
+            if cost_type == 'Invest':
+                costs[cost_type] = invest_costs(m, built)
+            else:
+                costs[cost_type] = sum(
+                    cache['costs'][cost_type] * cost_factor(m, stf)
+                    for stf, cache in caches.items())
+        result['costs'] = costs
+    return result
+
+
+def invest_costs(m, built):
+    """Return the intertemporal invest costs of built capacities.
+
+    Args:
+        - m: an intertemporal model (c.f. horizon_model)
+        - built: dict of {new capacity variable: {key: capacity}}
+
+    Returns:
+        the invest costs, c.f. def_costs_rule
+    """
+    def factor(unit_dict, key):
+        return (unit_dict['invcost-factor'][key] -
+                unit_dict['overpay-factor'][key])
+
+    costs = sum(capacity * m.process_dict['inv-cost'][key] *
+                factor(m.process_dict, key)
+                for key, capacity in built['cap_pro_new'].items())
+    if m.mode['tra']:
+        costs += sum(capacity * m.transmission_dict['inv-cost'][key] *
+                     factor(m.transmission_dict, key) / 2
+                     for key, capacity in built['cap_tra_new'].items())
+    if m.mode['sto']:
+        for variable, column in [('cap_sto_c_new', 'inv-cost-c'),
+                                 ('cap_sto_p_new', 'inv-cost-p')]:
+            costs += sum(capacity * m.storage_dict[column][key] *
+                         factor(m.storage_dict, key)
+                         for key, capacity in built[variable].items())
+    return costs
@@ -0,0 +1,175 @@
+import pandas as pd
+from .saveload import ResultContainer, create_result_cache
+
+# units without capacity if all these columns are zero, by input sheet
+DEAD_COLUMNS = {
+    'process': ['inst-cap', 'cap-up'],
+    'transmission': ['inst-cap', 'cap-up'],
+    'storage': ['inst-cap-c', 'cap-up-c', 'inst-cap-p', 'cap-up-p']}
+
+# entities of the pruned units reinflated with zeros, by input sheet:
+# (entity, index names of the unit, timesteps: None, 't' (including the
+# initial timestep) or 'tm')
+PRUNED_ENTITIES = {
+    'process': [
+        ('cap_pro', ['stf', 'sit', 'pro'], None),
+        ('cap_pro_new', ['stf', 'sit', 'pro'], None),
+        ('tau_pro', ['stf', 'sit', 'pro'], 't')],
+    'transmission': [
+        ('cap_tra', ['stf', 'sit', 'sit_', 'tra', 'com'], None),
+        ('cap_tra_new', ['stf', 'sit', 'sit_', 'tra', 'com'], None),
+        ('e_tra_in', ['stf', 'sit', 'sit_', 'tra', 'com'], 'tm'),
+        ('e_tra_out', ['stf', 'sit', 'sit_', 'tra', 'com'], 'tm')],
+    'storage': [
+        ('cap_sto_c', ['stf', 'sit', 'sto', 'com'], None),
+        ('cap_sto_c_new', ['stf', 'sit', 'sto', 'com'], None),
+        ('cap_sto_p', ['stf', 'sit', 'sto', 'com'], None),
+        ('cap_sto_p_new', ['stf', 'sit', 'sto', 'com'], None),
+        ('e_sto_con', ['stf', 'sit', 'sto', 'com'], 't'),
+        ('e_sto_in', ['stf', 'sit', 'sto', 'com'], 'tm'),
+        ('e_sto_out', ['stf', 'sit', 'sto', 'com'], 'tm')]}
+
+# commodity sources reinflated with zeros, by commodity type
+PRUNED_SOURCES = {'Stock': 'e_co_stock', 'Sell': 'e_co_sell',
+                  'Buy': 'e_co_buy'}
+
+
+def prune_input(data):
+    """Remove units without capacity and unused commodities from the input.
+
+    Processes, transmissions and storages whose installed capacity and
+    capacity limit (both energy and power for storages) are zero in all
+    support timeframes cannot operate, but would still get all their
+    variables and constraints. Transmissions are only removed together with
+    their reverse direction, which is bound to the same capacity. Then, all
+    commodities of a site that no remaining process, transmission, storage,
+    demand or DSM uses are removed, as are the process commodities and time
+    variable efficiencies of the removed processes.
+
+    The objective of the pruned model is the same; reinflate_results adds
+    the removed units to its results with zeros.
+
+    Args:
+        - data: input data dict, unchanged
+
+    Returns:
+        (data, pruned): the pruned input data dict and a dict of the removed
+        rows (DataFrames) by input sheet
+    """
+    data = dict(data)
+    pruned = {}
+
+    def remove(name, dead):
+        if dead.any():
+            pruned[name] = data[name][dead]
+            data[name] = data[name][~dead]
+
+    for name, columns in DEAD_COLUMNS.items():
+        frame = data[name]
+        if frame.empty:
+            continue
+        dead = (frame[columns] == 0).all(axis=1)
+        # dead in all support timeframes, as capacities carry over
+        dead = dead.groupby(level=list(range(1, frame.index.nlevels))) \
+                   .transform('all')
+        if name == 'transmission':
+            dead_keys = set(dead.index[dead])
+            dead &= pd.Series([(stf, sout, sin, tra, com) in dead_keys or
+                               (stf, sout, sin, tra, com) not in frame.index
+                               for (stf, sin, sout, tra, com) in frame.index],
+                              index=frame.index)
+        remove(name, dead)
+
+    if 'process' in pruned:
+        pro = set((stf, pro) for (stf, sit, pro) in data['process'].index)
+        remove('process_commodity', pd.Series(
+            [key[:2] not in pro for key in data['process_commodity'].index],
+            index=data['process_commodity'].index))
+        if not data['eff_factor'].empty:
+            sit_pro = set(key[1:] for key in data['process'].index)
+            data['eff_factor'] = data['eff_factor'][
+                [column for column in data['eff_factor'].columns
+                 if column in sit_pro]]
+
+    # commodities used by (stf, sit)
+    coms = {}
+    for (stf, pro, com, direction) in data['process_commodity'].index:
+        coms.setdefault((stf, pro), set()).add(com)
+    used = set((stf, sit, com) for (stf, sit, pro) in data['process'].index
+               for com in coms.get((stf, pro), ()))
+    for (stf, sin, sout, tra, com) in data['transmission'].index:
+        used.update([(stf, sin, com), (stf, sout, com)])
+    for (stf, sit, sto, com) in data['storage'].index:
+        used.add((stf, sit, com))
+    used.update(key[:3] for key in data['dsm'].index)
+    demand = set(data['demand'].columns)
+    remove('commodity', pd.Series(
+        [key[:3] not in used and key[1:3] not in demand
+         for key in data['commodity'].index],
+        index=data['commodity'].index))
+    return data, pruned
+
+
+def reinflate_results(prob, data, pruned, timesteps):
+    """Add the units pruned from the input to the results with zeros.
+
+    Capacities and flows of the removed processes, transmissions and storages
+    and the sources of the removed commodities are added with zeros, so that
+    report, plot and save give the same output as for the unpruned model.
+
+    Args:
+        - prob: a solved urbs model instance or result container of the
+          pruned input data
+        - data: the input data dict before pruning
+        - pruned: dict of the removed rows by input sheet (c.f. prune_input)
+        - timesteps: list of modelled timesteps, the first one being the
+          initial timestep
+
+    Returns:
+        a result container of data and the reinflated result cache
+    """
+    if hasattr(prob, '_result'):
+        result = dict(prob._result)
+    else:
+        result = create_result_cache(prob)
+    timesteps = {None: [()], 't': [(t,) for t in timesteps],
+                 'tm': [(t,) for t in timesteps[1:]]}
+
+    def add_zeros(name, names, keys, steps):
+        keys = [t + key for t in timesteps[steps] for key in keys]
+        if not keys:
+            return
+        if steps:
+            names = ['t'] + names
+        zeros = pd.Series(0.0, name=name, index=pd.MultiIndex.from_tuples(
+            keys, names=names))
+        if name in result and not result[name].empty:
+            zeros = pd.concat([result[name], zeros])
+        result[name] = zeros
+
+    for name, entities in PRUNED_ENTITIES.items():
+        if name not in pruned:
+            continue
+        for entity, names, steps in entities:
+            add_zeros(entity, names, list(pruned[name].index), steps)
+    if 'process' in pruned:
+        ratios = data['process_commodity'].index
+        for entity, direction in [('e_pro_in', 'In'), ('e_pro_out', 'Out')]:
+            add_zeros(entity, ['stf', 'sit', 'pro', 'com'],
+                      [(stf, sit, pro, com)
+                       for (stf, sit, pro) in pruned['process'].index
+                       for (st, p, com, d) in ratios
+                       if st == stf and p == pro and d == direction],
+                      'tm')
+    if 'commodity' in pruned:
+        for com_type, entity in PRUNED_SOURCES.items():
+            if entity in result:
+                add_zeros(entity, ['stf', 'sit', 'com', 'com_type'],
+                          [key for key in pruned['commodity'].index
+                           if key[3] == com_type], 'tm')
+
+    container = ResultContainer(data, result)
+    # attributes accessed by the reporting functions (cf. get_timeseries)
+    container.mode = prob.mode
+    container.demand_dict = prob.demand_dict
+    return container
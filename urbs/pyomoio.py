@@ -24,13 +24,11 @@ def get_entity(instance, name):
     except AttributeError:
         return pd.Series(name=name)
 
-    # extract values
+    # extract index tuples and values in one pass
     if isinstance(entity, pyomo.Set):
-        if entity.dimen > 1:
-            results = pd.DataFrame([v + (1,) for v in entity.value])
-        else:
-            # Pyomo sets don't have values, only elements
-            results = pd.DataFrame([(v, 1) for v in entity.value])
+        # Pyomo sets don't have values, only elements
+        keys = list(entity.value)
+        values = [1] * len(keys)
 
         # for unconstrained sets, the column label is identical to their index
         # hence, make index equal to entity name and append underscore to name
@@ -40,63 +38,28 @@ def get_entity(instance, name):
             labels = [name]
             name = name + '_'
 
-    elif isinstance(entity, pyomo.Param):
-        if entity.dim() > 1:
-            results = pd.DataFrame(
-                [v[0] + (v[1],) for v in entity.iteritems()])
-        elif entity.dim() == 1:
-            results = pd.DataFrame(
-                [(v[0], v[1]) for v in entity.iteritems()])
-        else:
-            results = pd.DataFrame(
-                [(v[0], v[1].value) for v in entity.iteritems()])
-            labels = ['None']
+    elif isinstance(entity, pyomo.Constraint):
+        # keep only entries of the constraint with an existing dual variable
+        dual = instance.dual
+        keys, values = _unzip((key, dual[con])
+                              for key, con in entity._data.items()
+                              if con in dual)
 
     elif isinstance(entity, pyomo.Expression):
-        if entity.dim() > 1:
-            results = pd.DataFrame(
-                [v[0]+(v[1](),) for v in entity.iteritems()])
-        elif entity.dim() == 1:
-            results = pd.DataFrame(
-                [(v[0], v[1]()) for v in entity.iteritems()])
-        else:
-            results = pd.DataFrame(
-                [(v[0], v[1]()) for v in entity.iteritems()])
-            labels = ['None']
+        keys, values = _unzip((key, expr())
+                              for key, expr in entity._data.items())
 
-    elif isinstance(entity, pyomo.Constraint):
-        if entity.dim() > 1:
-            # check whether all entries of the constraint have
-            # an existing dual variable
-            # in that case add to results
-            results = pd.DataFrame(
-                [key + (instance.dual[entity.__getitem__(key)],)
-                 for (id, key) in entity.id_index_map().items()
-                 if id in instance.dual._dict.keys()])
-        elif entity.dim() == 1:
-            results = pd.DataFrame(
-                [(v[0], instance.dual[v[1]]) for v in entity.iteritems()])
-        else:
-            results = pd.DataFrame(
-                [(v[0], instance.dual[v[1]]) for v in entity.iteritems()])
-            labels = ['None']
+    elif isinstance(entity, pyomo.Param):
+        # values of mutable params are wrapped like scalar params
+        keys, values = _unzip((key, pyomo.value(val))
+                              for key, val in entity.iteritems())
 
     else:
-        # create DataFrame
-        if entity.dim() > 1:
-            # concatenate index tuples with value if entity has
-            # multidimensional indices v[0]
-            results = pd.DataFrame(
-                [v[0] + (v[1].value,) for v in entity.iteritems()])
-        elif entity.dim() == 1:
-            # otherwise, create tuple from scalar index v[0]
-            results = pd.DataFrame(
-                [(v[0], v[1].value) for v in entity.iteritems()])
-        else:
-            # assert(entity.dim() == 0)
-            results = pd.DataFrame(
-                [(v[0], v[1].value) for v in entity.iteritems()])
-            labels = ['None']
+        keys, values = _unzip((key, var.value)
+                              for key, var in entity._data.items())
+
+    if not isinstance(entity, pyomo.Set) and entity.dim() == 0:
+        labels = ['None']
 
     # check for duplicate onset names and append one to several "_" to make
     # them unique, e.g. ['sit', 'sit', 'com'] becomes ['sit', 'sit_', 'com']
@@ -104,19 +67,30 @@ def get_entity(instance, name):
         if label in labels[:k] or label == name:
             labels[k] = labels[k] + "_"
 
-    if not results.empty:
-        # name columns according to labels + entity name
-        results.columns = labels + [name]
-        results.set_index(labels, inplace=True)
-
-        # convert to Series
-        results = results[name]
+    if keys:
+        # build the index from one array per onset; single onsets give a
+        # plain index, like DataFrame.set_index would
+        if len(labels) > 1:
+            index = pd.MultiIndex.from_arrays(
+                [list(level) for level in zip(*keys)], names=labels)
+        else:
+            index = pd.Index(keys, name=labels[0], tupleize_cols=False)
+        results = pd.Series(values, index=index, name=name)
     else:
         # return empty Series
         results = pd.Series(name=name)
     return results
 
 
+def _unzip(items):
+    # split (key, value) pairs into a list of keys and a list of values
+    keys, values = [], []
+    for key, value in items:
+        keys.append(key)
+        values.append(value)
+    return keys, values
+
+
 def get_entities(instance, names):
     """ Return one DataFrame with entities in columns and a common index.
 
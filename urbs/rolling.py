@@ -0,0 +1,290 @@
+import copy
+import pandas as pd
+import pyomo.core as pyomo
+from .model import create_model
+from .pyomoio import get_entity
+from .saveload import ResultContainer, create_result_cache
+
+# capacity variables fixed in all windows of a rolling horizon
+CAPACITY_VARIABLES = ['cap_pro_new', 'cap_tra_new', 'cap_sto_c_new',
+                      'cap_sto_p_new']
+
+# cost types that do not depend on the modelled timesteps
+CAPACITY_COSTS = ['Invest', 'Fixed']
+
+
+def solve_rolling_horizon(data, dt, timesteps, objective, optim, window,
+                          overlap, capacities=None, entities=None,
+                          dual=False):
+    """Solve the dispatch of given input data in overlapping time windows.
+
+    The timesteps are cut into windows of window timesteps, each starting
+    window - overlap timesteps after the previous one. Every window is
+    modelled and solved on its own with all capacities fixed; only its first
+    window - overlap timesteps are committed, the overlap merely looks ahead.
+    Storage content (e_sto_con) and process throughput (tau_pro, for
+    gradients) at the initial timestep of a window are fixed to the committed
+    values of the previous window. At the end of every window, the storage
+    content must not be lower than at the start of the horizon, as in the
+    full model (res_storage_state_cyclicity in the first window,
+    res_rolling_storage_cyclicity in the following ones). So no window
+    drains the storage it hands over to the next one; within a window and
+    across the committed timesteps, storage shifts energy freely. The last
+    window only needs to reach the content at its own start if that is
+    lower, as there may be too little time left to refill it. DSM shifts
+    committed across the handover are owed by the next window: the
+    downshifts after the handover and the upshifts balancing the downshifts
+    before it (c.f. fix_handover). Annual limits (stock and environmental
+    totals, global limits) apply within each window, pro rata by its
+    length.
+
+    Only one window model is held in memory at a time.
+
+    Args:
+        - data: input data dict
+        - dt: timestep duration in hours
+        - timesteps: timesteps of the horizon, the first one being the
+          initial timestep
+        - objective: objective function, "cost" or "CO2"
+        - optim: a pyomo solver (c.f. runfunctions.setup_solver)
+        - window: number of timesteps per window
+        - overlap: number of look-ahead timesteps per window, which are
+          solved again by the next window
+        - capacities: (optional) a solved urbs model instance or result
+          container whose new capacities (cap_pro_new, cap_tra_new,
+          cap_sto_c_new, cap_sto_p_new) are used; default: no new capacities
+        - entities: (optional) entities to extract from each window
+          (c.f. create_result_cache)
+        - dual: set True to add dual variables to the window models
+
+    Returns:
+        a result container with the stitched result cache of all windows,
+        usable with report, plot and save
+    """
+    timesteps = list(timesteps)
+    if not 0 <= overlap < window:
+        raise ValueError("Rolling horizon overlap must be smaller than the "
+                         "window!")
+    step = window - overlap
+
+    parts = []
+    handover = None
+    start = 0
+    while True:
+        last = start + window >= len(timesteps) - 1
+        window_timesteps = timesteps[start:start + window + 1]
+        end = len(timesteps) - 1 if last else start + step
+
+        m = create_model(copy.deepcopy(data), dt, window_timesteps,
+                         objective, dual=dual)
+        fix_capacities(m, capacities)
+        if handover is None:
+            # horizon start: keep the initial storage state
+            first_content = None
+        else:
+            fix_handover(m, handover)
+        if m.mode['sto'] and first_content:
+            # the first window keeps res_storage_state_cyclicity, as its
+            # initial storage state is the one of the horizon
+            m.res_storage_state_cyclicity.deactivate()
+            final_content = {
+                key: (min(content, handover['e_sto_con'][key]) if last
+                      else content)
+                for key, content in first_content.items()
+                if content is not None and
+                handover['e_sto_con'][key] is not None}
+            m.res_rolling_storage_cyclicity = pyomo.Constraint(
+                list(final_content),
+                rule=lambda m, stf, sit, sto, com: (
+                    final_content[stf, sit, sto, com] <=
+                    m.e_sto_con[m.t[len(m.t)], stf, sit, sto, com]),
+                doc='storage content of the horizon start (or of the '
+                    'window start in the last window, if lower) <= final')
+
+        result = optim.solve(m, tee=True)
+        if str(result.solver.termination_condition) != 'optimal':
+            raise RuntimeError(
+                "Rolling horizon window from timestep {} not solved to "
+                "optimality: {}".format(
+                    timesteps[start], result.solver.termination_condition))
+
+        # committed timesteps, including the initial one of the horizon
+        committed = timesteps[0 if start == 0 else start + 1:end + 1]
+        parts.append((create_result_cache(m, entities), committed))
+        handover = handover_values(m, timesteps[end], handover)
+        if m.mode['sto'] and start == 0:
+            first_content = {key: m.e_sto_con[(timesteps[0],) + key].value
+                             for key in m.sto_tuples}
+
+        if last:
+            break
+        start += step
+        del m
+
+    prob = ResultContainer(m._data, stitch_results(parts, timesteps[0]))
+    prob.mode = m.mode
+    prob.demand_dict = m.demand_dict
+    return prob
+
+
+def fix_capacities(m, capacities=None):
+    """Fix the new capacities of a model to those of a solved model.
+
+    Args:
+        - m: a urbs model instance
+        - capacities: (optional) a solved urbs model instance or result
+          container; default: no new capacities
+
+    Returns:
+        Nothing
+    """
+    for name in CAPACITY_VARIABLES:
+        if not hasattr(m, name):
+            continue
+        if capacities is None:
+            values = pd.Series()
+        else:
+            values = get_entity(capacities, name)
+        for key, var in getattr(m, name).items():
+            value = values.get(key, 0)
+            var.fix(0 if pd.isnull(value) else value)
+
+
+def handover_values(m, t, handover=None):
+    """Return the values handed over to the next window at timestep t.
+
+    DSM shifts are handed over as the sums of the downshifts committed up to
+    t, by the timestep (after t) of the downshift ('dsm_down') or of the
+    upshift it balances ('dsm_up'), if the other timestep is after t.
+
+    Args:
+        - m: a solved urbs model instance
+        - t: the last committed timestep of the window
+        - handover: (optional) values handed over to the window, whose DSM
+          shifts still owed after t are passed on
+
+    Returns:
+        dict of {name: {key: value}} for tau_pro and e_sto_con (at t) and
+        dsm_down and dsm_up (by timestep, stf, site, commodity)
+    """
+    handover_next = {'tau_pro': {key: m.tau_pro[(t,) + key].value
+                                 for key in m.pro_tuples}}
+    if m.mode['sto']:
+        handover_next['e_sto_con'] = {key: m.e_sto_con[(t,) + key].value
+                                      for key in m.sto_tuples}
+    if m.mode['dsm']:
+        owed = {'dsm_down': {}, 'dsm_up': {}}
+        if handover is not None:
+            for name in owed:
+                owed[name].update((key, value) for key, value
+                                  in handover.get(name, {}).items()
+                                  if key[0] > t)
+        for (t_up, t_down, stf, sit, com), var in m.dsm_down.items():
+            if t_up <= t < t_down:
+                name, key = 'dsm_down', (t_down, stf, sit, com)
+            elif t_down <= t < t_up:
+                name, key = 'dsm_up', (t_up, stf, sit, com)
+            else:
+                continue
+            owed[name][key] = owed[name].get(key, 0) + (var.value or 0)
+        # the shifts owed cannot exceed the DSM capacities, but may by the
+        # tolerances of the solver, which would render the next window
+        # infeasible
+        dt = pyomo.value(m.dt)
+        for key, value in owed['dsm_down'].items():
+            owed['dsm_down'][key] = min(
+                value, dt * m.dsm_dict['cap-max-do'][key[1:]])
+        for key, value in owed['dsm_up'].items():
+            owed['dsm_up'][key] = min(
+                value, dt * m.dsm_dict['cap-max-up'][key[1:]] *
+                m.dsm_dict['eff'][key[1:]])
+        handover_next.update(owed)
+    return handover_next
+
+
+def fix_handover(m, handover):
+    """Fix the initial timestep of a window to the values handed over.
+
+    The initial storage state of the input (storage.init) only applies to
+    the first window, so def_initial_storage_state is deactivated. DSM
+    downshifts owed reduce the demand (res_vertex) and the DSM capacities
+    (res_dsm_downward, res_dsm_maximum) at their timestep, upshifts owed
+    are added to the downshifts they must balance (def_dsm_variables).
+
+    Args:
+        - m: a urbs model instance
+        - handover: values of the previous window (c.f. handover_values)
+
+    Returns:
+        Nothing
+    """
+    t0 = m.t[1]
+    for name in ['tau_pro', 'e_sto_con']:
+        var = getattr(m, name)
+        for key, value in handover.get(name, {}).items():
+            if value is not None:
+                var[(t0,) + key].fix(value)
+    if m.mode['sto']:
+        m.def_initial_storage_state.deactivate()
+    if m.mode['dsm']:
+        vertex = {key[:3]: key for key in m.com_vertex_tuples}
+        for (t, stf, sit, com), value in handover.get('dsm_down',
+                                                      {}).items():
+            if not value or t not in m.tm:
+                continue
+            add_to_constraint(m.res_vertex[(t,) + vertex[stf, sit, com]],
+                              value)
+            add_to_constraint(m.res_dsm_downward[t, stf, sit, com], value)
+            add_to_constraint(m.res_dsm_maximum[t, stf, sit, com], value)
+        for (t, stf, sit, com), value in handover.get('dsm_up', {}).items():
+            if value and t in m.tm:
+                add_to_constraint(m.def_dsm_variables[t, stf, sit, com],
+                                  value)
+
+
+def add_to_constraint(con, value):
+    # add a constant to the body of an equality or upper bound constraint
+    if con.equality:
+        con.set_value(con.body + value == con.upper)
+    else:
+        con.set_value(con.body + value <= con.upper)
+
+
+def stitch_results(parts, initial_timestep):
+    """Combine the committed timesteps of the result caches of all windows.
+
+    Entities with a timestep level 't' are concatenated from the committed
+    timesteps of each window, all others are taken from the first window.
+    The time dependent costs of each window are annualised by its own
+    weight, so they are averaged over the windows, each weighted by its
+    number of committed timesteps.
+
+    Args:
+        - parts: list of (result cache, committed timesteps) of the windows
+        - initial_timestep: initial timestep of the horizon
+
+    Returns:
+        the stitched result cache
+    """
+    result = {}
+    for name, first in parts[0][0].items():
+        if 't' in first.index.names:
+            result[name] = pd.concat(
+                [cache[name][cache[name].index.get_level_values('t')
+                             .isin(committed)]
+                 for cache, committed in parts])
+        else:
+            result[name] = first
+
+    if 'costs' in result:
+        costs = result['costs'].copy()
+        shares = [len([t for t in committed if t != initial_timestep])
+                  for _, committed in parts]
+        for cost_type in costs.index:
+            if cost_type in CAPACITY_COSTS:
+                continue
+            costs[cost_type] = sum(
+                cache['costs'][cost_type] * share
+                for (cache, _), share in zip(parts, shares)) / sum(shares)
+        result['costs'] = costs
+    return result
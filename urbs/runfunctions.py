@@ -1,13 +1,25 @@
 import os
+import copy
+import contextlib
+import traceback
 import pyomo.environ
+from concurrent.futures import ProcessPoolExecutor
 from pyomo.opt.base import SolverFactory
+from pyomo.solvers.plugins.solvers.persistent_solver import PersistentSolver
 from datetime import datetime, date
-from .model import create_model
+from .model import create_model, update_model
+from .matrix import create_lp, solve_lp
 from .report import *
 from .plot import *
 from .input import *
 from .validation import *
 from .saveload import *
+from .aggregation import aggregate_timeseries, resample_timeseries
+from .benders import solve_benders
+from .myopic import solve_myopic
+from .rolling import solve_rolling_horizon
+from .prune import prune_input, reinflate_results
+from .telemetry import RunTelemetry
 
 
 def prepare_result_directory(result_name):
@@ -31,7 +43,7 @@ def prepare_result_directory(result_name):
     return result_dir
 
 
-def setup_solver(optim, logfile='solver.log'):
+def setup_solver(optim, logfile='solver.log', threads=None):
     """ """
     if optim.name == 'gurobi':
         # reference with list of option names
@@ -50,15 +62,25 @@ def setup_solver(optim, logfile='solver.log'):
     else:
         print("Warning from setup_solver: no options set for solver "
               "'{}'!".format(optim.name))
+    if threads and optim.name in ['gurobi', 'cplex', 'cbc']:
+        # glpk is single-threaded
+        optim.set_options("threads={}".format(threads))
     return optim
 
 
 def run_scenario(input_files, Solver, timesteps, scenario, result_dir, dt,
                  objective, plot_tuples=None,  plot_sites_name=None,
                  plot_periods=None, report_tuples=None,
-                 report_sites_name=None):
+                 report_sites_name=None, backend='pyomo', typeperiods=None,
+                 threads=None, result_store='h5', trace_memory=False,
+                 run_history=None, horizon=None, resample=None,
+                 track_origin=True, substitute=False, prune=False):
     """ run an urbs model for given input, time steps and scenario
 
+    The time and memory of each stage of the run (read, scenario, validate,
+    create_model, solve, save, report, plot) are written to the run manifest
+    '<scenario>.telemetry.json' (and .csv) in result_dir.
+
     Args:
         - input_files: filenames of input Excel spreadsheets
         - Solver: the user specified solver
@@ -75,10 +97,56 @@ def run_scenario(input_files, Solver, timesteps, scenario, result_dir, dt,
           (c.f. urbs.report)
         - report_sites_name: (optional) dict of names for sites in
           report_tuples
+        - backend: (optional) 'pyomo' (default), 'matrix' for the
+          array-based model generation of urbs.matrix (glpk or cbc only),
+          'benders' to solve an intertemporal model by Benders decomposition
+          (c.f. urbs.solve_benders, cost objective only) or 'myopic' to solve
+          it one support timeframe at a time (c.f. urbs.solve_myopic)
+        - typeperiods: (optional) number of representative days to aggregate
+          the timeseries into (c.f. urbs.aggregate_timeseries)
+        - threads: (optional) number of solver threads
+        - result_store: (optional) 'h5' (default) to save the results to a
+          HDF5 file or 'parquet' for a parquet store directory (c.f. save)
+        - trace_memory: (optional) if True, the Python heap memory of each
+          stage of the run is traced (c.f. urbs.RunTelemetry)
+        - run_history: (optional) SQLite database file to append the run
+          manifest to (c.f. urbs.telemetry.append_history)
+        - horizon: (optional) tuple (window, overlap) of timesteps to solve
+          the dispatch in a rolling horizon (c.f. urbs.solve_rolling_horizon);
+          with typeperiods, the capacities are planned on the representative
+          periods first, else only the installed capacities are dispatched
+        - resample: (optional) number of timesteps to merge into one, e.g. 3
+          to model hourly input in 3h timesteps (c.f.
+          urbs.resample_timeseries); the period length of typeperiods and
+          the window of horizon are counted in resampled timesteps
+        - track_origin: (optional) if False, transmission flows are not
+          tracked by their origin process, which may change the results
+          (c.f. urbs.create_model); backends 'pyomo' and 'matrix' without a
+          rolling horizon only, default: True
+        - substitute: (optional) if True, process inputs and outputs are
+          substituted by their definition (c.f. urbs.create_model); backend
+          'pyomo' without a rolling horizon only
+        - prune: (optional) if True, units without capacity and unused
+          commodities are removed from the input before the model is
+          created and added to its results with zeros (c.f.
+          urbs.prune_input); not with a rolling horizon
 
     Returns:
-        the urbs model instance
+        the urbs model instance (or a result container for backends
+        'matrix', 'benders' and 'myopic', a rolling horizon or pruning)
     """
+    if horizon and backend != 'pyomo':
+        raise ValueError("A rolling horizon needs the pyomo backend!")
+    if backend == 'benders' and objective != 'cost':
+        raise ValueError("Benders decomposition needs the cost objective!")
+    if not track_origin and (horizon or backend not in ('pyomo', 'matrix')):
+        raise ValueError("Skipping origin tracking needs the pyomo or matrix "
+                         "backend without a rolling horizon!")
+    if substitute and (horizon or backend != 'pyomo'):
+        raise ValueError("Substitution needs the pyomo backend without a "
+                         "rolling horizon!")
+    if prune and horizon:
+        raise ValueError("Pruning does not support a rolling horizon!")
 
     # sets a modeled year for non-intertemporal problems
     # (necessary for consitency)
@@ -86,44 +154,356 @@ def run_scenario(input_files, Solver, timesteps, scenario, result_dir, dt,
 
     # scenario name, read and modify data for scenario
     sce = scenario.__name__
-    data = read_input(input_files, year)
-    data = scenario(data)
-    validate_input(data)
-    validate_dc_objective(data, objective)
-
-    # create model
-    prob = create_model(data, dt, timesteps, objective)
-    # prob_filename = os.path.join(result_dir, 'model.lp')
-    # prob.write(prob_filename, io_options={'symbolic_solver_labels':True})
+    telemetry = RunTelemetry(sce, trace_memory=trace_memory,
+                             input_files=input_files, solver=Solver,
+                             backend=backend, timesteps=len(timesteps),
+                             typeperiods=typeperiods, threads=threads,
+                             horizon=horizon, resample=resample)
+    with telemetry.stage('read'):
+        data = read_input(input_files, year)
+    with telemetry.stage('scenario'):
+        data = scenario(data)
+    with telemetry.stage('validate'):
+        validate_input(data)
+        validate_dc_objective(data, objective)
+    if resample:
+        with telemetry.stage('resample'):
+            data, timesteps = resample_timeseries(data, resample,
+                                                  timesteps=timesteps, dt=dt)
+        dt *= resample
+    if typeperiods:
+        with telemetry.stage('aggregate'):
+            model_data, model_timesteps = aggregate_timeseries(
+                copy.deepcopy(data) if horizon else data, typeperiods,
+                timesteps=timesteps)
+        if not horizon:
+            data, timesteps = model_data, model_timesteps
+    if prune:
+        with telemetry.stage('prune'):
+            full_data = data
+            data, pruned = prune_input(data)
+        telemetry.info['pruned'] = {name: len(rows)
+                                    for name, rows in pruned.items()}
 
     # refresh time stamp string and create filename for logfile
     log_filename = os.path.join(result_dir, '{}.log').format(sce)
 
-    # solve model and read results
-    optim = SolverFactory(Solver)  # cplex, glpk, gurobi, ...
-    optim = setup_solver(optim, logfile=log_filename)
-    result = optim.solve(prob, tee=True)
-    assert str(result.solver.termination_condition) == 'optimal'
+    if horizon:
+        optim = SolverFactory(Solver)  # cplex, glpk, gurobi, ...
+        optim = setup_solver(optim, logfile=log_filename, threads=threads)
+        capacities = None
+        if typeperiods:
+            # plan the capacities on the representative periods
+            with telemetry.stage('create_model'):
+                capacities = create_model(model_data, dt, model_timesteps,
+                                          objective)
+            with telemetry.stage('solve'):
+                result = optim.solve(capacities, tee=True)
+            assert str(result.solver.termination_condition) == 'optimal'
+        # dispatch these capacities window by window
+        with telemetry.stage('rolling_horizon'):
+            window, overlap = horizon
+            prob = solve_rolling_horizon(data, dt, timesteps, objective,
+                                         optim, window, overlap,
+                                         capacities=capacities)
+        del capacities
+    elif backend == 'matrix':
+        # create, solve and read back the array-based model
+        with telemetry.stage('create_model'):
+            prob = create_lp(data, dt, timesteps, objective,
+                             track_origin=track_origin)
+        with telemetry.stage('solve'):
+            prob = solve_lp(prob, Solver, logfile=log_filename,
+                            threads=threads)
+    elif backend == 'benders':
+        # master problem and one subproblem per support timeframe
+        with telemetry.stage('benders'):
+            prob = solve_benders(data, dt, timesteps, Solver,
+                                 threads=threads, logfile=log_filename)
+    elif backend == 'myopic':
+        # one single-year model per support timeframe
+        with telemetry.stage('myopic'):
+            optim = SolverFactory(Solver)  # cplex, glpk, gurobi, ...
+            optim = setup_solver(optim, logfile=log_filename,
+                                 threads=threads)
+            prob = solve_myopic(data, dt, timesteps, objective, optim)
+    else:
+        # create model
+        with telemetry.stage('create_model'):
+            prob = create_model(data, dt, timesteps, objective,
+                                track_origin=track_origin,
+                                substitute=substitute)
+        # prob_filename = os.path.join(result_dir, 'model.lp')
+        # prob.write(prob_filename,
+        #            io_options={'symbolic_solver_labels':True})
+
+        # solve model and read results
+        with telemetry.stage('solve'):
+            optim = SolverFactory(Solver)  # cplex, glpk, gurobi, ...
+            optim = setup_solver(optim, logfile=log_filename,
+                                 threads=threads)
+            result = optim.solve(prob, tee=True)
+        assert str(result.solver.termination_condition) == 'optimal'
+        # time spent in the solver itself, as far as it reports it
+        telemetry.info['solver_seconds'] = solver_time(result)
+
+    if prune:
+        with telemetry.stage('reinflate'):
+            prob = reinflate_results(prob, full_data, pruned, timesteps)
+
+    write_results(prob, sce, result_dir, timesteps,
+                  plot_tuples=plot_tuples,
+                  plot_sites_name=plot_sites_name,
+                  plot_periods=plot_periods,
+                  report_tuples=report_tuples,
+                  report_sites_name=report_sites_name,
+                  result_store=result_store,
+                  telemetry=telemetry)
+    telemetry.write(result_dir, history=run_history)
+
+    return prob
+
+
+def run_scenarios(input_files, Solver, timesteps, scenarios, result_dir, dt,
+                  objective, plot_tuples=None, plot_sites_name=None,
+                  plot_periods=None, report_tuples=None,
+                  report_sites_name=None, typeperiods=None,
+                  result_store='h5', resample=None, track_origin=True,
+                  substitute=False):
+    """ run an urbs model for given input, time steps and list of scenarios,
+    reusing the model of the first scenario
+
+    The model of the first scenario is created with mutable parameters.
+    Scenarios that only change commodity prices, process capacity limits or
+    global limits are applied to it with update_model and solved again; with
+    a persistent solver interface (e.g. 'gurobi_persistent') only the changed
+    constraints are passed to the solver. All other scenarios get a model of
+    their own, as in run_scenario.
+
+    Args:
+        - scenarios: a list of scenario functions that modify the input
+          data dict
+        - all other arguments as in run_scenario
+
+    Returns:
+        the reused urbs model instance
+    """
 
-    # save problem solution (and input data) to HDF5 file
-    save(prob, os.path.join(result_dir, '{}.h5'.format(sce)))
+    # sets a modeled year for non-intertemporal problems
+    # (necessary for consitency)
+    year = date.today().year
+    base_data = read_input(input_files, year)
+    model_timesteps = timesteps
+    model_dt = dt * resample if resample else dt
+
+    prob = None
+    for scenario in scenarios:
+        # scenario name, modify a copy of the data for scenario
+        sce = scenario.__name__
+        data = scenario(copy.deepcopy(base_data))
+        validate_input(data)
+        validate_dc_objective(data, objective)
+        if resample:
+            data, model_timesteps = resample_timeseries(
+                data, resample, timesteps=timesteps, dt=dt)
+        if typeperiods:
+            data, model_timesteps = aggregate_timeseries(
+                data, typeperiods, timesteps=model_timesteps)
+
+        # refresh time stamp string and create filename for logfile
+        log_filename = os.path.join(result_dir, '{}.log').format(sce)
+
+        if prob is not None and update_model(prob, data):
+            sce_prob, optim = prob, prob_optim
+            if isinstance(optim, PersistentSolver):
+                update_persistent_solver(optim, prob)
+        else:
+            sce_prob = create_model(data, model_dt, model_timesteps,
+                                    objective, mutable=prob is None,
+                                    track_origin=track_origin,
+                                    substitute=substitute)
+            optim = SolverFactory(Solver)  # cplex, glpk, gurobi, ...
+            if isinstance(optim, PersistentSolver):
+                optim.set_instance(sce_prob)
+            if prob is None:
+                prob, prob_optim = sce_prob, optim
+
+        # solve model and read results
+        optim = setup_solver(optim, logfile=log_filename)
+        result = optim.solve(sce_prob, tee=True)
+        assert str(result.solver.termination_condition) == 'optimal'
+
+        write_results(sce_prob, sce, result_dir, model_timesteps,
+                      plot_tuples=plot_tuples,
+                      plot_sites_name=plot_sites_name,
+                      plot_periods=plot_periods,
+                      report_tuples=report_tuples,
+                      report_sites_name=report_sites_name,
+                      result_store=result_store)
+
+    return prob
+
+
+def run_scenarios_parallel(input_files, Solver, timesteps, scenarios,
+                           result_dir, dt, objective, plot_tuples=None,
+                           plot_sites_name=None, plot_periods=None,
+                           report_tuples=None, report_sites_name=None,
+                           backend='pyomo', typeperiods=None, workers=None,
+                           threads=1, result_store='h5', resample=None,
+                           **kwargs):
+    """ run an urbs model for given input, time steps and list of scenarios
+    in a pool of worker processes
+
+    Each scenario is run by run_scenario in a worker process. Its console
+    output is written to the file '<scenario>.out' in result_dir, next to
+    the solver log '<scenario>.log'. The input is read once before, to fill
+    the input cache the workers read (c.f. read_input).
+
+    Args:
+        - scenarios: a list of scenario functions that modify the input
+          data dict (defined at module level, so they can be passed to the
+          worker processes)
+        - workers: (optional) number of worker processes, default: number of
+          CPUs divided by threads
+        - threads: (optional) number of solver threads per worker, default: 1
+        - kwargs: further keyword arguments of run_scenario, e.g.
+          track_origin, substitute, prune, horizon, trace_memory or
+          run_history
+        - all other arguments as in run_scenario
+
+    Returns:
+        dict of results by scenario name: a result container (input data and
+        result cache) for a solved scenario, else the exception raised
+    """
+    if workers is None:
+        workers = max(1, (os.cpu_count() or 1) // threads)
+
+    # fill the input cache once, so that the workers read it instead of all
+    # parsing the Excel files and writing the same cache entry at once
+    read_input(input_files, date.today().year)
+
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            (scenario.__name__,
+             executor.submit(
+                 run_scenario_worker, input_files, Solver, timesteps,
+                 scenario, result_dir, dt, objective,
+                 plot_tuples=plot_tuples,
+                 plot_sites_name=plot_sites_name,
+                 plot_periods=plot_periods,
+                 report_tuples=report_tuples,
+                 report_sites_name=report_sites_name,
+                 backend=backend,
+                 typeperiods=typeperiods,
+                 threads=threads,
+                 result_store=result_store,
+                 resample=resample,
+                 **kwargs))
+            for scenario in scenarios]
+        for sce, future in futures:
+            try:
+                results[sce] = future.result()
+            except Exception as error:
+                print("Scenario '{}' failed: {!r}".format(sce, error))
+                results[sce] = error
+    return results
+
+
+def run_scenario_worker(input_files, Solver, timesteps, scenario, result_dir,
+                        dt, objective, **kwargs):
+    """ run_scenario with console output to '<scenario>.out' in result_dir,
+    returning a picklable result container (c.f. run_scenarios_parallel)
+    """
+    out_filename = os.path.join(result_dir, '{}.out'.format(scenario.__name__))
+    with open(out_filename, 'w') as out, \
+            contextlib.redirect_stdout(out), contextlib.redirect_stderr(out):
+        try:
+            prob = run_scenario(input_files, Solver, timesteps, scenario,
+                                result_dir, dt, objective, **kwargs)
+        except Exception:
+            traceback.print_exc()
+            raise
+    # the model instance itself is not passed back, only its input data and
+    # result cache (created by save)
+    return ResultContainer(prob._data, prob._result)
+
+
+def update_persistent_solver(optim, prob):
+    """ pass the constraints with mutable parameters of a model changed by
+    update_model to a persistent solver interface again
+
+    Args:
+        - optim: a persistent solver with prob as instance
+        - prob: a urbs model instance created with mutable=True
+
+    Returns:
+        Nothing
+    """
+    for name in ['def_costs', 'res_process_capacity',
+                 'res_global_co2_limit', 'res_global_co2_budget',
+                 'res_global_cost_limit', 'res_global_cost_budget']:
+        if not hasattr(prob, name):
+            continue
+        for con in getattr(prob, name).values():
+            optim.remove_constraint(con)
+            optim.add_constraint(con)
+
+
+def write_results(prob, sce, result_dir, timesteps, plot_tuples=None,
+                  plot_sites_name=None, plot_periods=None, report_tuples=None,
+                  report_sites_name=None, result_store='h5', telemetry=None):
+    """ save, report and plot the results of a solved scenario
+
+    Args:
+        - prob: a solved urbs model instance
+        - sce: scenario name, used for the file names
+        - telemetry: (optional) RunTelemetry to record the stages in
+        - all other arguments as in run_scenario
+
+    Returns:
+        Nothing
+    """
+    if telemetry is None:
+        telemetry = RunTelemetry(sce)
+
+    # save problem solution (and input data) to HDF5 file or parquet store
+    with telemetry.stage('save'):
+        save(prob, os.path.join(result_dir,
+                                '{}.{}'.format(sce, result_store)))
 
     # write report to spreadsheet
-    report(
-        prob,
-        os.path.join(result_dir, '{}.xlsx').format(sce),
-        report_tuples=report_tuples,
-        report_sites_name=report_sites_name)
+    with telemetry.stage('report'):
+        report(
+            prob,
+            os.path.join(result_dir, '{}.xlsx').format(sce),
+            report_tuples=report_tuples,
+            report_sites_name=report_sites_name)
 
     # result plots
-    result_figures(
-        prob,
-        os.path.join(result_dir, '{}'.format(sce)),
-        timesteps,
-        plot_title_prefix=sce.replace('_', ' '),
-        plot_tuples=plot_tuples,
-        plot_sites_name=plot_sites_name,
-        periods=plot_periods,
-        figure_size=(24, 9))
+    with telemetry.stage('plot'):
+        result_figures(
+            prob,
+            os.path.join(result_dir, '{}'.format(sce)),
+            timesteps,
+            plot_title_prefix=sce.replace('_', ' '),
+            plot_tuples=plot_tuples,
+            plot_sites_name=plot_sites_name,
+            periods=plot_periods,
+            figure_size=(24, 9))
 
-    return prob
+
+def solver_time(result):
+    """ return the solver time reported in a pyomo solver result, if any
+
+    Args:
+        - result: the result returned by a pyomo solver
+
+    Returns:
+        the solver wall clock (or else CPU) time in seconds, or None
+    """
+    for attr in ['wallclock_time', 'time', 'system_time', 'user_time']:
+        value = getattr(result.solver, attr, None)
+        if isinstance(value, (int, float)):
+            return value
+    return None
@@ -1,47 +1,301 @@
+import os
+import json
+import shutil
+import numpy as np
 import pandas as pd
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+from pandas.api.types import infer_dtype, is_list_like
 from .pyomoio import get_entity, list_entities
 
+ENTITY_TYPES = ['set', 'par', 'var', 'exp', 'con']
 
-def create_result_cache(prob):
-    entity_types = ['set', 'par', 'var', 'exp']
-    if hasattr(prob, 'dual'):
-        entity_types.append('con')
+# entities read by the report and plot functions
+REPORT_ENTITIES = ['tm', 'dt', 'costs', 'cap_pro', 'cap_pro_new', 'cap_tra',
+                   'cap_tra_new', 'cap_sto_c', 'cap_sto_c_new', 'cap_sto_p',
+                   'cap_sto_p_new', 'e_co_stock', 'e_pro_in', 'e_pro_out',
+                   'e_tra_in', 'e_tra_out', 'e_sto_con', 'e_sto_in',
+                   'e_sto_out', 'dsm_up', 'dsm_down', 'voltage_angle']
 
-    entities = []
-    for entity_type in entity_types:
-        entities.extend(list_entities(prob, entity_type).index.tolist())
+
+def create_result_cache(prob, entities=None):
+    """Extract the values of the entities of a solved model instance.
+
+    Args:
+        - prob: a solved urbs model instance
+        - entities: (optional) list of entity names and/or entity types
+          ('set', 'par', 'var', 'exp', 'con') to extract, e.g.
+          ['var', 'costs'] or REPORT_ENTITIES; default: all sets, params,
+          variables, expressions and, if duals exist, constraints
+
+    Returns:
+        a dict of Series by entity name, in the format of get_entity
+    """
+    if entities is None:
+        entities = ['set', 'par', 'var', 'exp']
+        if hasattr(prob, 'dual'):
+            entities.append('con')
 
     result_cache = {}
-    for entity in entities:
+    for entity in entity_names(prob, entities):
         result_cache[entity] = get_entity(prob, entity)
     return result_cache
 
 
-def save(prob, filename):
+def entity_names(prob, entities):
+    """Resolve entity types in a list of entity names and types.
+
+    Args:
+        - prob: a urbs model instance
+        - entities: list of entity names and/or entity types
+
+    Returns:
+        list of entity names
+    """
+    names = []
+    for entity in entities:
+        if entity in ENTITY_TYPES:
+            names.extend(list_entities(prob, entity).index.tolist())
+        else:
+            names.append(entity)
+    return names
+
+
+def save(prob, filename, entities=None, sparse=False, table=False):
     """Save urbs model input and result cache to a HDF5 store file.
 
+    If filename ends with '.parquet', a ParquetStore directory with one
+    compressed parquet file per input DataFrame and entity is written
+    instead.
+
     Args:
         - prob: a urbs model instance containing a solution
-        - filename: HDF5 store file to be written
+        - filename: HDF5 store file or parquet store directory to be written
+        - entities: (optional) list of entity names and/or entity types to
+          save, c.f. create_result_cache; default: the whole result cache
+        - sparse: (optional) if True, timeseries entities are stored without
+          their exact zeros; load restores them, default: False
+        - table: (optional) if True, results with a MultiIndex are stored in
+          table format, so that load(..., where=...) reads only the selected
+          rows of them (HDF5 only), default: False
 
     Returns:
         Nothing
     """
+    if not hasattr(prob, '_result'):
+        prob._result = create_result_cache(prob, entities)
+
+    if entities is None:
+        names = list(prob._result.keys())
+    else:
+        names = entity_names(prob, entities)
+
+    with open_store(filename, mode='w') as store:
+        for name in prob._data.keys():
+            store['data/'+name] = prob._data[name]
+        for name in names:
+            if name in prob._result:
+                result = prob._result[name]
+            else:
+                result = get_entity(prob, name)
+            if sparse and is_timeseries(result):
+                # keep the timesteps and the other index levels to restore
+                # the dropped zeros on load
+                store['sparse/'+name+'/t'] = pd.Series(
+                    result.index.get_level_values('t').unique())
+                store['sparse/'+name+'/keys'] = pd.Series(
+                    0, index=result.index.droplevel('t').unique())
+                result = result[result != 0]
+            if (table and isinstance(store, HDF5Store) and
+                    isinstance(result.index, pd.MultiIndex)):
+                store.put('result/'+name, result, format='table')
+            else:
+                store['result/'+name] = result
+
+
+def is_timeseries(result):
+    """Check whether a result is a product of its timesteps and other keys.
+
+    Only then the zeros dropped by save(..., sparse=True) can be restored.
+
+    Args:
+        - result: a Series in the format of get_entity
+
+    Returns:
+        True if the Series has a 't' level and contains every combination of
+        its timesteps and its other index levels exactly once
+    """
+    index = result.index
+    if (not isinstance(index, pd.MultiIndex) or 't' not in index.names or
+            not np.issubdtype(result.dtype, np.number)):
+        return False
+    timesteps = index.get_level_values('t').unique()
+    keys = index.droplevel('t').unique()
+    return len(index) == len(timesteps) * len(keys) and index.is_unique
+
+
+def restore_zeros(result, timesteps, keys):
+    """Reinflate a sparse timeseries entity stored by save.
+
+    Args:
+        - result: Series without its exact zeros
+        - timesteps: Series of all timesteps of the entity
+        - keys: Series indexed by all keys (other index levels) of the entity
+
+    Returns:
+        the Series with zeros for all missing combinations of timesteps and
+        keys, ordered by timestep, then key
+    """
+    level = result.index.names.index('t')
+    arrays = [np.tile(keys.index.get_level_values(k).values, len(timesteps))
+              for k in range(keys.index.nlevels)]
+    arrays.insert(level, np.repeat(timesteps.values, len(keys)))
+    index = pd.MultiIndex.from_arrays(arrays, names=result.index.names)
+    return result.reindex(index, fill_value=0)
+
+
+def open_store(filename, mode='r'):
+    """Open the result store of given filename.
+
+    Args:
+        - filename: HDF5 store file, or parquet store directory if it ends
+          with '.parquet'
+        - mode: 'r' to read or 'w' to write a new store
+
+    Returns:
+        an open HDF5Store or ParquetStore
+    """
+    if os.path.splitext(filename)[1] == '.parquet':
+        return ParquetStore(filename, mode=mode)
+
     import warnings
     import tables
     warnings.filterwarnings('ignore',
                             category=pd.io.pytables.PerformanceWarning)
     warnings.filterwarnings('ignore',
                             category=tables.NaturalNameWarning)
+    return HDF5Store(filename, mode=mode)
 
-    if not hasattr(prob, '_result'):
-        prob._result = create_result_cache(prob)
 
-    with pd.HDFStore(filename, mode='w') as store:
-        for name in prob._data.keys():
-            store['data/'+name] = prob._data[name]
-        for name in prob._result.keys():
-            store['result/'+name] = prob._result[name]
+class HDF5Store(pd.HDFStore):
+    """ HDFStore with the node listing used by save and load. """
+    def names(self, group):
+        """Return the names of the nodes in a group."""
+        if '/'+group not in self:
+            return []
+        return [node._v_name for node in self.get_node(group)]
+
+    def is_table(self, key):
+        """Return whether a node is stored in table format."""
+        return self.get_storer(key).is_table
+
+
+class ParquetStore(object):
+    """ Directory of compressed parquet files, one per DataFrame or Series.
+
+    Provides the parts of the HDFStore interface used by save and load: the
+    key 'result/e_pro_out' is stored in the file 'result/e_pro_out.parquet'.
+    Files are written by a thread pool; closing the store waits for them.
+    Series are stored as single column DataFrames and MultiIndex columns as
+    '.'-joined labels; a manifest restores both on reading. DataFrames with
+    columns of mixed types (e.g. strings and inf), which parquet cannot hold,
+    are pickled instead.
+    """
+    def __init__(self, path, mode='r', compression='zstd', workers=None):
+        self.path = path
+        self.mode = mode
+        self.compression = compression
+        if mode == 'w':
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            os.makedirs(path)
+            self._manifest = {}
+            self._pool = ThreadPoolExecutor(workers)
+            self._futures = []
+        else:
+            with open(os.path.join(path, 'manifest.json')) as f:
+                self._manifest = json.load(f)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """Wait for all files to be written and write the manifest."""
+        if self.mode != 'w' or self._pool is None:
+            return
+        self._pool.shutdown()
+        self._pool = None
+        for future in self._futures:
+            # raise errors of the writing threads
+            future.result()
+        with open(os.path.join(self.path, 'manifest.json'), 'w') as f:
+            json.dump(self._manifest, f)
+
+    def put(self, key, value, format=None):
+        """Write a DataFrame or Series in a background thread."""
+        meta = {'series': isinstance(value, pd.Series), 'levels': None,
+                'pickle': False}
+        if meta['series']:
+            meta['name'] = value.name
+            value = value.to_frame(name='value')
+        elif isinstance(value.columns, pd.MultiIndex):
+            meta['levels'] = value.columns.nlevels
+            value = value.copy()
+            value.columns = ['.'.join(map(str, col)) for col in value.columns]
+        meta['pickle'] = any(
+            infer_dtype(value[col]) in ('mixed', 'mixed-integer')
+            for col in value.columns if value[col].dtype == object)
+        self._manifest[key] = meta
+
+        filename = self._filename(key)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        if meta['pickle']:
+            self._futures.append(self._pool.submit(value.to_pickle, filename))
+        else:
+            self._futures.append(self._pool.submit(
+                value.to_parquet, filename, compression=self.compression))
+
+    def _filename(self, key):
+        if self._manifest[key]['pickle']:
+            return os.path.join(self.path, key + '.pkl')
+        return os.path.join(self.path, key + '.parquet')
+
+    def __setitem__(self, key, value):
+        self.put(key, value)
+
+    def __getitem__(self, key):
+        meta = self._manifest[key]
+        if meta['pickle']:
+            value = pd.read_pickle(self._filename(key))
+        else:
+            value = pd.read_parquet(self._filename(key))
+        if meta['series']:
+            value = value['value'].rename(meta['name'])
+        elif meta['levels']:
+            value.columns = pd.MultiIndex.from_tuples(
+                [tuple(col.split('.', meta['levels'] - 1))
+                 for col in value.columns])
+        return value
+
+    def __contains__(self, key):
+        return key in self._manifest
+
+    def names(self, group):
+        """Return the names of the DataFrames (or subgroups) in a group."""
+        names = []
+        for key in self._manifest:
+            if key.startswith(group+'/'):
+                name = key[len(group)+1:].split('/')[0]
+                if name not in names:
+                    names.append(name)
+        return names
+
+    def is_table(self, key):
+        """Parquet files are always read completely."""
+        return False
 
 
 class ResultContainer(object):
@@ -51,22 +305,146 @@ class ResultContainer(object):
         self._result = result
 
 
-def load(filename):
+class LazyStore(Mapping):
+    """ Read-only dict of the DataFrames in one group of a result store.
+
+    DataFrames are read from the file when they are first accessed (e.g. by
+    get_entity or get_input) and kept in memory afterwards.
+    """
+    def __init__(self, filename, group, where=None):
+        self._filename = filename
+        self._group = group
+        self._where = where
+        self._cache = {}
+        with open_store(filename) as store:
+            self._names = store.names(group)
+            if group == 'result':
+                self._sparse = store.names('sparse')
+            else:
+                self._sparse = []
+
+    def __getitem__(self, name):
+        if name not in self._cache:
+            if name not in self._names:
+                raise KeyError(name)
+            with open_store(self._filename) as store:
+                self._cache[name] = read_node(
+                    store, self._group, name, name in self._sparse,
+                    self._where)
+        return self._cache[name]
+
+    def __contains__(self, name):
+        return name in self._names
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def read_all(self):
+        """Read all DataFrames of the group into a dict at once."""
+        with open_store(self._filename) as store:
+            for name in self._names:
+                if name not in self._cache:
+                    self._cache[name] = read_node(
+                        store, self._group, name, name in self._sparse,
+                        self._where)
+        return dict(self._cache)
+
+    def __len__(self):
+        return len(self._names)
+
+
+def read_node(store, group, name, sparse=False, where=None):
+    """Read a DataFrame or Series from a result store written by save.
+
+    Args:
+        - store: an open HDF5Store or ParquetStore
+        - group: 'data' or 'result'
+        - name: name of the DataFrame or entity
+        - sparse: (optional) restore the zeros of a sparse timeseries entity
+        - where: (optional) selection of index level values, c.f. load
+
+    Returns:
+        the stored DataFrame or Series, restricted to the selection
+    """
+    key = group+'/'+name
+    if where and not sparse and store.is_table(key):
+        # table format: let the store select the rows
+        names = store.select(key, stop=0).index.names
+        return store.select(key, where=where_terms(names, where))
+
+    result = store[key]
+    if sparse:
+        result = restore_zeros(result, store['sparse/'+name+'/t'],
+                               store['sparse/'+name+'/keys'])
+    if where:
+        result = select_where(result, where)
+    return result
+
+
+def where_terms(names, where):
+    """Translate a where selection into HDFStore query terms.
+
+    Args:
+        - names: index level names of the stored node
+        - where: selection of index level values, c.f. load
+
+    Returns:
+        list of query terms for the levels present in names
+    """
+    terms = []
+    for level, selection in where.items():
+        if level not in names:
+            continue
+        if isinstance(selection, range) and selection.step == 1:
+            terms.append('{0} >= {1} & {0} < {2}'.format(
+                level, selection.start, selection.stop))
+        elif is_list_like(selection):
+            terms.append('{} == {!r}'.format(level, list(selection)))
+        else:
+            terms.append('{} == {!r}'.format(level, selection))
+    return terms
+
+
+def select_where(result, where):
+    """Select the rows of a DataFrame or Series by index level values.
+
+    Args:
+        - result: a DataFrame or Series
+        - where: selection of index level values, c.f. load
+
+    Returns:
+        the rows of result matching all selected levels it has
+    """
+    mask = np.ones(len(result), dtype=bool)
+    for level, selection in where.items():
+        if level not in result.index.names:
+            continue
+        if not is_list_like(selection):
+            selection = [selection]
+        mask &= result.index.get_level_values(level).isin(list(selection))
+    return result[mask]
+
+
+def load(filename, lazy=False, where=None):
     """Load a urbs model result container from a HDF5 store file.
 
     Args:
-        filename: an existing HDF5 store file
+        filename: an existing HDF5 store file or parquet store directory
+        lazy: (optional) if True, input DataFrames and results are read from
+            the file only when they are first used
+        where: (optional) dict of index level values to load results for,
+            e.g. {'stf': 2020, 'sit': ['North', 'Mid'], 't': range(1, 169)};
+            single values, lists and ranges are accepted. Results without a
+            selected level are loaded completely. Results stored in table
+            format (c.f. save) are selected within the file.
 
     Returns:
         prob: the modified instance containing the result cache
     """
-    with pd.HDFStore(filename, mode='r') as store:
-        data_cache = {}
-        for group in store.get_node('data'):
-            data_cache[group._v_name] = store[group._v_pathname]
-
-        result_cache = {}
-        for group in store.get_node('result'):
-            result_cache[group._v_name] = store[group._v_pathname]
+    data_cache = LazyStore(filename, 'data')
+    result_cache = LazyStore(filename, 'result', where)
+    if not lazy:
+        data_cache = data_cache.read_all()
+        result_cache = result_cache.read_all()
 
     return ResultContainer(data_cache, result_cache)
@@ -0,0 +1,338 @@
+import math
+import numpy as np
+import pandas as pd
+
+# conversion process types, after the example input:
+# (process, input commodity, output ratio of Elec, output ratio of CO2,
+#  input and CO2 ratio at minimal part load (c.f. ratio-min), cap-up,
+#  max-grad, min-fraction, inv-cost, fix-cost, var-cost, depreciation)
+PROCESS_TYPES = [
+    ('Gas plant', 'Gas', 0.6, 0.2, (1.2, 0.24), 80000, 4.8, 0.25, 450000,
+     6000, 1.62, 30),
+    ('Wind park', 'Wind', 1, 0, None, 13000, math.inf, 0, 1500000, 30000,
+     0, 25),
+    ('Photovoltaics', 'Solar', 1, 0, None, 160000, math.inf, 0, 600000,
+     12000, 0, 25),
+    ('Coal plant', 'Coal', 0.4, 0.3, (1.4, 0.42), 100000, 2.4, 0.5, 600000,
+     18000, 0.6, 40),
+    ('Biomass plant', 'Biomass', 0.35, 0, None, 5000, 1.2, 0, 875000, 28000,
+     1.4, 25),
+    ('Hydro plant', 'Hydro', 1, 0, None, 1400, math.inf, 0, 1600000, 20000,
+     0, 50),
+    ('Lignite plant', 'Lignite', 0.4, 0.4, (2.0, 0.8), 60000, 0.9, 0.65,
+     600000, 18000, 0.6, 40)]
+
+# prices of the stock commodities (EUR/MWh)
+STOCK_PRICES = {'Biomass': 6.0, 'Coal': 7.0, 'Gas': 27.0, 'Lignite': 4.0,
+                'Slack': 999.0}
+
+# intermittent (SupIm) commodities
+SUPIM_COMMODITIES = ['Hydro', 'Solar', 'Wind']
+
+# storage types: (storage, eff-in, eff-out, inv-cost-p, inv-cost-c,
+#                 fix-cost-p, fix-cost-c, var-cost-p, var-cost-c,
+#                 depreciation, discharge)
+STORAGE_TYPES = [
+    ('Pump storage', 0.94, 0.94, 100000, 0, 20000, 0, 0.02, 0, 50, 0),
+    ('Battery', 0.95, 0.95, 150000, 200000, 3000, 4000, 0.02, 0, 15, 1e-5),
+    ('Hydrogen', 0.64, 0.64, 42000, 6.54, 0, 0.327, 0.02, 0, 50, 3e-6)]
+
+# transmission topologies, as functions of the number of sites
+TOPOLOGIES = {
+    None: lambda n: [],
+    'line': lambda n: [(i, i + 1) for i in range(n - 1)],
+    'ring': lambda n: ([(i, (i + 1) % n) for i in range(n)] if n > 2
+                       else [(i, i + 1) for i in range(n - 1)]),
+    'star': lambda n: [(0, i) for i in range(1, n)],
+    'mesh': lambda n: [(i, j) for i in range(n) for j in range(i + 1, n)]}
+
+# years between support timeframes and yearly decline of invest costs
+STF_DISTANCE = 5
+COST_DECLINE = 0.02
+
+
+def synthetic_input(sites=3, processes=4, storages=1, dsm=0,
+                    topology='ring', support_timeframes=1, timesteps=168,
+                    year=2020, seed=0):
+    """Generate a synthetic urbs input data dict of configurable size.
+
+    The data dict has the same keys and format as returned by read_input
+    and passes validate_input. Each site has an electricity demand, the
+    stock, intermittent and CO2 commodities of all process types, a slack
+    power plant (at high costs, so that any input is feasible) and the
+    given number of processes, cycling through the process types of the
+    example input (PROCESS_TYPES) from a different one at each site; beyond
+    all types, variants with other costs are added (e.g. 'Gas plant 2').
+    Timeseries of demand and intermittent supply follow daily and seasonal
+    patterns with random noise. With more than one support timeframe, these
+    are STF_DISTANCE years apart, with invest costs declining by
+    COST_DECLINE per year.
+
+    Args:
+        - sites: number of sites
+        - processes: number of processes per site (besides the slack power
+          plant)
+        - storages: number of storages per site (c.f. STORAGE_TYPES)
+        - dsm: number of sites with demand side management
+        - topology: transmission lines between the sites: 'line', 'ring',
+          'star', 'mesh' or None (c.f. TOPOLOGIES)
+        - support_timeframes: number of support timeframes, more than one
+          for an intertemporal model
+        - timesteps: number of modelled timesteps (hours), besides the
+          initial timestep 0
+        - year: first support timeframe
+        - seed: seed of the random numbers, for reproducible inputs
+
+    Returns:
+        a dict of 12 DataFrames, c.f. read_input
+    """
+    if topology not in TOPOLOGIES:
+        raise ValueError("Unknown topology {}, choose one of {}!".format(
+            topology, list(TOPOLOGIES)))
+    if storages > len(STORAGE_TYPES):
+        raise ValueError("At most {} storages per site!".format(
+            len(STORAGE_TYPES)))
+    rng = np.random.RandomState(seed)
+    site_names = ['Site{:0{}d}'.format(i + 1, len(str(sites)))
+                  for i in range(sites)]
+    stfs = [year + STF_DISTANCE * i for i in range(support_timeframes)]
+    intertemporal = support_timeframes > 1
+
+    # process types of each site and the cost variation of their variants
+    site_processes = []
+    variants = {}
+    for i in range(sites):
+        names = []
+        for j in range(processes):
+            process_type = PROCESS_TYPES[(i + j) % len(PROCESS_TYPES)]
+            variant = (i % len(PROCESS_TYPES) + j) // len(PROCESS_TYPES) + 1
+            name = process_type[0]
+            if variant > 1:
+                name = '{} {}'.format(name, variant)
+            if name not in variants:
+                variants[name] = (process_type,
+                                  1 if variant == 1
+                                  else rng.uniform(0.8, 1.2))
+            names.append(name)
+        site_processes.append(names)
+
+    demand, supim = synthetic_timeseries(rng, site_names, timesteps)
+    peaks = demand.max()
+
+    frames = {name: [] for name in ['global_prop', 'site', 'commodity',
+                                    'process', 'process_commodity',
+                                    'demand', 'supim', 'transmission',
+                                    'storage', 'dsm']}
+    for stf in stfs:
+        decline = (1 - COST_DECLINE) ** (stf - year)
+        growth = 1.01 ** (stf - year)
+        frames['global_prop'].append(synthetic_global(stf, stfs))
+        frames['site'].append(pd.DataFrame(
+            {'area': 1e9},
+            index=pd.MultiIndex.from_product(
+                [[stf], site_names], names=['support_timeframe', 'Name'])))
+        frames['commodity'].append(synthetic_commodities(stf, site_names))
+        frames['process'].append(synthetic_processes(
+            stf, site_names, site_processes, variants, decline,
+            stfs[-1] + STF_DISTANCE - stfs[0], intertemporal))
+        frames['process_commodity'].append(
+            synthetic_process_commodity(stf, variants))
+        frames['demand'].append(pd.concat([demand * growth], keys=[stf],
+                                          names=['support_timeframe']))
+        frames['supim'].append(pd.concat([supim], keys=[stf],
+                                         names=['support_timeframe']))
+        frames['transmission'].append(synthetic_transmission(
+            stf, site_names, TOPOLOGIES[topology](sites), decline,
+            intertemporal))
+        frames['storage'].append(synthetic_storage(
+            stf, site_names, storages, decline, intertemporal))
+        frames['dsm'].append(pd.DataFrame(
+            {'delay': 8, 'eff': 1.0, 'recov': 1,
+             'cap-max-do': (0.05 * growth * peaks.values[:dsm]).round(),
+             'cap-max-up': (0.05 * growth * peaks.values[:dsm]).round()},
+            index=pd.MultiIndex.from_tuples(
+                [(stf, site, 'Elec') for site in site_names[:dsm]],
+                names=['support_timeframe', 'Site', 'Commodity'])))
+
+    data = {name: pd.concat(frame_list, sort=False)
+            for name, frame_list in frames.items()}
+    if not topology or sites < 2:
+        data['transmission'] = pd.DataFrame()
+    if not storages:
+        data['storage'] = pd.DataFrame()
+    if not dsm:
+        data['dsm'] = pd.DataFrame()
+    data['buy_sell_price'] = pd.DataFrame()
+    data['eff_factor'] = pd.DataFrame()
+
+    # sort nested indexes as read_input does
+    for key in data:
+        if isinstance(data[key].index, pd.MultiIndex):
+            data[key].sort_index(inplace=True)
+    return data
+
+
+def synthetic_timeseries(rng, site_names, timesteps):
+    """Return random demand and intermittent supply timeseries.
+
+    Args:
+        - rng: a numpy RandomState
+        - site_names: list of site names
+        - timesteps: number of modelled timesteps (hours)
+
+    Returns:
+        tuple of the demand and supim DataFrames of one support timeframe,
+        indexed by t (0 to timesteps), with (site, commodity) columns
+    """
+    hours = np.arange(timesteps + 1)
+    day = 2 * np.pi * hours / 24
+    season = np.cos(2 * np.pi * hours / 8760)
+
+    demand = {}
+    supim = {}
+    for site in site_names:
+        peak = rng.uniform(5000, 60000)
+        demand[site, 'Elec'] = peak * (
+            0.75 + 0.15 * np.sin(day - 2) + 0.1 * season +
+            0.03 * rng.standard_normal(len(hours)))
+        clouds = rng.uniform(0.5, 1, len(hours))
+        supim[site, 'Solar'] = (np.maximum(0, -np.cos(day)) *
+                                (0.6 - 0.2 * season) * clouds)
+        wind = np.zeros(len(hours))
+        for h in hours[1:]:
+            wind[h] = 0.9 * wind[h - 1] + 0.45 * rng.standard_normal()
+        supim[site, 'Wind'] = 1 / (1 + np.exp(1 - wind))
+        supim[site, 'Hydro'] = (0.45 + 0.1 * season +
+                                0.02 * rng.standard_normal(len(hours)))
+
+    demand = pd.DataFrame(demand, index=pd.Index(hours, name='t'))
+    supim = pd.DataFrame(supim, index=pd.Index(hours, name='t')).clip(0, 1)
+    # the initial timestep carries no demand and supply
+    demand.iloc[0] = 0
+    supim.iloc[0] = 0
+    return demand.clip(lower=0), supim
+
+
+def synthetic_global(stf, stfs):
+    # global properties of a support timeframe, without any limits
+    properties = {'CO2 limit': math.inf, 'Cost limit': math.inf}
+    if stf == stfs[0]:
+        properties.update({'CO2 budget': math.inf, 'Cost budget': math.inf})
+        if len(stfs) > 1:
+            properties['Discount rate'] = 0.03
+    if stf == stfs[-1] and len(stfs) > 1:
+        properties['Weight'] = STF_DISTANCE
+    return pd.DataFrame(
+        {'value': list(properties.values())},
+        index=pd.MultiIndex.from_product(
+            [[stf], list(properties)],
+            names=['support_timeframe', 'Property']))
+
+
+def synthetic_commodities(stf, site_names):
+    # all commodities at all sites
+    rows = []
+    for site in site_names:
+        for com, price in STOCK_PRICES.items():
+            rows.append((stf, site, com, 'Stock', price, math.inf, math.inf))
+        for com in SUPIM_COMMODITIES:
+            rows.append((stf, site, com, 'SupIm', np.nan, np.nan, np.nan))
+        rows.append((stf, site, 'Elec', 'Demand', np.nan, np.nan, np.nan))
+        rows.append((stf, site, 'CO2', 'Env', 0.0, math.inf, math.inf))
+    return pd.DataFrame(
+        rows,
+        columns=['support_timeframe', 'Site', 'Commodity', 'Type', 'price',
+                 'max', 'maxperhour']
+    ).set_index(['support_timeframe', 'Site', 'Commodity', 'Type'])
+
+
+def synthetic_processes(stf, site_names, site_processes, variants, decline,
+                        horizon, intertemporal):
+    # processes of all sites, with a slack power plant each
+    rows = []
+    for site, names in zip(site_names, site_processes):
+        for name in names:
+            (_, _, _, _, _, cap_up, max_grad, min_fraction, inv_cost,
+             fix_cost, var_cost, depreciation), factor = variants[name]
+            rows.append((stf, site, name, 0, 0, 0, cap_up, max_grad,
+                         min_fraction, inv_cost * factor * decline,
+                         fix_cost * factor, var_cost * factor, 0.07,
+                         depreciation, np.nan))
+        rows.append((stf, site, 'Slack powerplant', 999999, horizon, 999999,
+                     999999, math.inf, 0, 0, 0, 100, 0.07, 1, np.nan))
+    process = pd.DataFrame(
+        rows,
+        columns=['support_timeframe', 'Site', 'Process', 'inst-cap',
+                 'lifetime', 'cap-lo', 'cap-up', 'max-grad', 'min-fraction',
+                 'inv-cost', 'fix-cost', 'var-cost', 'wacc', 'depreciation',
+                 'area-per-cap']
+    ).set_index(['support_timeframe', 'Site', 'Process'])
+    if not intertemporal:
+        process = process.drop('lifetime', axis=1)
+    return process
+
+
+def synthetic_process_commodity(stf, variants):
+    # input and output ratios of all processes
+    rows = [(stf, 'Slack powerplant', 'Slack', 'In', 1, np.nan),
+            (stf, 'Slack powerplant', 'Elec', 'Out', 1, np.nan),
+            (stf, 'Slack powerplant', 'CO2', 'Out', 0, np.nan)]
+    for name, (process_type, _) in variants.items():
+        _, com, elec, co2, partial = process_type[:5]
+        ratio_min = partial or (np.nan, np.nan)
+        rows.append((stf, name, com, 'In', 1, ratio_min[0]))
+        rows.append((stf, name, 'Elec', 'Out', elec, np.nan))
+        rows.append((stf, name, 'CO2', 'Out', co2, ratio_min[1]))
+    return pd.DataFrame(
+        rows,
+        columns=['support_timeframe', 'Process', 'Commodity', 'Direction',
+                 'ratio', 'ratio-min']
+    ).set_index(['support_timeframe', 'Process', 'Commodity', 'Direction'])
+
+
+def synthetic_transmission(stf, site_names, lines, decline, intertemporal):
+    # hvac lines in both directions
+    rows = []
+    for i, j in lines:
+        for site_in, site_out in [(site_names[i], site_names[j]),
+                                  (site_names[j], site_names[i])]:
+            rows.append((stf, site_in, site_out, 'hvac', 'Elec', 0.9, 0,
+                         1650000 * decline, 16500, 0, 0, 0, math.inf, 0.07,
+                         40))
+    transmission = pd.DataFrame(
+        rows,
+        columns=['support_timeframe', 'Site In', 'Site Out', 'Transmission',
+                 'Commodity', 'eff', 'lifetime', 'inv-cost', 'fix-cost',
+                 'var-cost', 'inst-cap', 'cap-lo', 'cap-up', 'wacc',
+                 'depreciation']
+    ).set_index(['support_timeframe', 'Site In', 'Site Out', 'Transmission',
+                 'Commodity'])
+    if not intertemporal:
+        transmission = transmission.drop('lifetime', axis=1)
+    return transmission
+
+
+def synthetic_storage(stf, site_names, storages, decline, intertemporal):
+    # the first storage types at all sites
+    rows = []
+    for site in site_names:
+        for (sto, eff_in, eff_out, inv_cost_p, inv_cost_c, fix_cost_p,
+             fix_cost_c, var_cost_p, var_cost_c, depreciation,
+             discharge) in STORAGE_TYPES[:storages]:
+            rows.append((stf, site, sto, 'Elec', 0, 0, math.inf, 0, 0,
+                         math.inf, eff_in, eff_out, inv_cost_p * decline,
+                         inv_cost_c * decline, fix_cost_p, fix_cost_c,
+                         var_cost_p, var_cost_c, 0, 0.07, depreciation, 0.5,
+                         discharge, np.nan))
+    storage = pd.DataFrame(
+        rows,
+        columns=['support_timeframe', 'Site', 'Storage', 'Commodity',
+                 'inst-cap-c', 'cap-lo-c', 'cap-up-c', 'inst-cap-p',
+                 'cap-lo-p', 'cap-up-p', 'eff-in', 'eff-out', 'inv-cost-p',
+                 'inv-cost-c', 'fix-cost-p', 'fix-cost-c', 'var-cost-p',
+                 'var-cost-c', 'lifetime', 'wacc', 'depreciation', 'init',
+                 'discharge', 'ep-ratio']
+    ).set_index(['support_timeframe', 'Site', 'Storage', 'Commodity'])
+    if not intertemporal:
+        storage = storage.drop('lifetime', axis=1)
+    return storage
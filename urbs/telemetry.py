@@ -0,0 +1,251 @@
+import os
+import csv
+import sys
+import json
+import time
+import sqlite3
+import platform
+import tracemalloc
+import pandas as pd
+import pyomo.core as pyomo
+from contextlib import contextmanager
+from pyomo.core.expr.current import identify_variables
+from datetime import datetime
+
+# columns of the stage records in the run manifest and run history
+STAGE_COLUMNS = ['stage', 'seconds', 'cpu_seconds', 'peak_rss_mb',
+                 'rss_growth_mb', 'malloc_delta_mb', 'malloc_peak_mb']
+
+
+class RunTelemetry(object):
+    """ Timing and memory record of the stages of a scenario run.
+
+    Each stage (e.g. read, create_model, solve) is wrapped by the context
+    manager stage(name), which records its wall clock and CPU time, the peak
+    resident set size (RSS) of the process after the stage and its growth
+    during the stage. With trace_memory, the change of Python heap memory and
+    its peak during the stage are recorded from tracemalloc, which slows
+    Python code down noticeably. Only memory allocated during the stage is
+    traced, so the change counts what the stage allocated and kept.
+
+    Usage:
+        telemetry = RunTelemetry('scenario_base')
+        with telemetry.stage('read'):
+            data = read_input(input_files, year)
+        telemetry.write(result_dir)
+    """
+    def __init__(self, sce, trace_memory=False, **info):
+        self.sce = sce
+        self.trace_memory = trace_memory
+        self.started = datetime.now().isoformat(timespec='seconds')
+        self.run_id = '{}-{}'.format(
+            datetime.now().strftime('%Y%m%dT%H%M%S%f'), sce)
+        self.info = dict(host=platform.node(),
+                         python=platform.python_version(),
+                         **info)
+        self.stages = []
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        """Record time and memory of the enclosed stage of the run."""
+        if self.trace_memory:
+            # restart tracing to measure the stage alone
+            tracemalloc.stop()
+            tracemalloc.start()
+        rss_before = peak_rss()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            record = {'stage': name,
+                      'seconds': time.perf_counter() - wall,
+                      'cpu_seconds': time.process_time() - cpu,
+                      'peak_rss_mb': peak_rss(),
+                      'rss_growth_mb': None,
+                      'malloc_delta_mb': None,
+                      'malloc_peak_mb': None}
+            if rss_before is not None:
+                record['rss_growth_mb'] = record['peak_rss_mb'] - rss_before
+            if self.trace_memory:
+                current, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                record['malloc_delta_mb'] = current / 2**20
+                record['malloc_peak_mb'] = peak / 2**20
+            self.stages.append(record)
+
+    def manifest(self):
+        """Return the run manifest as a dict."""
+        return dict(run_id=self.run_id,
+                    scenario=self.sce,
+                    started=self.started,
+                    total_seconds=time.perf_counter() - self._start,
+                    stages=self.stages,
+                    **self.info)
+
+    def write(self, result_dir, history=None):
+        """Write the run manifest to the result directory.
+
+        The manifest is written to '<scenario>.telemetry.json', the stage
+        records also to '<scenario>.telemetry.csv'.
+
+        Args:
+            - result_dir: directory of the run results
+            - history: (optional) SQLite database file the run is appended to
+              (c.f. append_history)
+
+        Returns:
+            the run manifest dict
+        """
+        manifest = self.manifest()
+        filename = os.path.join(result_dir, '{}.telemetry'.format(self.sce))
+        with open(filename + '.json', 'w') as f:
+            json.dump(manifest, f, indent=2, default=str)
+        with open(filename + '.csv', 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=STAGE_COLUMNS)
+            writer.writeheader()
+            writer.writerows(self.stages)
+        if history:
+            append_history(history, manifest)
+        return manifest
+
+
+class BuildProfiler(object):
+    """ Build time, size and sparsity of the components of a pyomo model.
+
+    While active, every component added to the model (e.g. by create_model
+    or the add_* functions of urbs.features) is timed. Each component
+    record holds:
+    - its build time
+    - the function that added it
+    - its number of indices
+    - the indices of its index set left out by Constraint.Skip
+    - the number of nonzero coefficients (variables per constraint body,
+      for constraints and objectives only)
+
+    Usage:
+        profiler = BuildProfiler(m)
+        m.res_vertex = pyomo.Constraint(...)
+        profile = profiler.stop()
+    """
+    def __init__(self, m):
+        self.m = m
+        self.records = []
+        add_component = m.add_component
+
+        def profiled_add_component(name, val):
+            start = time.perf_counter()
+            add_component(name, val)
+            seconds = time.perf_counter() - start
+            self.records.append(
+                component_record(name, val, seconds, caller_name()))
+
+        # Block.__setattr__ calls add_component of the model instance
+        object.__setattr__(m, 'add_component', profiled_add_component)
+
+    def stop(self):
+        """Stop profiling and return the profile table.
+
+        Returns:
+            DataFrame of the component records, most expensive first
+        """
+        self.m.__dict__.pop('add_component', None)
+        profile = pd.DataFrame(self.records, columns=PROFILE_COLUMNS)
+        profile = profile.set_index('component')
+        return profile.sort_values('seconds', ascending=False)
+
+
+# component types distinguished by BuildProfiler
+COMPONENT_TYPES = [pyomo.Set, pyomo.Param, pyomo.Var, pyomo.Expression,
+                   pyomo.Constraint, pyomo.Objective, pyomo.Suffix]
+
+# columns of the component records of BuildProfiler
+PROFILE_COLUMNS = ['component', 'type', 'added_by', 'seconds', 'indices',
+                   'skipped', 'nonzeros']
+
+
+def component_record(name, component, seconds, added_by):
+    # size and sparsity of a constructed model component
+    kind = next((ctype.__name__ for ctype in COMPONENT_TYPES
+                 if isinstance(component, ctype)), type(component).__name__)
+    indices = len(component)
+    skipped = 0
+    nonzeros = None
+    if isinstance(component, pyomo.Constraint):
+        if component.is_indexed():
+            skipped = len(component.index_set()) - indices
+        nonzeros = sum(len(list(identify_variables(data.body,
+                                                   include_fixed=False)))
+                       for data in component.values())
+    elif isinstance(component, pyomo.Objective):
+        nonzeros = sum(len(list(identify_variables(data.expr,
+                                                   include_fixed=False)))
+                       for data in component.values())
+    return [name, kind, added_by, seconds, indices, skipped, nonzeros]
+
+
+def caller_name():
+    # name of the innermost function outside of pyomo and this module
+    frame = sys._getframe(1)
+    while frame.f_globals.get('__name__', '').startswith(
+            ('pyomo', __name__)):
+        frame = frame.f_back
+    return frame.f_code.co_name
+
+
+def append_history(database, manifest):
+    """Append a run manifest to a SQLite run history database.
+
+    The database holds the table 'runs' with one row per run (its manifest in
+    the column 'manifest' as JSON) and the table 'stages' with one row per
+    stage of a run. Both tables are created if necessary.
+
+    Args:
+        - database: filename of the SQLite database
+        - manifest: a run manifest, as returned by RunTelemetry.manifest
+
+    Returns:
+        Nothing
+    """
+    with sqlite3.connect(database) as connection:
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS runs (run_id TEXT PRIMARY KEY, '
+            'scenario TEXT, started TEXT, total_seconds REAL, '
+            'manifest TEXT)')
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS stages (run_id TEXT, {})'.format(
+                ', '.join('{} {}'.format(column, 'TEXT' if column == 'stage'
+                                         else 'REAL')
+                          for column in STAGE_COLUMNS)))
+        connection.execute(
+            'INSERT INTO runs VALUES (?, ?, ?, ?, ?)',
+            (manifest['run_id'], manifest['scenario'], manifest['started'],
+             manifest['total_seconds'], json.dumps(manifest, default=str)))
+        connection.executemany(
+            'INSERT INTO stages VALUES ({})'.format(
+                ', '.join('?' * (len(STAGE_COLUMNS) + 1))),
+            [[manifest['run_id']] + [stage[column] for column in STAGE_COLUMNS]
+             for stage in manifest['stages']])
+    connection.close()
+
+
+def peak_rss():
+    """Return the peak resident set size of the process in MB.
+
+    Returns:
+        peak RSS in MB, or None if it cannot be determined on this platform
+    """
+    try:
+        import resource
+    except ImportError:
+        # Windows
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return psutil.Process().memory_info().peak_wset / 2**20
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        # bytes on macOS, kilobytes elsewhere
+        return rss / 2**20
+    return rss / 2**10